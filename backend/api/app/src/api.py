@@ -1,4 +1,5 @@
 import os
+import time
 import asyncio
 from quart import Quart, request
 from quart_cors import cors
@@ -7,7 +8,8 @@ from app.database.postgres.database import pg_db
 from app.src.errors.handlers import register_error_handlers
 from app.src.routes import routes_bp
 from app.src.utils.logging import setup_logging
-from app.src.services.melody_generator import get_available_models
+from app.src.utils.http_cache import register_compression
+from app.src.services.melody_generator import get_available_models, get_import_timings, preload_modules
 
 async def create_api():
     """
@@ -19,12 +21,22 @@ async def create_api():
     Returns:
         Quart: Configured Quart application
     """
+    # Start timing here so the startup report covers everything up to ready
+    startup_start = time.perf_counter()
+
     # Create a new Quart application
     api = Quart(__name__)
     
     # Set up configuration variables
     api.config['MODEL_DIR'] = os.environ.get('MODEL_DIR', '/usr/src/api/app/model')
     api.config['OUTPUT_DIR'] = os.environ.get('OUTPUT_DIR', '/usr/src/api/app/output')
+    # Serve the models' TFLite exports at this precision (int8, float16, float32) where they exist
+    api.config['MODEL_PRECISION'] = os.environ.get('MODEL_PRECISION') or None
+    # How models that predict several tokens per window are decoded: 'verify' checks the drafted
+    # tokens against the one-step head, 'draft' keeps them all, 'single' uses the one-step head only
+    api.config['MULTI_TOKEN_DECODING'] = os.environ.get('MULTI_TOKEN_DECODING', 'verify')
+    # Models in MODEL_DIR/manifest.json to load at startup; the others load on first use
+    api.config['PRELOAD_MODELS'] = [m.strip() for m in os.environ.get('PRELOAD_MODELS', '').split(',') if m.strip()]
 
     # Enable CORS for the application
     allowed_origins = {"https://melodygenerator.fun", "http://localhost:3000"}
@@ -67,14 +79,28 @@ async def create_api():
         # Initialize the database connection
         api.pg_db = await pg_db.get_instance()
 
-        # Preload and cache the melody generation models
+        # Preload and cache the melody generation models, warming music21 alongside them
         api.logger.info("Preloading melody generation models")
+        model_timings = {}
+        models_start = time.perf_counter()
         try:
-            models = await get_available_models()
+            models, _ = await asyncio.gather(
+                get_available_models(timings=model_timings),
+                preload_modules('music21')
+            )
             api.config['MODELS'] = models
-            api.logger.info(f"Loaded models: {list(models.keys())}")
+            api.logger.info("Loaded models: %s", list(models))
         except Exception as e:
-            api.logger.error(f"Error preloading models: {str(e)}")
+            api.logger.error("Error preloading models: %s", e)
+
+        # Record how long startup took; restarts and scale-outs are gated on time to ready
+        api.config['STARTUP_TIMING'] = {
+            "imports": get_import_timings(),
+            "models": model_timings,
+            "models_total": round(time.perf_counter() - models_start, 3),
+            "time_to_ready": round(time.perf_counter() - startup_start, 3)
+        }
+        api.logger.info("Startup timing (seconds): %s", api.config['STARTUP_TIMING'])
 
     @api.after_serving
     async def shutdown_tasks():
@@ -88,6 +114,9 @@ async def create_api():
             await api.pg_db.close()
             api.logger.info("Database connection closed")
 
+    # Compress JSON responses for clients that accept it
+    register_compression(api)
+
     # Register error handlers
     register_error_handlers(api)
 
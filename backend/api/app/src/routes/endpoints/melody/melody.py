@@ -1,9 +1,21 @@
-import asyncio
+import json
 import os
+import re
+import time
 import traceback
-from quart import Blueprint, jsonify, request, send_from_directory, current_app
+from quart import Blueprint, Response, jsonify, request, send_from_directory, current_app
 from app.src.services.melody_generator import generate_melody as generate_melody_service
-from app.src.services.melody_generator import get_available_models
+from app.src.services.melody_generator import generate_melodies, get_cached_models
+from app.src.utils.http_cache import CachedJSON, mark_immutable
+
+# Generated melodies are named after a hash of their content, so they never change
+CONTENT_NAMED_FILE = re.compile(r'^generated_melody_.+_(?P<hash>[0-9a-f]{16})\.mid$')
+
+# How long clients and proxies may cache the model list, in seconds
+MODELS_MAX_AGE = int(os.environ.get('MODELS_MAX_AGE', 300))
+
+# How long clients and proxies may cache melody files without a content hash, in seconds
+DOWNLOAD_MAX_AGE = 3600
 
 melody_bp = Blueprint('melody', __name__)
 
@@ -27,25 +39,23 @@ async def get_models():
     """
     Retrieve and return a list of available melody generation models.
 
+    The response body and its ETag are built once per set of loaded models,
+    and conditional requests are answered with 304 Not Modified.
+
     Returns:
         JSON: A list of available models.
     """
     try:
-        current_app.logger.debug("Entering get_models route handler")
-        current_app.logger.debug(f"Current app config: {current_app.config}")
-
-        # Retrieve the cached models from the app config
-        models = current_app.config.get('MODELS')
-        if not models:
-            # If models are not cached, load them
-            current_app.logger.info("Models not cached, loading models")
-            models = await get_available_models()
-            current_app.config['MODELS'] = models
-
-        current_app.logger.debug(f"Models retrieved: {models}")
-        model_list = [{'id': model_id, 'name': model_id} for model_id in models.keys()]
-        current_app.logger.debug(f"Returning model list: {model_list}")
-        return jsonify(model_list)
+        # Retrieve the cached models, loading them if they aren't cached yet
+        models = await get_cached_models()
+
+        cached = current_app.config.get('MODELS_RESPONSE')
+        if cached is None or cached[0] != list(models):
+            model_list = [{'id': model_id, 'name': model_id} for model_id in models.keys()]
+            cached = (list(models), CachedJSON(model_list))
+            current_app.config['MODELS_RESPONSE'] = cached
+
+        return await cached[1].make_response(MODELS_MAX_AGE)
     except Exception as e:
         current_app.logger.error(f"Error fetching models: {str(e)}")
         current_app.logger.error(f"Traceback: {traceback.format_exc()}")
@@ -63,22 +73,19 @@ async def generate_melody():
         JSON: A message and the filename of the generated melody.
     """
     try:
-        current_app.logger.debug("Entering generate_melody endpoint")
         data = await request.get_json()
         model_id = data.get('model_id')
 
-        current_app.logger.debug(f"Received request with model_id: {model_id}")
+        current_app.logger.debug("Received request with model_id: %s", model_id)
 
         if not model_id:
             current_app.logger.error("No model_id provided")
             return jsonify({"error": "No model_id provided"}), 400
 
-        current_app.logger.debug(f"Calling generate_melody_service with model_id: {model_id}")
+        # The service runs the generation on the inference executor, so the event loop isn't blocked
+        output_file = await generate_melody_service(model_id)
 
-        # Run the melody generation in a separate thread to avoid blocking the event loop
-        output_file = await asyncio.to_thread(_generate_and_save_melody, model_id)
-
-        current_app.logger.debug(f"Generated melody file: {output_file}")
+        current_app.logger.debug("Generated melody file: %s", output_file)
 
         return jsonify({
             "message": "Melody generated successfully",
@@ -92,34 +99,67 @@ async def generate_melody():
         current_app.logger.error(f"Traceback: {traceback.format_exc()}")
         return jsonify({"error": "An unexpected error occurred while generating the melody"}), 500
 
-def _generate_and_save_melody(model_id):
+@melody_bp.route('/compare', methods=['POST'])
+async def compare_models():
     """
-    Synchronous wrapper function to generate and save the melody.
+    Generate one melody from each of several models concurrently.
 
-    This function runs in a separate thread using asyncio.to_thread
-    to avoid blocking the main event loop.
+    All models run at the same time on the inference executor, so comparing
+    several models takes about as long as the slowest one. Results are
+    streamed as newline-delimited JSON in the order the models finish,
+    followed by a summary line with the total time.
 
-    Args:
-        model_id (str): The ID of the model to use for generation.
+    Expects:
+        Optional JSON payload with a 'model_ids' list. Defaults to every loaded model.
 
     Returns:
-        str: The path to the generated melody file.
+        NDJSON stream: One object per model with 'model_id', 'duration_ms' and
+        'file_name' (or 'error'), then a final object with 'total_ms'.
     """
-    # Since this function is running in a separate thread, we can create a new event loop
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
     try:
-        # Call the asynchronous generate_melody_service function
-        output_file = loop.run_until_complete(generate_melody_service(model_id))
-    finally:
-        loop.close()
-    return output_file
+        data = await request.get_json(silent=True) or {}
+        model_ids = data.get('model_ids')
+
+        if model_ids is None:
+            model_ids = list((await get_cached_models()).keys())
+        elif not isinstance(model_ids, list) or not all(isinstance(m, str) for m in model_ids):
+            return jsonify({"error": "model_ids must be a list of model IDs"}), 400
+
+        # Drop duplicates while keeping the requested order
+        model_ids = list(dict.fromkeys(model_ids))
+        if not model_ids:
+            return jsonify({"error": "No models available to compare"}), 400
+
+        start_time = time.perf_counter()
+        results = generate_melodies(model_ids)
+        # Pull the first result now so invalid model IDs surface as a 400 rather than mid-stream
+        first_result = await results.__anext__()
+    except ValueError as ve:
+        current_app.logger.error(f"ValueError in compare_models: {str(ve)}")
+        return jsonify({"error": str(ve)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error comparing models: {str(e)}")
+        current_app.logger.error(f"Traceback: {traceback.format_exc()}")
+        return jsonify({"error": "An unexpected error occurred while comparing models"}), 500
+
+    async def stream_results():
+        yield json.dumps(first_result) + "\n"
+        async for result in results:
+            yield json.dumps(result) + "\n"
+        total_ms = round((time.perf_counter() - start_time) * 1000, 1)
+        yield json.dumps({"models": len(model_ids), "total_ms": total_ms}) + "\n"
+
+    return Response(stream_results(), mimetype='application/x-ndjson')
 
 @melody_bp.route('/download/<filename>', methods=['GET'])
 async def download_file(filename):
     """
     Serve a generated melody file for download.
 
+    Responses carry ETag and Last-Modified validators and support
+    conditional and Range requests. Files named after their content hash
+    are marked immutable, so clients and proxies never revalidate them.
+
     Args:
         filename (str): The name of the file to download.
 
@@ -127,9 +167,15 @@ async def download_file(filename):
         The requested file as an attachment.
     """
     try:
-        return await send_from_directory(
-            current_app.config['OUTPUT_DIR'], filename, as_attachment=True
+        match = CONTENT_NAMED_FILE.match(filename)
+        response = await send_from_directory(
+            current_app.config['OUTPUT_DIR'], filename, as_attachment=True,
+            cache_timeout=DOWNLOAD_MAX_AGE, conditional=not match
         )
+        if match:
+            mark_immutable(response, match.group('hash'))
+            await response.make_conditional(request, accept_ranges=True, complete_length=response.content_length)
+        return response
     except Exception as e:
         current_app.logger.error(f"Error downloading file {filename}: {str(e)}")
         return jsonify({"error": "File not found"}), 404
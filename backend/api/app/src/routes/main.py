@@ -16,6 +16,20 @@ async def health_check():
         current_app.logger.error(f"Database health check failed: {str(e)}")
         return jsonify({"status": "unhealthy", "database": "error", "message": "Database health check failed"}), 500
 
+@bp.route('/health/startup', methods=['GET'])
+async def startup_timing():
+    """
+    Report how long the API took to become ready.
+
+    Returns:
+        JSON: Import time per heavy module, load time per model, total model
+        load time and total time to ready, all in seconds.
+    """
+    timing = current_app.config.get('STARTUP_TIMING')
+    if timing is None:
+        return jsonify({"status": "starting"}), 503
+    return jsonify(timing), 200
+
 @bp.route('/')
 async def index():
     try:
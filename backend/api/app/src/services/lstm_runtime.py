@@ -0,0 +1,239 @@
+import json
+import numpy as np
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+def _hard_sigmoid(x):
+    return np.clip(0.2 * x + 0.5, 0.0, 1.0)
+
+def _softmax(x):
+    e = np.exp(x - np.max(x, axis=-1, keepdims=True))
+    return e / np.sum(e, axis=-1, keepdims=True)
+
+# Kernels with at least this share of zeros are multiplied as sparse matrices; below it dense products are faster
+SPARSE_MIN_SPARSITY = 0.7
+
+def _matmul(x, kernel):
+    """Return x @ kernel. Sparse kernels are stored transposed as CSR, so the product is a CSR mat-vec."""
+    if isinstance(kernel, np.ndarray):
+        return x @ kernel
+    return (kernel @ x.T).T
+
+_ACTIVATIONS = {
+    'sigmoid': _sigmoid,
+    'hard_sigmoid': _hard_sigmoid,
+    'tanh': np.tanh,
+    'relu': lambda x: np.maximum(x, 0.0),
+    'softmax': _softmax,
+    'linear': lambda x: x,
+    None: lambda x: x,
+}
+
+class LSTMRuntime:
+    """
+    A NumPy re-implementation of the stacked LSTM melody models.
+
+    Keras only exposes the models as whole-window predictors, which means
+    every note pushes the full 100-token window through the network again.
+    This runtime instead steps the LSTM layers one token at a time while
+    carrying the hidden (h) and cell (c) states forward, so generation can
+    continue from a saved state. Dropout layers are inference no-ops and are
+    skipped.
+    """
+
+    def __init__(self, lstm_layers, dense_layers):
+        """
+        Initialise the runtime from extracted layer weights.
+
+        Args:
+            lstm_layers (list): Per LSTM layer, a dict with 'kernel', 'recurrent_kernel',
+                'bias', 'activation' and 'recurrent_activation'. Kernels are arrays, or
+                transposed scipy CSR matrices.
+            dense_layers (list): Per Dense layer, a dict with 'kernel', 'bias' and 'activation'.
+        """
+        self.lstm_layers = lstm_layers
+        self.dense_layers = dense_layers
+        # The bias holds the four gates side by side, whichever way a sparse kernel is stored
+        self.units = [layer['bias'].shape[0] // 4 for layer in lstm_layers]
+
+    @staticmethod
+    def unsupported_layers(model):
+        """
+        List the layers of a Keras model that keep it from running in the runtime.
+
+        Args:
+            model (keras.Model): A loaded Keras model.
+
+        Returns:
+            list: Descriptions of the unsupported layers; empty if the runtime can run the model.
+        """
+        unsupported, seen_dense = [], False
+        for layer in model.layers:
+            kind = type(layer).__name__
+            if kind == 'LSTM' and seen_dense:
+                unsupported.append(f"LSTM layer {layer.name} after a Dense layer")
+            elif kind not in ('LSTM', 'Dense', 'Dropout', 'InputLayer'):
+                unsupported.append(f"{kind} layer {layer.name}")
+            seen_dense |= kind == 'Dense'
+        return unsupported
+
+    @classmethod
+    def from_keras(cls, model):
+        """
+        Build a runtime from a loaded Keras Sequential model.
+
+        Args:
+            model (keras.Model): A model made of LSTM, Dropout and Dense layers.
+
+        Returns:
+            LSTMRuntime: The equivalent NumPy runtime.
+
+        Raises:
+            ValueError: If the model contains a layer type the runtime can't run.
+        """
+        unsupported = cls.unsupported_layers(model)
+        if unsupported:
+            raise ValueError(f"Unsupported layers for LSTM runtime: {', '.join(unsupported)}")
+
+        lstm_layers, dense_layers = [], []
+        for layer in model.layers:
+            kind = type(layer).__name__
+            config = layer.get_config()
+            weights = [np.asarray(w, dtype=np.float32) for w in layer.get_weights()]
+            if kind == 'LSTM':
+                lstm_layers.append({
+                    'kernel': weights[0],
+                    'recurrent_kernel': weights[1],
+                    'bias': weights[2] if config.get('use_bias', True) else np.zeros(weights[1].shape[1], np.float32),
+                    'activation': config.get('activation', 'tanh'),
+                    'recurrent_activation': config.get('recurrent_activation', 'sigmoid'),
+                })
+            elif kind == 'Dense':
+                dense_layers.append({
+                    'kernel': weights[0],
+                    'bias': weights[1] if config.get('use_bias', True) else np.zeros(weights[0].shape[1], np.float32),
+                    'activation': config.get('activation', 'linear'),
+                })
+        return cls(lstm_layers, dense_layers)
+
+    @classmethod
+    def from_sparse_file(cls, path, min_sparsity=SPARSE_MIN_SPARSITY):
+        """
+        Build a runtime from the sparse weights the trainer exports for pruned models.
+
+        The file holds every kernel transposed in CSR form. Kernels that are
+        sparse enough stay sparse and are multiplied with scipy; the rest are
+        expanded to dense arrays.
+
+        Args:
+            path (str): The model's .sparse.npz file.
+            min_sparsity (float): Share of zeros a kernel needs to be kept sparse.
+
+        Returns:
+            LSTMRuntime: The runtime.
+        """
+        from scipy.sparse import csr_matrix
+
+        def load_kernel(data, prefix):
+            shape = tuple(data[f"{prefix}_shape"])
+            matrix = csr_matrix((data[f"{prefix}_data"], data[f"{prefix}_indices"], data[f"{prefix}_indptr"]),
+                                shape=shape)
+            if 1 - matrix.nnz / (shape[0] * shape[1]) >= min_sparsity:
+                return matrix
+            return np.ascontiguousarray(matrix.toarray().T)
+
+        lstm_layers, dense_layers = [], []
+        with np.load(path) as data:
+            for i, layer in enumerate(json.loads(str(data['layers']))):
+                prefix = f"layer{i}"
+                if layer['type'] == 'LSTM':
+                    lstm_layers.append({
+                        'kernel': load_kernel(data, f"{prefix}_kernel"),
+                        'recurrent_kernel': load_kernel(data, f"{prefix}_recurrent_kernel"),
+                        'bias': data[f"{prefix}_bias"],
+                        'activation': layer['activation'],
+                        'recurrent_activation': layer['recurrent_activation'],
+                    })
+                else:
+                    dense_layers.append({
+                        'kernel': load_kernel(data, f"{prefix}_kernel"),
+                        'bias': data[f"{prefix}_bias"],
+                        'activation': layer['activation'],
+                    })
+        return cls(lstm_layers, dense_layers)
+
+    def initial_states(self, batch_size=1):
+        """
+        Return zeroed (h, c) states for every LSTM layer.
+
+        Args:
+            batch_size (int): Number of sequences decoded in parallel.
+
+        Returns:
+            list: One (h, c) tuple per LSTM layer.
+        """
+        return [(np.zeros((batch_size, units), np.float32), np.zeros((batch_size, units), np.float32))
+                for units in self.units]
+
+    def _lstm_step(self, layer, x, h, c):
+        """Advance one LSTM layer by a single timestep (Keras gate order i, f, c, o)."""
+        z = _matmul(x, layer['kernel']) + _matmul(h, layer['recurrent_kernel']) + layer['bias']
+        i, f, g, o = np.split(z, 4, axis=-1)
+        recurrent_activation = _ACTIVATIONS[layer['recurrent_activation']]
+        activation = _ACTIVATIONS[layer['activation']]
+        c = recurrent_activation(f) * c + recurrent_activation(i) * activation(g)
+        h = recurrent_activation(o) * activation(c)
+        return h, c
+
+    def step(self, inputs, states):
+        """
+        Feed one input value per sequence through the LSTM stack.
+
+        Args:
+            inputs (numpy.ndarray): Normalised inputs of shape (batch,).
+            states (list): The (h, c) state of each LSTM layer.
+
+        Returns:
+            list: The updated (h, c) state of each LSTM layer.
+        """
+        x = np.asarray(inputs, dtype=np.float32).reshape(-1, 1)
+        new_states = []
+        for layer, (h, c) in zip(self.lstm_layers, states):
+            h, c = self._lstm_step(layer, x, h, c)
+            new_states.append((h, c))
+            x = h
+        return new_states
+
+    def run_sequence(self, sequences, states=None):
+        """
+        Feed whole input sequences through the LSTM stack.
+
+        Args:
+            sequences (numpy.ndarray): Normalised inputs of shape (batch, timesteps).
+            states (list, optional): Starting states. Defaults to zeroed states.
+
+        Returns:
+            list: The (h, c) state of each LSTM layer after the last timestep.
+        """
+        sequences = np.asarray(sequences, dtype=np.float32)
+        if states is None:
+            states = self.initial_states(sequences.shape[0])
+        for t in range(sequences.shape[1]):
+            states = self.step(sequences[:, t], states)
+        return states
+
+    def predict(self, states):
+        """
+        Compute next-token probabilities from the top LSTM layer's hidden state.
+
+        Args:
+            states (list): The (h, c) state of each LSTM layer.
+
+        Returns:
+            numpy.ndarray: Probabilities of shape (batch, n_vocab).
+        """
+        x = states[-1][0]
+        for layer in self.dense_layers:
+            x = _ACTIVATIONS[layer['activation']](_matmul(x, layer['kernel']) + layer['bias'])
+        return x
@@ -1,36 +1,140 @@
 import os
 import time
-import pickle
 import traceback
 import json
 import asyncio
+import logging
+import importlib
+import sys
+import contextvars
+import functools
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from quart import current_app
-from tensorflow import keras
-from tensorflow.keras import layers
-from music21 import instrument, note, stream, chord
+from app.src.utils.http_cache import content_hash
+from .lstm_runtime import LSTMRuntime
+from .seed_cache import SeedStateCache, _seed_inputs, load_model_data
+from .quantized_model import QuantizedModel, quantized_model_path
+from .model_bundle import (ARCHITECTURE_FILE, BUNDLE_FILE_ID, WEIGHTS_FILE, load_bundle_data, read_manifest,
+                           verify_bundle)
 
-def custom_load_model(filepath):
+logger = logging.getLogger(__name__)
+
+# TensorFlow and music21 are imported on first use; this records how long each import took
+_import_timings = {}
+
+def _lazy_import(module_name):
+    """
+    Import a heavy module on first use and record how long the import took.
+
+    Keeping TensorFlow and music21 out of module import time makes importing
+    this module (and so app startup and the test suite) cheap.
+
+    Args:
+        module_name (str): The name of the module to import.
+
+    Returns:
+        module: The imported module.
+    """
+    module = sys.modules.get(module_name)
+    if module is None:
+        start_time = time.perf_counter()
+        module = importlib.import_module(module_name)
+        _import_timings[module_name] = round(time.perf_counter() - start_time, 3)
+    return module
+
+def get_import_timings():
+    """
+    Return the time in seconds spent importing each lazily imported module.
+
+    Returns:
+        dict: Import times keyed by module name.
+    """
+    return dict(_import_timings)
+
+# Shared thread pool used for all model inference, created on first use
+_inference_executor = None
+
+# Precomputed post-seed states of models that have a seed cache, keyed by model ID
+_seed_caches = {}
+
+# NumPy runtimes with sparse weights, for pruned models exported with a .sparse.npz file, keyed by model ID
+_sparse_runtimes = {}
+
+# Decoding mode of each model with several prediction heads, keyed by model ID (see MULTI_TOKEN_DECODING)
+_multi_token_decoding = {}
+
+# Bundle directory of each model listed in MODEL_DIR/manifest.json, keyed by model ID
+_bundle_dirs = {}
+
+# Serialises the first load of each bundled model, keyed by model ID
+_bundle_locks = {}
+
+def get_inference_executor():
+    """
+    Return the shared thread pool used to run model inference.
+
+    The pool size is taken from the INFERENCE_WORKERS environment variable and
+    otherwise uses the ThreadPoolExecutor default, so several models can
+    generate at once even on a single-CPU host.
+
+    Returns:
+        ThreadPoolExecutor: The inference executor.
+    """
+    global _inference_executor
+    if _inference_executor is None:
+        workers = os.environ.get('INFERENCE_WORKERS')
+        workers = int(workers) if workers else None
+        _inference_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='inference')
+    return _inference_executor
+
+def _run_in_executor(func, *args):
+    """
+    Run a function on the inference executor, carrying over the caller's context.
+
+    Copying the context keeps context variables such as the request ID
+    available to log records made on the executor thread.
+
+    Args:
+        func (callable): The function to run.
+        *args: Arguments for the function.
+
+    Returns:
+        asyncio.Future: A future for the function's result.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return loop.run_in_executor(get_inference_executor(), functools.partial(context.run, func, *args))
+
+def custom_load_model(filepath, architecture_path=None):
     """
     Custom model loading function to handle potential version incompatibilities.
     
     Args:
         filepath (str): Path to the .h5 model file.
+        architecture_path (str, optional): JSON model config, for weights-only files
+            such as a bundle's model.weights.h5. Defaults to the config in the .h5 file.
     
     Returns:
         keras.Model: Loaded Keras model.
     """
     import h5py
-    
+    keras = _lazy_import('tensorflow').keras
+
     def create_layer(layer_config):
         layer_class = getattr(keras.layers, layer_config['class_name'])
         return layer_class.from_config(layer_config['config'])
 
-    with h5py.File(filepath, mode='r') as f:
-        model_config = f.attrs.get('model_config')
-        if isinstance(model_config, bytes):
-            model_config = model_config.decode('utf-8')
-        model_config = json.loads(model_config)
+    if architecture_path:
+        with open(architecture_path) as f:
+            model_config = f.read()
+    else:
+        with h5py.File(filepath, mode='r') as f:
+            model_config = f.attrs.get('model_config')
+    if isinstance(model_config, bytes):
+        model_config = model_config.decode('utf-8')
+    model_config = json.loads(model_config)
 
     # Create a new Sequential model
     model = keras.Sequential()
@@ -45,65 +149,274 @@ def custom_load_model(filepath):
 
     return model
 
-async def get_available_models():
+async def preload_modules(*module_names):
     """
-    Asynchronously load available models from the configured model directory.
-    
+    Import heavy modules on the inference executor ahead of first use.
+
+    Args:
+        *module_names (str): The names of the modules to import.
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_inference_executor()
+    await asyncio.gather(*(loop.run_in_executor(executor, _lazy_import, name) for name in module_names))
+
+def _load_model(model_id, model_dir, file_id, model_path, precision=None, decoding='verify', architecture_path=None):
+    """
+    Load a model and set up the runtimes it is generated with.
+
+    If a precision is given and the model has a TFLite export at that
+    precision, the export is loaded instead of the Keras model. Seed caches
+    hold states of the float model, so they aren't used with an export.
+    Otherwise, a pruned model's <file_id>.sparse.npz weights are loaded
+    into a NumPy runtime that generates with sparse matrix products.
+    Models that predict several tokens at once are decoded in the given mode.
+
+    Args:
+        model_id (str): The ID of the model.
+        model_dir (str): The directory holding the model's files.
+        file_id (str): Base name of the model's exports and seed cache in model_dir.
+        model_path (str): Path to the .h5 model (or weights) file.
+        precision (str, optional): Precision of the TFLite export to prefer, e.g. 'int8'.
+        decoding (str): How a multi-token model is decoded: 'verify', 'draft' or 'single'.
+        architecture_path (str, optional): JSON model config, for weights-only files.
+
     Returns:
-        dict: A dictionary of loaded models and their associated data.
+        The Keras model or its QuantizedModel export.
+    """
+    tflite_path = quantized_model_path(model_dir, file_id, precision) if precision else None
+    if tflite_path and os.path.exists(tflite_path):
+        model = QuantizedModel(tflite_path, _lazy_import('tensorflow').lite.Interpreter)
+    else:
+        if tflite_path:
+            logger.warning("No %s export of model %s, using the Keras model", precision, model_id)
+        model = custom_load_model(model_path, architecture_path)
+
+    seed_cache = None
+    if not isinstance(model, QuantizedModel):
+        seed_cache = SeedStateCache.load(model_dir, file_id, model, model_path)
+    if seed_cache is not None:
+        _seed_caches[model_id] = seed_cache
+    else:
+        _seed_caches.pop(model_id, None)
+
+    sparse_path = os.path.join(model_dir, f"{file_id}.sparse.npz")
+    if os.path.exists(sparse_path) and not isinstance(model, QuantizedModel):
+        _sparse_runtimes[model_id] = LSTMRuntime.from_sparse_file(sparse_path)
+    else:
+        _sparse_runtimes.pop(model_id, None)
+
+    if _prediction_heads(model) > 1:
+        _multi_token_decoding[model_id] = decoding
+    else:
+        _multi_token_decoding.pop(model_id, None)
+    return model
+
+def _load_model_entry(model_id, model_path, data_path, precision=None, decoding='verify'):
+    """
+    Load a model, its pickled training data and its seed cache if it has one.
+
+    This runs on the inference executor so several models can load at once.
+
+    Args:
+        model_id (str): The ID of the model.
+        model_path (str): Path to the .h5 model file.
+        data_path (str): Path to the model's _data.pkl file.
+        precision (str, optional): Precision of the TFLite export to prefer, e.g. 'int8'.
+        decoding (str): How a multi-token model is decoded: 'verify', 'draft' or 'single'.
+
+    Returns:
+        tuple: The model entry and the load time in seconds.
+    """
+    start_time = time.perf_counter()
+    model = _load_model(model_id, os.path.dirname(model_path), model_id, model_path, precision, decoding)
+
+    network_input, pitchnames, note_to_int, n_vocab = load_model_data(data_path)
+
+    return (model, network_input, pitchnames, note_to_int, n_vocab), time.perf_counter() - start_time
+
+def _load_bundle_entry(model_id, bundle_dir, precision=None, decoding='verify'):
+    """
+    Verify and load a model bundle exported by the trainer.
+
+    Args:
+        model_id (str): The ID of the model.
+        bundle_dir (str): The bundle directory.
+        precision (str, optional): Precision of the TFLite export to prefer, e.g. 'int8'.
+        decoding (str): How a multi-token model is decoded: 'verify', 'draft' or 'single'.
+
+    Returns:
+        tuple: The model entry and the load time in seconds.
+
+    Raises:
+        ValueError: If a file of the bundle is missing or doesn't match its checksum.
+    """
+    start_time = time.perf_counter()
+    verify_bundle(bundle_dir)
+    model = _load_model(model_id, bundle_dir, BUNDLE_FILE_ID, os.path.join(bundle_dir, WEIGHTS_FILE), precision,
+                        decoding, os.path.join(bundle_dir, ARCHITECTURE_FILE))
+    network_input, pitchnames, note_to_int, n_vocab = load_bundle_data(bundle_dir)
+    return (model, network_input, pitchnames, note_to_int, n_vocab), time.perf_counter() - start_time
+
+async def get_available_models(timings=None):
+    """
+    Asynchronously find and load the available models in the configured model directory.
+
+    If the directory has a manifest.json, the models in it are listed and
+    only those in PRELOAD_MODELS are loaded now. The others map to None until
+    get_model loads them on first use. Every .h5 model with a _data.pkl that
+    has no bundle of the same ID is loaded too. Models are loaded concurrently on the
+    inference executor, after TensorFlow has been imported once up front.
+
+    Args:
+        timings (dict, optional): If given, filled with the load time in seconds of each model loaded.
+
+    Returns:
+        dict: A dictionary of loaded models and their associated data (None for models not loaded yet).
     
     Raises:
         KeyError: If MODEL_DIR configuration is missing.
         FileNotFoundError: If the model directory doesn't exist.
     """
     current_app.logger.debug("Entering get_available_models function")
-    current_app.logger.debug(f"Current app config: {current_app.config}")
 
     if 'MODEL_DIR' not in current_app.config:
         current_app.logger.error("MODEL_DIR not found in app config")
         raise KeyError("MODEL_DIR configuration is missing")
 
     model_dir = current_app.config['MODEL_DIR']
-    current_app.logger.info(f"Loading models from {model_dir}")
+    precision = current_app.config.get('MODEL_PRECISION')
+    decoding = current_app.config.get('MULTI_TOKEN_DECODING', 'verify')
+    current_app.logger.info("Loading models from %s", model_dir)
 
     if not os.path.exists(model_dir):
-        current_app.logger.error(f"Model directory does not exist: {model_dir}")
+        current_app.logger.error("Model directory does not exist: %s", model_dir)
         raise FileNotFoundError(f"Model directory not found: {model_dir}")
 
-    models = {}
-    for filename in os.listdir(model_dir):
-        current_app.logger.debug(f"Processing file: {filename}")
+    bundles = read_manifest(model_dir) or {}
+    _bundle_dirs.clear()
+    _bundle_dirs.update(bundles)
+    models = dict.fromkeys(bundles)
+    loads = {}
+    if bundles:
+        preload = [model_id for model_id in current_app.config.get('PRELOAD_MODELS') or [] if model_id in bundles]
+        current_app.logger.info("Found %d models in the manifest, preloading %s", len(bundles), preload)
+        loads = {model_id: (_load_bundle_entry, model_id, bundles[model_id], precision, decoding)
+                 for model_id in preload}
+
+    # Models saved before bundles, or not exported as one, are still served from their .h5 files
+    for filename in sorted(os.listdir(model_dir)):
         if filename.endswith('.h5'):
             model_id = os.path.splitext(filename)[0]
+            if model_id in bundles:
+                continue
             model_path = os.path.join(model_dir, filename)
-            data_path = f"{model_path}_data.pkl"
-
-            current_app.logger.debug(f"Attempting to load model: {model_path}")
-            current_app.logger.debug(f"Attempting to load data: {data_path}")
-
-            try:
-                # Use run_in_executor for potentially blocking I/O operations
-                loop = asyncio.get_event_loop()
-                model = await loop.run_in_executor(None, lambda: custom_load_model(model_path))
-                
-                with open(data_path, 'rb') as f:
-                    network_input, pitchnames, note_to_int, n_vocab = pickle.load(f)
-                
-                models[model_id] = (model, network_input, pitchnames, note_to_int, n_vocab)
-                current_app.logger.info(f"Successfully loaded model and data: {model_id}")
-            except Exception as e:
-                current_app.logger.error(f"Error loading model {model_id}: {str(e)}")
-                current_app.logger.error(f"Traceback: {traceback.format_exc()}")
-
-    current_app.logger.debug(f"Returning models: {list(models.keys())}")
+            if not os.path.exists(f"{model_path}_data.pkl"):
+                current_app.logger.warning("Skipping model %s: it has no %s_data.pkl", model_id, filename)
+                continue
+            models[model_id] = None
+            loads[model_id] = (_load_model_entry, model_id, model_path, f"{model_path}_data.pkl", precision,
+                               decoding)
+    models = dict(sorted(models.items()))
+
+    if not loads:
+        return models
+
+    # Import TensorFlow once before fanning out, so its cost isn't charged to every model
+    await preload_modules('tensorflow')
+
+    loop = asyncio.get_running_loop()
+    executor = get_inference_executor()
+
+    results = await asyncio.gather(
+        *(loop.run_in_executor(executor, *load) for load in loads.values()),
+        return_exceptions=True
+    )
+
+    for model_id, result in zip(loads, results):
+        if isinstance(result, Exception):
+            current_app.logger.error("Error loading model %s: %s", model_id, result)
+            current_app.logger.error(
+                "Traceback: %s", "".join(traceback.format_exception(type(result), result, result.__traceback__))
+            )
+            models.pop(model_id, None)
+            continue
+        models[model_id], duration = result
+        if timings is not None:
+            timings[model_id] = round(duration, 3)
+        current_app.logger.info("Successfully loaded model and data: %s (%.2fs)", model_id, duration)
+
+    current_app.logger.debug("Returning models: %s", list(models))
+    return models
+
+async def get_cached_models():
+    """
+    Return the preloaded models, loading and caching them if necessary.
+
+    Returns:
+        dict: A dictionary of loaded models and their associated data.
+    """
+    models = current_app.config.get('MODELS')
+    if not models:
+        current_app.logger.info("Models not cached, loading models")
+        models = await get_available_models()
+        current_app.config['MODELS'] = models
     return models
 
+async def get_model(model_id):
+    """
+    Return a model's entry, loading it from its bundle on first use.
+
+    Concurrent requests for a model that isn't loaded yet wait for a single load.
+
+    Args:
+        model_id (str): The ID of the model.
+
+    Returns:
+        tuple: The loaded model and its associated data.
+
+    Raises:
+        ValueError: If the model ID is unknown or its bundle fails verification.
+    """
+    models = await get_cached_models()
+    if model_id not in models:
+        raise ValueError(f"Invalid model ID: {model_id}")
+    if models[model_id] is None:
+        async with _bundle_locks.setdefault(model_id, asyncio.Lock()):
+            if models[model_id] is None:
+                models[model_id], duration = await _run_in_executor(
+                    _load_bundle_entry, model_id, _bundle_dirs[model_id], current_app.config.get('MODEL_PRECISION'),
+                    current_app.config.get('MULTI_TOKEN_DECODING', 'verify')
+                )
+                current_app.logger.info("Loaded model %s from its bundle on first use (%.2fs)", model_id, duration)
+    return models[model_id]
+
+def _get_output_dir():
+    """
+    Return the configured output directory, creating it if it doesn't exist.
+
+    Returns:
+        str: The output directory path.
+
+    Raises:
+        ValueError: If OUTPUT_DIR is missing from the app config.
+    """
+    if 'OUTPUT_DIR' not in current_app.config:
+        current_app.logger.error("OUTPUT_DIR not found in app config")
+        raise ValueError("OUTPUT_DIR configuration is missing")
+
+    output_dir = current_app.config['OUTPUT_DIR']
+    if not os.path.exists(output_dir):
+        current_app.logger.warning("Output directory does not exist, creating: %s", output_dir)
+        os.makedirs(output_dir, exist_ok=True)
+    return output_dir
+
 async def generate_melody(model_id):
     """
     Generate a new melody using the specified model.
 
     This function uses the provided model ID to generate a new melody,
-    converts it to MIDI format, and saves it to a file.
+    converts it to MIDI format, and saves it to a file. The work runs on
+    the shared inference executor so the event loop is never blocked.
 
     Args:
         model_id (str): The ID of the model to use for generation.
@@ -115,54 +428,127 @@ async def generate_melody(model_id):
         ValueError: If the specified model_id is not found.
         Exception: If there's an error during melody generation or saving.
     """
-    current_app.logger.debug(f"Entering generate_melody function with model_id: {model_id}")
+    current_app.logger.debug("Entering generate_melody function with model_id: %s", model_id)
 
-    models = await get_available_models()
+    models = await get_cached_models()
     if model_id not in models:
-        current_app.logger.error(f"Invalid model ID: {model_id}")
+        current_app.logger.error("Invalid model ID: %s", model_id)
         raise ValueError(f"Invalid model ID: {model_id}")
 
-    model, network_input, pitchnames, note_to_int, n_vocab = models[model_id]
+    output_dir = _get_output_dir()
+    model_data = await get_model(model_id)
+    output_file, _ = await _run_in_executor(_generate_melody_file, model_id, model_data, output_dir)
+    return output_file
+
+async def generate_melodies(model_ids):
+    """
+    Generate one melody from each of several models concurrently.
+
+    Every model is submitted to the inference executor at once and results are
+    yielded in completion order, so the caller can forward each one as soon as
+    it is ready. A failure in one model is reported in its result and does not
+    cancel the others.
+
+    Args:
+        model_ids (list): The IDs of the models to generate with.
+
+    Yields:
+        dict: Per-model result with 'model_id', 'duration_ms' and either
+        'file_name' or 'error'.
+
+    Raises:
+        ValueError: If any of the model IDs is not found.
+    """
+    models = await get_cached_models()
+    unknown = [model_id for model_id in model_ids if model_id not in models]
+    if unknown:
+        raise ValueError(f"Invalid model ID(s): {', '.join(unknown)}")
+
+    output_dir = _get_output_dir()
+
+    async def run(model_id):
+        try:
+            model_data = await get_model(model_id)
+            output_file, duration = await _run_in_executor(
+                _generate_melody_file, model_id, model_data, output_dir
+            )
+            return {
+                "model_id": model_id,
+                "file_name": os.path.basename(output_file),
+                "duration_ms": round(duration * 1000, 1)
+            }
+        except Exception as e:
+            logger.exception("Error generating melody with model %s", model_id)
+            return {"model_id": model_id, "error": str(e)}
 
-    current_app.logger.debug(f"Model loaded. n_vocab: {n_vocab}, type: {type(n_vocab)}")
-    current_app.logger.debug(f"network_input shape: {network_input.shape}")
-    current_app.logger.debug(f"Number of unique pitches: {len(pitchnames)}")
+    for finished in asyncio.as_completed([run(model_id) for model_id in model_ids]):
+        yield await finished
+
+def _generate_melody_file(model_id, model_data, output_dir):
+    """
+    Generate a melody with one model and write it to a MIDI file.
+
+    This is the synchronous unit of work that runs on the inference executor.
+
+    Args:
+        model_id (str): The ID of the model, used in the output filename.
+        model_data (tuple): The loaded model and its associated data.
+        output_dir (str): Directory the MIDI file is written to.
+
+    Returns:
+        tuple: The path to the generated file and the generation time in seconds.
+    """
+    start_time = time.perf_counter()
+    model, network_input, pitchnames, note_to_int, n_vocab = model_data
+
+    logger.debug("Model loaded. n_vocab: %s, network_input shape: %s, unique pitches: %d",
+                 n_vocab, network_input.shape, len(pitchnames))
 
     if isinstance(n_vocab, dict):
-        current_app.logger.warning(f"n_vocab is a dictionary: {n_vocab}")
+        logger.warning("n_vocab is a dictionary: %s", n_vocab)
         n_vocab = len(pitchnames)
     elif not isinstance(n_vocab, (int, float)):
-        current_app.logger.warning(f"n_vocab is neither a number nor a dict: {n_vocab}")
+        logger.warning("n_vocab is neither a number nor a dict: %s", n_vocab)
         n_vocab = len(pitchnames)
 
-    current_app.logger.debug(f"Using n_vocab: {n_vocab}")
-
-    current_app.logger.debug("Generating notes for the melody")
+    seed_cache = _seed_caches.get(model_id)
+    sparse_runtime = _sparse_runtimes.get(model_id)
+    decoding = _multi_token_decoding.get(model_id)
+    if decoding is not None:
+        logger.debug("Generating notes for the melody, several per forward pass (%s)", decoding)
+        generated_notes = _generate_notes_multi(model, network_input, pitchnames, n_vocab, decoding=decoding)
+    elif seed_cache is not None:
+        logger.debug("Generating notes for the melody from the seed cache")
+        # The sparse runtime computes the same function as the cache's dense one, only faster
+        generated_notes = _generate_notes_stateful(sparse_runtime or seed_cache.runtime, seed_cache.sample_states(),
+                                                   pitchnames, n_vocab)
+    elif sparse_runtime is not None:
+        logger.debug("Generating notes for the melody with the sparse runtime")
+        seed = _seed_inputs(network_input, [np.random.randint(0, len(network_input))], n_vocab)
+        generated_notes = _generate_notes_stateful(sparse_runtime, sparse_runtime.run_sequence(seed),
+                                                   pitchnames, n_vocab)
+    else:
+        logger.debug("Generating notes for the melody")
+        generated_notes = _generate_notes(model, network_input, pitchnames, n_vocab)
+
+    # Write under a temporary name, then rename to a content-addressed name so
+    # the download can be cached as immutable and concurrent runs never collide
+    temp_file = os.path.join(output_dir, f".generating_{model_id}_{uuid.uuid4().hex}.mid")
     try:
-        generated_notes = await _generate_notes(model, network_input, pitchnames, n_vocab)
-    except Exception as e:
-        current_app.logger.error(f"Error in _generate_notes: {str(e)}")
-        current_app.logger.error(traceback.format_exc())
+        _create_midi(generated_notes, temp_file)
+        output_file = os.path.join(output_dir, f"generated_melody_{model_id}_{content_hash(temp_file)}.mid")
+        os.replace(temp_file, output_file)
+    except Exception:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
         raise
+    logger.debug("Saved MIDI to file: %s", output_file)
 
-    current_app.logger.debug("Converting notes to MIDI")
-    if 'OUTPUT_DIR' not in current_app.config:
-        current_app.logger.error("OUTPUT_DIR not found in app config")
-        raise ValueError("OUTPUT_DIR configuration is missing")
-
-    output_dir = current_app.config['OUTPUT_DIR']
-    if not os.path.exists(output_dir):
-        current_app.logger.warning(f"Output directory does not exist, creating: {output_dir}")
-        os.makedirs(output_dir)
-
-    output_file = os.path.join(output_dir, f"generated_melody_{int(time.time())}.mid")
-    current_app.logger.debug(f"Saving MIDI to file: {output_file}")
-    await _create_midi(generated_notes, output_file)
+    duration = time.perf_counter() - start_time
+    logger.debug("Melody generation complete. File saved: %s", output_file)
+    return output_file, duration
 
-    current_app.logger.debug(f"Melody generation complete. File saved: {output_file}")
-    return output_file
-
-async def _generate_notes(model, network_input, pitchnames, n_vocab, num_notes=500, temperature=1.0):
+def _generate_notes(model, network_input, pitchnames, n_vocab, num_notes=500, temperature=1.0):
     """
     Generate a sequence of notes using the provided model.
 
@@ -180,43 +566,170 @@ async def _generate_notes(model, network_input, pitchnames, n_vocab, num_notes=5
     Returns:
         A list of generated notes and chords.
     """
-    current_app.logger.debug(f"Entering _generate_notes. n_vocab: {n_vocab}")
+    logger.debug("Entering _generate_notes. n_vocab: %s", n_vocab)
     start = np.random.randint(0, len(network_input) - 1)
     int_to_note = dict((number, note) for number, note in enumerate(pitchnames))
     pattern = network_input[start]
     prediction_output = []
 
-    for note_index in range(num_notes):
+    for _ in range(num_notes):
         prediction_input = np.reshape(pattern, (1, len(pattern), 1))
-        current_app.logger.debug(f"Note {note_index}: prediction_input shape: {prediction_input.shape}")
-        current_app.logger.debug(f"Note {note_index}: n_vocab: {n_vocab}, type: {type(n_vocab)}")
-        
+
         try:
             prediction_input = prediction_input / float(n_vocab)
         except Exception as e:
-            current_app.logger.error(f"Error in normalizing prediction_input: {str(e)}")
-            current_app.logger.error(f"n_vocab: {n_vocab}, type: {type(n_vocab)}")
-            current_app.logger.error(f"prediction_input: {prediction_input}")
+            logger.error("Error in normalizing prediction_input: %s", e)
+            logger.error("n_vocab: %s, type: %s, prediction_input shape: %s",
+                         n_vocab, type(n_vocab), prediction_input.shape)
             raise
 
         prediction = model.predict(prediction_input, verbose=0)
         
-        # Apply temperature scaling
-        prediction = np.log(prediction) / temperature
-        exp_preds = np.exp(prediction)
-        prediction = exp_preds / np.sum(exp_preds)
-        
-        index = np.random.choice(range(len(prediction[0])), p=prediction[0])
+        index = _sample_index(prediction[0], temperature)
         result = int_to_note[index]
         prediction_output.append(result)
         
         pattern = np.append(pattern, index)
         pattern = pattern[1:]
     
-    current_app.logger.debug(f"Notes generated. Length: {len(prediction_output)}")
+    logger.debug("Notes generated. Length: %d", len(prediction_output))
     return prediction_output
 
-async def _create_midi(prediction_output, filename="generated_melody.mid"):
+def _prediction_heads(model):
+    """Return the number of following tokens a model predicts per window, 1 for single-head models."""
+    output_shape = getattr(model, 'output_shape', None)
+    return output_shape[1] if output_shape is not None and len(output_shape) == 3 else 1
+
+def _generate_notes_multi(model, network_input, pitchnames, n_vocab, num_notes=500, temperature=1.0,
+                          decoding='verify', min_acceptance=0.3):
+    """
+    Generate a sequence of notes with a model that predicts the next K tokens at once.
+
+    Head k of the model predicts the token k + 1 steps after the window, so one
+    forward pass drafts K tokens. Decoding modes:
+
+    - 'draft' keeps all K drafted tokens, one forward pass per K notes.
+    - 'verify' checks the drafts against the one-step head. The window is
+      extended by each prefix of the drafts and the K windows are run as one
+      batch. Head 1 of the window ending before draft j checks draft j: it is
+      accepted while its probability is at least min_acceptance times that of
+      the head's most likely token. The pass over the window with all accepted
+      drafts also supplies the next K drafts, so every batched pass yields
+      between 1 and K notes.
+    - 'single' uses only the one-step head, one forward pass per note.
+
+    Args:
+        model: The trained Keras model, with output shape (batch, K, n_vocab).
+        network_input: The input data used to train the model.
+        pitchnames: A list of all unique pitches in the training data.
+        n_vocab: The number of unique pitches.
+        num_notes: The number of notes to generate.
+        temperature: Controls randomness in note selection.
+        decoding: The decoding mode, 'verify', 'draft' or 'single'.
+        min_acceptance: Probability of a draft relative to the one-step head's
+            most likely token that is still accepted, when verifying.
+
+    Returns:
+        A list of generated notes and chords.
+
+    Raises:
+        ValueError: If the decoding mode is unknown.
+    """
+    if decoding not in ('verify', 'draft', 'single'):
+        raise ValueError(f"Unknown multi-token decoding mode: {decoding}")
+    heads = 1 if decoding == 'single' else _prediction_heads(model)
+    start = np.random.randint(0, len(network_input) - 1)
+    pattern = np.asarray(network_input[start], dtype=np.float64).reshape(-1)
+    prediction_output = []
+    passes = 0
+
+    def run(windows):
+        nonlocal passes
+        passes += 1
+        inputs = np.stack(windows)[:, :, np.newaxis] / float(n_vocab)
+        return model.predict(inputs, verbose=0)
+
+    def extend(window, tokens):
+        return np.concatenate([window, tokens])[len(tokens):] if len(tokens) else window
+
+    prediction = run([pattern])[0]
+    drafts = [_sample_index(prediction[k], temperature) for k in range(heads)]
+
+    while len(prediction_output) < num_notes:
+        if decoding != 'verify':
+            accepted = drafts
+            pattern = extend(pattern, np.asarray(accepted, dtype=np.float64))
+            if len(prediction_output) + len(accepted) < num_notes:
+                prediction = run([pattern])[0]
+                drafts = [_sample_index(prediction[k], temperature) for k in range(heads)]
+        else:
+            tokens = np.asarray(drafts, dtype=np.float64)
+            predictions = run([extend(pattern, tokens[:j]) for j in range(1, heads + 1)])
+            # The first draft comes from the one-step head of the current window, so it always stands
+            accepted = drafts[:1]
+            for j in range(1, heads):
+                one_step = predictions[j - 1, 0]
+                if one_step[drafts[j]] < min_acceptance * one_step.max():
+                    break
+                accepted.append(drafts[j])
+            pattern = extend(pattern, tokens[:len(accepted)])
+            prediction = predictions[len(accepted) - 1]
+            drafts = [_sample_index(prediction[k], temperature) for k in range(heads)]
+        prediction_output.extend(pitchnames[index] for index in accepted)
+
+    logger.debug("Notes generated. Length: %d in %d forward passes", num_notes, passes)
+    return prediction_output[:num_notes]
+
+def _generate_notes_stateful(runtime, states, pitchnames, n_vocab, num_notes=500, temperature=1.0):
+    """
+    Generate a sequence of notes by stepping the LSTM from a post-seed state.
+
+    Rather than pushing the whole 100-token window through the network for
+    every note, this starts from the state after a seed window, usually
+    precomputed in a seed cache, and feeds only the newly sampled token at
+    each step.
+
+    Args:
+        runtime: The model's LSTMRuntime.
+        states: The (h, c) state of each LSTM layer after the seed.
+        pitchnames: A list of all unique pitches in the training data.
+        n_vocab: The number of unique pitches.
+        num_notes: The number of notes to generate.
+        temperature: Controls randomness in note selection.
+
+    Returns:
+        A list of generated notes and chords.
+    """
+    prediction_output = []
+
+    for _ in range(num_notes):
+        prediction = runtime.predict(states)
+        index = _sample_index(prediction[0], temperature)
+        prediction_output.append(pitchnames[index])
+        states = runtime.step([index / float(n_vocab)], states)
+
+    logger.debug("Notes generated. Length: %d", len(prediction_output))
+    return prediction_output
+
+def _sample_index(prediction, temperature=1.0):
+    """
+    Sample a token index from a probability distribution after temperature scaling.
+
+    Args:
+        prediction: The model's output probabilities for one step.
+        temperature: Controls randomness in note selection.
+
+    Returns:
+        int: The sampled index.
+    """
+    # Apply temperature scaling
+    prediction = np.log(np.asarray(prediction, dtype=np.float64)) / temperature
+    exp_preds = np.exp(prediction)
+    prediction = exp_preds / np.sum(exp_preds)
+
+    return np.random.choice(len(prediction), p=prediction)
+
+def _create_midi(prediction_output, filename="generated_melody.mid"):
     """
     Create a MIDI file from the generated notes.
 
@@ -230,6 +743,9 @@ async def _create_midi(prediction_output, filename="generated_melody.mid"):
     Returns:
         None
     """
+    music21 = _lazy_import('music21')
+    instrument, note, stream, chord = music21.instrument, music21.note, music21.stream, music21.chord
+
     offset = 0
     output_notes = []
 
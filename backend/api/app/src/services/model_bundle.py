@@ -0,0 +1,132 @@
+"""
+Versioned model bundles exported by the trainer, and the manifest that indexes them.
+
+The trainer writes every model as a bundle directory <name>/<version>/ in
+MODEL_DIR, holding its architecture, weights, vocabulary, seed tokens,
+training stats, optional TFLite and sparse exports, and a bundle.json with the
+size and SHA-256 of each of those files. MODEL_DIR/manifest.json maps every
+model ID to the path of its current bundle. A bundle's seed-state cache,
+model.seeds.npy and model.seeds.json, is built after export by seed_cache.py
+and checked against the bundle's weights rather than listed in bundle.json.
+
+With a manifest, the API lists the models from it without loading any, and
+loads each one on first use (or at startup if listed in PRELOAD_MODELS),
+verifying its files against bundle.json first. Models saved as .h5 files
+with a _data.pkl, such as those trained before bundles, are loaded as
+before unless the manifest has a bundle of the same ID. The trainer's
+bundle.py turns them into bundles.
+
+Usage:
+    Verify the current bundle of every model in a model directory:
+    $ python -m app.src.services.model_bundle --model-dir /usr/src/api/app/model
+"""
+
+import argparse
+import json
+import os
+import sys
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from .seed_cache import file_checksum
+
+MANIFEST_NAME = "manifest.json"
+BUNDLE_FORMAT = 1
+
+# Base name of the model's files in a bundle, e.g. model.weights.h5 and model.int8.tflite
+BUNDLE_FILE_ID = "model"
+ARCHITECTURE_FILE = "architecture.json"
+WEIGHTS_FILE = f"{BUNDLE_FILE_ID}.weights.h5"
+
+def read_manifest(model_dir):
+    """
+    Read the bundle index of a model directory.
+
+    Args:
+        model_dir (str): The model directory.
+
+    Returns:
+        dict: The bundle directory of each model ID, or None if there is no manifest.
+
+    Raises:
+        ValueError: If the manifest is of an unknown format.
+    """
+    path = os.path.join(model_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != BUNDLE_FORMAT:
+        raise ValueError(f"Unsupported model manifest format: {manifest.get('format')}")
+    return {model_id: os.path.join(model_dir, entry['path']) for model_id, entry in manifest['models'].items()}
+
+def verify_bundle(bundle_dir):
+    """
+    Check every file of a bundle against the sizes and checksums in its bundle.json.
+
+    Args:
+        bundle_dir (str): The bundle directory.
+
+    Returns:
+        dict: The bundle's metadata.
+
+    Raises:
+        ValueError: If a file is missing or doesn't match.
+    """
+    with open(os.path.join(bundle_dir, "bundle.json")) as f:
+        bundle = json.load(f)
+    for file_name, expected in bundle['files'].items():
+        path = os.path.join(bundle_dir, file_name)
+        if not os.path.exists(path):
+            raise ValueError(f"Bundle {bundle_dir} is missing {file_name}")
+        # Compare sizes first so a truncated copy fails without hashing it
+        if os.path.getsize(path) != expected['bytes'] or file_checksum(path) != expected['sha256']:
+            raise ValueError(f"Bundle {bundle_dir} has a corrupted {file_name}")
+    return bundle
+
+def load_bundle_data(bundle_dir):
+    """
+    Load a bundle's seed windows and vocabulary.
+
+    The seed tokens are memory-mapped and the windows are a read-only view of
+    them, so loading costs neither the windows' memory nor a full read.
+    Bundles written before seed tokens hold the windows themselves, in
+    seed_windows.npy, which is memory-mapped as it is.
+
+    Args:
+        bundle_dir (str): The bundle directory.
+
+    Returns:
+        tuple: network_input, pitchnames, note_to_int and n_vocab, as in a model's _data.pkl.
+    """
+    with open(os.path.join(bundle_dir, "vocab.json")) as f:
+        vocab = json.load(f)
+    tokens_path = os.path.join(bundle_dir, "seed_tokens.npy")
+    if os.path.exists(tokens_path):
+        tokens = np.load(tokens_path, mmap_mode='r')
+        network_input = sliding_window_view(tokens, vocab['sequence_length'])[:, :, np.newaxis]
+    else:
+        network_input = np.load(os.path.join(bundle_dir, "seed_windows.npy"), mmap_mode='r')
+    return network_input, vocab['pitchnames'], vocab['note_to_int'], vocab['n_vocab']
+
+def main(argv=None):
+    """Verify the current bundle of every model in the manifest and report the broken ones."""
+    parser = argparse.ArgumentParser(description="Verify the model bundles indexed in a model directory.")
+    parser.add_argument('--model-dir', default=os.environ.get('MODEL_DIR', '/usr/src/api/app/model'))
+    args = parser.parse_args(argv)
+
+    bundles = read_manifest(args.model_dir)
+    if bundles is None:
+        print(f"No {MANIFEST_NAME} in {args.model_dir}")
+        return 1
+    failed = 0
+    for model_id, bundle_dir in bundles.items():
+        try:
+            bundle = verify_bundle(bundle_dir)
+            print(f"{model_id}: v{bundle['version']} OK ({len(bundle['files'])} files)")
+        except (OSError, ValueError) as e:
+            failed += 1
+            print(f"{model_id}: {e}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Quantized melody models exported by the trainer as TFLite files.
+
+The trainer can export every model next to its .h5 file as
+<model_id>.<precision>.tflite, where precision is int8 (8-bit weights with
+int8 matrix products), float16 (half-size weights) or float32. When the API
+is configured with MODEL_PRECISION, those files are served instead of the
+Keras models: they load faster, take a fraction of the memory and, for int8,
+run a generation step several times faster on CPU. Serving them is opt-in,
+since their output differs slightly from the Keras model's, and a quantized
+model runs without the seed-state cache and the sparse runtime.
+
+The trainer writes an accuracy report for each export to
+<model_id>.h5_quantization.json.
+"""
+
+import os
+import threading
+import numpy as np
+
+PRECISIONS = ('int8', 'float16', 'float32')
+
+def quantized_model_path(model_dir, model_id, precision):
+    """
+    Return the path of a model's TFLite export at a precision.
+
+    Args:
+        model_dir (str): The model directory.
+        model_id (str): The model ID.
+        precision (str): One of PRECISIONS.
+
+    Returns:
+        str: The path of the .tflite file, which may not exist.
+    """
+    return os.path.join(model_dir, f"{model_id}.{precision}.tflite")
+
+class QuantizedModel:
+    """
+    A TFLite model with the part of the Keras model interface generation uses.
+
+    TFLite interpreters can't be shared between threads, so every inference
+    thread gets its own. They all map the same model file, so the weights are
+    only held in memory once.
+    """
+
+    def __init__(self, model_path, interpreter_class, num_threads=1):
+        """
+        Initialise the QuantizedModel.
+
+        Args:
+            model_path (str): Path of the .tflite file.
+            interpreter_class (type): tf.lite.Interpreter, passed in so TensorFlow is only imported by the caller.
+            num_threads (int): Threads each interpreter may use.
+        """
+        self.model_path = model_path
+        self.precision = os.path.basename(model_path).split('.')[-2]
+        self._interpreter_class = interpreter_class
+        self._num_threads = num_threads
+        self._local = threading.local()
+        # Create the first interpreter now so a broken file fails at load time
+        interpreter = self._interpreter()
+        self.input_shape = tuple(interpreter.get_input_details()[0]['shape'])
+        self.output_shape = tuple(interpreter.get_output_details()[0]['shape'])
+
+    def _interpreter(self):
+        interpreter = getattr(self._local, 'interpreter', None)
+        if interpreter is None:
+            interpreter = self._interpreter_class(model_path=self.model_path, num_threads=self._num_threads)
+            interpreter.allocate_tensors()
+            self._local.interpreter = interpreter
+        return interpreter
+
+    def predict(self, inputs, verbose=0):
+        """
+        Predict next-note probabilities for a batch of windows.
+
+        The exported models take one window at a time, so a batch is run row by row.
+
+        Args:
+            inputs (numpy.ndarray): Windows of shape (batch, sequence_length, 1).
+            verbose: Ignored; accepted for compatibility with keras.Model.predict.
+
+        Returns:
+            numpy.ndarray: Probabilities of shape (batch, n_vocab), or (batch, K, n_vocab)
+            for models that predict K tokens at once.
+        """
+        interpreter = self._interpreter()
+        input_index = interpreter.get_input_details()[0]['index']
+        output_index = interpreter.get_output_details()[0]['index']
+        outputs = []
+        for window in np.asarray(inputs, dtype=np.float32).reshape((-1,) + self.input_shape[1:]):
+            interpreter.set_tensor(input_index, window[np.newaxis])
+            interpreter.invoke()
+            outputs.append(interpreter.get_tensor(output_index)[0].copy())
+        return np.stack(outputs)
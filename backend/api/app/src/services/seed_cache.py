@@ -0,0 +1,295 @@
+"""
+Precomputed post-seed LSTM states for stateful melody generation.
+
+Every generation starts by pushing a 100-token seed window from the model's
+training data through the network. Because the seeds come from a fixed
+corpus, the resulting (h, c) states of every LSTM layer can be computed once
+and stored. Generation then starts sampling straight after a single lookup.
+
+Each cache is two files next to the model in MODEL_DIR, or in its bundle
+directory as model.seeds.npy and model.seeds.json:
+- <model_id>.seeds.npy: float16 array of shape (n_seeds, 2 * sum(units)), holding
+  h and c of each LSTM layer in order. It is memory-mapped on load.
+- <model_id>.seeds.json: metadata (seed indices, layer widths and the checksum of
+  the model file the states were built from).
+
+Caches are built after a model is trained or bundled, since they need the
+API's runtime. A bundle's cache isn't listed in its bundle.json; the checksum
+of model.weights.h5 in the metadata ties it to the bundle's weights instead.
+
+Usage:
+    Build caches for every model (or the listed ones) in a model directory,
+    bundles in its manifest.json included:
+    $ python -m app.src.services.seed_cache --model-dir /usr/src/api/app/model [--seeds 256] [model_id ...]
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import pickle
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from .lstm_runtime import LSTMRuntime
+
+logger = logging.getLogger(__name__)
+
+SEED_CACHE_VERSION = 1
+
+def seed_cache_paths(model_dir, model_id):
+    """
+    Return the state and metadata file paths of a model's seed cache.
+
+    Args:
+        model_dir (str): The model directory.
+        model_id (str): The model ID.
+
+    Returns:
+        tuple: Paths of the .seeds.npy and .seeds.json files.
+    """
+    base = os.path.join(model_dir, model_id)
+    return f"{base}.seeds.npy", f"{base}.seeds.json"
+
+def file_checksum(path):
+    """
+    Compute the SHA-256 checksum of a file.
+
+    Args:
+        path (str): The file to hash.
+
+    Returns:
+        str: The hex digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_model_data(data_path):
+    """
+    Load a model's pickled training data.
+
+    The trainer saves the seed windows as their token array and sequence
+    length, and they are cut back out as a read-only view, so they take no
+    more memory than the tokens. Older files that hold the windows themselves
+    load as they are.
+
+    Args:
+        data_path (str): Path to the model's _data.pkl file.
+
+    Returns:
+        tuple: The seed windows of shape (n_windows, sequence_length, 1), pitch
+        names, note-to-integer mapping and vocabulary size.
+    """
+    with open(data_path, 'rb') as f:
+        data = pickle.load(f)
+    if len(data) == 4:
+        return data
+    tokens, pitchnames, note_to_int, n_vocab, sequence_length = data
+    return sliding_window_view(tokens, sequence_length)[:, :, np.newaxis], pitchnames, note_to_int, n_vocab
+
+def _seed_inputs(network_input, seed_indices, n_vocab):
+    """
+    Scale seed windows exactly as the windowed generator feeds them to the model.
+
+    Args:
+        network_input (numpy.ndarray): The model's training windows.
+        seed_indices (numpy.ndarray): Indices of the windows to use as seeds.
+        n_vocab (int): The vocabulary size.
+
+    Returns:
+        numpy.ndarray: Inputs of shape (n_seeds, sequence_length).
+    """
+    windows = np.asarray(network_input)[seed_indices]
+    return windows.reshape(len(seed_indices), -1) / float(n_vocab)
+
+class SeedStateCache:
+    """
+    A memory-mapped table of post-seed LSTM states for one model.
+
+    Attributes:
+        states (numpy.ndarray): Flattened (h, c) states, one row per seed.
+        seed_indices (numpy.ndarray): The network_input index each row was built from.
+        runtime (LSTMRuntime): The runtime the states are valid for.
+    """
+
+    def __init__(self, states, seed_indices, runtime):
+        """
+        Initialise the cache.
+
+        Args:
+            states (numpy.ndarray): Flattened (h, c) states, one row per seed.
+            seed_indices (numpy.ndarray): The network_input index of each seed.
+            runtime (LSTMRuntime): The runtime the states are valid for.
+        """
+        self.states = states
+        self.seed_indices = seed_indices
+        self.runtime = runtime
+
+    def __len__(self):
+        return len(self.seed_indices)
+
+    def get_states(self, row):
+        """
+        Unpack one seed's row into per-layer (h, c) states.
+
+        Args:
+            row (int): The row of the seed in the cache.
+
+        Returns:
+            list: One (h, c) tuple per LSTM layer, each of shape (1, units).
+        """
+        flat = np.asarray(self.states[row], dtype=np.float32)
+        states, offset = [], 0
+        for units in self.runtime.units:
+            h = flat[offset:offset + units].reshape(1, units)
+            c = flat[offset + units:offset + 2 * units].reshape(1, units)
+            states.append((h, c))
+            offset += 2 * units
+        return states
+
+    def sample_states(self):
+        """
+        Pick a random seed and return its post-seed states.
+
+        Returns:
+            list: One (h, c) tuple per LSTM layer.
+        """
+        return self.get_states(np.random.randint(0, len(self)))
+
+    @classmethod
+    def load(cls, model_dir, model_id, model, model_path=None):
+        """
+        Load a model's seed cache if one exists and matches the model file.
+
+        Args:
+            model_dir (str): The model directory.
+            model_id (str): The model ID.
+            model (keras.Model): The loaded model.
+            model_path (str, optional): The model file the cache must match. Defaults to <model_id>.h5.
+
+        Returns:
+            SeedStateCache: The cache, or None if there is no usable cache or the
+            LSTM runtime can't run the model.
+        """
+        states_path, meta_path = seed_cache_paths(model_dir, model_id)
+        if not (os.path.exists(states_path) and os.path.exists(meta_path)):
+            return None
+
+        with open(meta_path) as f:
+            meta = json.load(f)
+
+        model_path = model_path or os.path.join(model_dir, f"{model_id}.h5")
+        if meta.get('version') != SEED_CACHE_VERSION or meta.get('model_sha256') != file_checksum(model_path):
+            logger.warning("Ignoring stale seed cache for model %s", model_id)
+            return None
+
+        # Models the runtime can't step, such as GRU students or multi-head models, generate with Keras
+        unsupported = LSTMRuntime.unsupported_layers(model)
+        if unsupported:
+            logger.warning("Ignoring seed cache for model %s: the LSTM runtime can't run %s",
+                           model_id, ', '.join(unsupported))
+            return None
+
+        runtime = LSTMRuntime.from_keras(model)
+        if runtime.units != meta['units']:
+            logger.warning("Ignoring seed cache for model %s: layer widths don't match", model_id)
+            return None
+
+        states = np.load(states_path, mmap_mode='r')
+        logger.info("Loaded seed cache for model %s (%d seeds)", model_id, len(states))
+        return cls(states, np.asarray(meta['seed_indices']), runtime)
+
+def build_seed_cache(model_dir, model_id, model, network_input, n_vocab, num_seeds=256, batch_size=64,
+                     model_path=None):
+    """
+    Precompute and save the post-seed states of a curated set of seeds.
+
+    Seeds are spread evenly over the model's training windows so they cover
+    the whole corpus deterministically.
+
+    Args:
+        model_dir (str): The model directory.
+        model_id (str): The model ID.
+        model (keras.Model): The loaded model.
+        network_input (numpy.ndarray): The model's training windows.
+        n_vocab (int): The vocabulary size.
+        num_seeds (int): Number of seeds to precompute.
+        batch_size (int): Number of seeds run through the network at once.
+        model_path (str, optional): The model file the cache is tied to. Defaults to <model_id>.h5.
+
+    Returns:
+        str: The path of the written state file.
+    """
+    runtime = LSTMRuntime.from_keras(model)
+    num_seeds = min(num_seeds, len(network_input))
+    seed_indices = np.unique(np.linspace(0, len(network_input) - 1, num_seeds).astype(np.int64))
+
+    rows = []
+    for batch_start in range(0, len(seed_indices), batch_size):
+        batch = seed_indices[batch_start:batch_start + batch_size]
+        states = runtime.run_sequence(_seed_inputs(network_input, batch, n_vocab))
+        rows.append(np.concatenate([part for h, c in states for part in (h, c)], axis=1))
+
+    states_path, meta_path = seed_cache_paths(model_dir, model_id)
+    np.save(states_path, np.concatenate(rows).astype(np.float16))
+    model_path = model_path or os.path.join(model_dir, f"{model_id}.h5")
+    with open(meta_path, 'w') as f:
+        json.dump({
+            'version': SEED_CACHE_VERSION,
+            'model_sha256': file_checksum(model_path),
+            'units': runtime.units,
+            'seed_indices': seed_indices.tolist()
+        }, f)
+
+    logger.info("Built seed cache for model %s: %d seeds -> %s", model_id, len(seed_indices), states_path)
+    return states_path
+
+def main(argv=None):
+    """
+    Build seed caches from the command line.
+
+    Bundles in the directory's manifest.json get their cache in the bundle
+    directory, seeded from its seed_tokens.npy. Other models are the .h5
+    files with a _data.pkl, as the API loads them.
+
+    Args:
+        argv (list, optional): Command line arguments. Defaults to sys.argv.
+    """
+    from .melody_generator import custom_load_model
+    from .model_bundle import ARCHITECTURE_FILE, BUNDLE_FILE_ID, WEIGHTS_FILE, load_bundle_data, read_manifest
+
+    parser = argparse.ArgumentParser(description="Build precomputed seed-state caches for melody models.")
+    parser.add_argument('--model-dir', default=os.environ.get('MODEL_DIR', '/usr/src/api/app/model'))
+    parser.add_argument('--seeds', type=int, default=256, help="Number of seeds to precompute per model")
+    parser.add_argument('model_ids', nargs='*', help="Models to build caches for. Defaults to every model.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    bundles = read_manifest(args.model_dir) or {}
+    model_ids = args.model_ids or sorted(
+        set(bundles) | {os.path.splitext(f)[0] for f in os.listdir(args.model_dir) if f.endswith('.h5')}
+    )
+    for model_id in model_ids:
+        try:
+            if model_id in bundles:
+                cache_dir, file_id = bundles[model_id], BUNDLE_FILE_ID
+                model_path = os.path.join(cache_dir, WEIGHTS_FILE)
+                model = custom_load_model(model_path, os.path.join(cache_dir, ARCHITECTURE_FILE))
+                network_input, pitchnames, note_to_int, n_vocab = load_bundle_data(cache_dir)
+            else:
+                cache_dir, file_id = args.model_dir, model_id
+                model_path = os.path.join(cache_dir, f"{model_id}.h5")
+                model = custom_load_model(model_path)
+                network_input, pitchnames, note_to_int, n_vocab = load_model_data(f"{model_path}_data.pkl")
+            if not isinstance(n_vocab, (int, float)):
+                n_vocab = len(pitchnames)
+            build_seed_cache(cache_dir, file_id, model, network_input, n_vocab, num_seeds=args.seeds,
+                             model_path=model_path)
+        except Exception as e:
+            logger.error("Error building seed cache for model %s: %s", model_id, e)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from quart import Response, request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is used when it isn't installed
+    brotli = None
+
+# One year, the conventional max-age for content-addressed files
+IMMUTABLE_MAX_AGE = 31536000
+
+# Responses smaller than this aren't worth compressing
+MIN_COMPRESS_SIZE = 500
+
+COMPRESSIBLE_MIMETYPES = {'application/json'}
+
+class CachedJSON:
+    """
+    A prebuilt JSON body with its validators.
+
+    The body, ETag and Last-Modified are computed once, so serving the same
+    payload again only costs a conditional check.
+
+    Attributes:
+        body (bytes): The serialised JSON.
+        etag (str): A strong ETag derived from the body.
+        last_modified (datetime): When the body was built.
+    """
+
+    def __init__(self, payload):
+        """
+        Serialise the payload and compute its validators.
+
+        Args:
+            payload: Any JSON-serialisable value.
+        """
+        self.body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        self.etag = hashlib.sha1(self.body).hexdigest()
+        self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+
+    async def make_response(self, max_age):
+        """
+        Build a response for the current request, honouring conditional headers.
+
+        Args:
+            max_age (int): How long clients and proxies may cache the response, in seconds.
+
+        Returns:
+            Response: A 200 response with the body, or a 304 if the client's copy is current.
+        """
+        response = Response(self.body, mimetype='application/json')
+        response.set_etag(self.etag)
+        response.last_modified = self.last_modified
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        return await response.make_conditional(request)
+
+def content_hash(path, length=16):
+    """
+    Return a short SHA-256 digest of a file's contents for use in its name.
+
+    Args:
+        path (str): The file to hash.
+        length (int): Number of hex characters to keep.
+
+    Returns:
+        str: The truncated hex digest.
+    """
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:length]
+
+def mark_immutable(response, etag):
+    """
+    Mark a response for a content-named file as cacheable forever.
+
+    The file's name changes whenever its content does, so clients and
+    proxies never need to revalidate it.
+
+    Args:
+        response (Response): The response to update.
+        etag (str): The content hash from the file name.
+
+    Returns:
+        Response: The updated response.
+    """
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = IMMUTABLE_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+def _choose_encoding(accept_encoding):
+    """Pick the best supported content coding from an Accept-Encoding header."""
+    accepted = {part.split(';')[0].strip().lower() for part in accept_encoding.split(',')}
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+def register_compression(app):
+    """
+    Compress JSON responses with brotli or gzip when the client accepts it.
+
+    Only complete, non-streamed 200 responses above MIN_COMPRESS_SIZE are
+    compressed. A strong ETag becomes weak, because the compressed bytes
+    differ from the identity encoding. Weak comparison still matches
+    If-None-Match, so conditional requests keep working. Set
+    JSON_COMPRESSION=off to disable compression.
+
+    Args:
+        app (Quart): The Quart application instance.
+    """
+    if os.environ.get('JSON_COMPRESSION', 'on').lower() in ('off', 'false', '0'):
+        return
+
+    @app.after_request
+    async def compress_response(response):
+        if (response.status_code != 200 or response.mimetype not in COMPRESSIBLE_MIMETYPES
+                or 'Content-Encoding' in response.headers or response.content_length is None
+                or response.content_length < MIN_COMPRESS_SIZE):
+            return response
+
+        encoding = _choose_encoding(request.headers.get('Accept-Encoding', ''))
+        response.vary.add('Accept-Encoding')
+        if encoding is None:
+            return response
+
+        data = await response.get_data()
+        if encoding == 'br':
+            data = brotli.compress(data)
+        else:
+            data = gzip.compress(data, compresslevel=6)
+
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+        etag, is_weak = response.get_etag()
+        if etag and not is_weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -1,15 +1,138 @@
+import contextvars
+import json
 import logging
-from quart import request
+import logging.handlers
+import os
+import queue
+import random
+import time
+import uuid
+from quart import g, request
+
+# The ID of the request being handled, attached to every log record made while handling it
+request_id_var = contextvars.ContextVar('request_id', default=None)
+
+# The background writer that drains the log queue, replaced on each setup_logging call
+_listener = None
+
+class RequestIdFilter(logging.Filter):
+    """
+    Attach the current request ID to each log record.
+
+    This runs in the thread that made the record, where the request context
+    is still available, before the record is handed to the background writer.
+    """
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+class JSONFormatter(logging.Formatter):
+    """
+    Format log records as single-line JSON objects.
+
+    Messages are only interpolated here, on the background writer thread,
+    so %-style arguments cost nothing on the request path.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if getattr(record, 'request_id', None):
+            entry["request_id"] = record.request_id
+        if getattr(record, 'access', None):
+            entry.update(record.access)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    A QueueHandler that leaves message formatting to the background writer.
+
+    The standard QueueHandler formats every record before queueing it, which
+    puts the formatting cost back on the caller. Records are only passed
+    within the process, so they can be queued as they are.
+    """
+
+    def prepare(self, record):
+        return record
 
 def setup_logging(app):
-    logging.basicConfig(level=logging.INFO)
+    """
+    Configure non-blocking, structured logging for the app.
+
+    Log records are put on an in-memory queue and written as JSON by a
+    background thread, so request handlers never wait on log I/O. Each
+    request gets an ID (taken from the X-Request-ID header or generated)
+    that is attached to its log records and returned in the response.
+    Access logs are sampled with ACCESS_LOG_SAMPLE_RATE, but error responses
+    are always logged.
+
+    Args:
+        app (Quart): The Quart application instance.
+    """
+    global _listener
+
+    level = getattr(logging, os.environ.get('LOGGING_LEVEL', 'INFO').upper(), logging.INFO)
+    sample_rate = float(os.environ.get('ACCESS_LOG_SAMPLE_RATE', 0.1))
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(JSONFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+
+    # Replace the handler from a previous setup so records aren't written twice
+    if _listener is not None:
+        _listener.stop()
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        if isinstance(handler, DeferredQueueHandler):
+            root_logger.removeHandler(handler)
+    root_logger.addHandler(queue_handler)
+    root_logger.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    _listener = listener
+
     app.logger = logging.getLogger(__name__)
+    access_logger = logging.getLogger('app.access')
 
     @app.before_request
-    async def log_request_info():
-        app.logger.info(f"Request: {request.method} {request.url}")
+    async def start_request():
+        g.request_start = time.perf_counter()
+        request_id_var.set(request.headers.get('X-Request-ID') or uuid.uuid4().hex)
 
     @app.after_request
     async def log_response_info(response):
-        app.logger.info(f"Response: {response.status}")
-        return response
\ No newline at end of file
+        request_id = request_id_var.get()
+        if request_id:
+            response.headers['X-Request-ID'] = request_id
+
+        if response.status_code >= 400 or random.random() < sample_rate:
+            duration_ms = round((time.perf_counter() - g.get('request_start', time.perf_counter())) * 1000, 1)
+            access_logger.info(
+                "%s %s %s", request.method, request.path, response.status_code,
+                extra={"access": {
+                    "method": request.method,
+                    "path": request.path,
+                    "status": response.status_code,
+                    "duration_ms": duration_ms
+                }}
+            )
+        return response
+
+    @app.after_serving
+    async def stop_logging():
+        # Flush the queue, then write directly so shutdown messages aren't lost
+        listener.stop()
+        root_logger.removeHandler(queue_handler)
+        stream_handler.addFilter(RequestIdFilter())
+        root_logger.addHandler(stream_handler)
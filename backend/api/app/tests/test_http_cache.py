@@ -0,0 +1,82 @@
+"""
+This module contains unit tests for HTTP caching of the model list and melody downloads.
+
+Usage:
+    Run these tests using pytest:
+    $ pytest tests/test_http_cache.py
+"""
+
+import gzip
+import pytest
+from quart import Quart, jsonify
+from app.src.routes.endpoints.melody.melody import melody_bp
+from app.src.utils.http_cache import register_compression
+
+CONTENT_NAMED = "generated_melody_v5_0123456789abcdef.mid"
+
+@pytest.fixture
+def app(tmp_path):
+    """
+    Create a Quart app with the melody blueprint, fake models and a melody file.
+
+    Returns:
+        Quart: A Quart application instance.
+    """
+    app = Quart(__name__)
+    app.config['OUTPUT_DIR'] = str(tmp_path)
+    app.config['MODELS'] = {'v4': None, 'v5': None}
+    app.register_blueprint(melody_bp, url_prefix='/melody')
+    register_compression(app)
+
+    @app.route('/large')
+    async def large():
+        return jsonify([{'id': i, 'name': f"model {i}"} for i in range(100)])
+
+    (tmp_path / CONTENT_NAMED).write_bytes(bytes(range(256)) * 4)
+    return app
+
+@pytest.mark.asyncio
+async def test_models_conditional_get(app):
+    """
+    Test that the model list has validators and answers revalidation with 304.
+    """
+    async with app.test_client() as client:
+        response = await client.get('/melody/models')
+        assert response.status_code == 200
+        assert await response.get_json() == [{'id': 'v4', 'name': 'v4'}, {'id': 'v5', 'name': 'v5'}]
+        assert 'max-age' in response.headers['Cache-Control']
+        etag = response.headers['ETag']
+
+        response = await client.get('/melody/models', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+
+@pytest.mark.asyncio
+async def test_content_named_download_is_immutable(app):
+    """
+    Test that content-named melodies are immutable and support Range requests.
+    """
+    async with app.test_client() as client:
+        response = await client.get(f'/melody/download/{CONTENT_NAMED}')
+        assert response.status_code == 200
+        assert 'immutable' in response.headers['Cache-Control']
+        assert response.headers['ETag'] == '"0123456789abcdef"'
+
+        response = await client.get(f'/melody/download/{CONTENT_NAMED}', headers={'Range': 'bytes=0-9'})
+        assert response.status_code == 206
+        assert await response.get_data() == bytes(range(10))
+
+        response = await client.get(f'/melody/download/{CONTENT_NAMED}', headers={'If-None-Match': '"0123456789abcdef"'})
+        assert response.status_code == 304
+
+@pytest.mark.asyncio
+async def test_json_compression(app):
+    """
+    Test that large JSON responses are gzipped for clients that accept it.
+    """
+    async with app.test_client() as client:
+        response = await client.get('/large', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert b'"model 99"' in gzip.decompress(await response.get_data())
+
+        response = await client.get('/large')
+        assert 'Content-Encoding' not in response.headers
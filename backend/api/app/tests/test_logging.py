@@ -0,0 +1,61 @@
+"""
+This module contains unit tests for the asynchronous logging pipeline.
+
+Usage:
+    Run these tests using pytest:
+    $ pytest tests/test_logging.py
+"""
+
+import json
+import logging
+import pytest
+from quart import Quart
+from app.src.utils.logging import JSONFormatter, request_id_var, setup_logging
+
+@pytest.fixture
+def app(monkeypatch):
+    """
+    Create a Quart app with logging configured and every access logged.
+
+    Returns:
+        Quart: A Quart application instance.
+    """
+    monkeypatch.setenv('ACCESS_LOG_SAMPLE_RATE', '1')
+    app = Quart(__name__)
+    setup_logging(app)
+
+    @app.route('/ping')
+    async def ping():
+        return request_id_var.get()
+
+    return app
+
+@pytest.mark.asyncio
+async def test_request_id_is_propagated(app):
+    """
+    Test that an incoming X-Request-ID is used for the request and echoed back.
+    """
+    async with app.test_client() as client:
+        response = await client.get('/ping', headers={'X-Request-ID': 'abc123'})
+        assert response.headers['X-Request-ID'] == 'abc123'
+        assert await response.get_data(as_text=True) == 'abc123'
+
+@pytest.mark.asyncio
+async def test_request_id_is_generated(app):
+    """
+    Test that a request ID is generated when the client doesn't send one.
+    """
+    async with app.test_client() as client:
+        response = await client.get('/ping')
+        assert len(response.headers['X-Request-ID']) == 32
+
+def test_json_formatter_formats_lazily():
+    """
+    Test that records are formatted to JSON with their arguments and request ID.
+    """
+    record = logging.LogRecord('test', logging.INFO, __file__, 1, "Loaded %d models", (4,), None)
+    record.request_id = 'req-1'
+    entry = json.loads(JSONFormatter().format(record))
+    assert entry['message'] == "Loaded 4 models"
+    assert entry['request_id'] == 'req-1'
+    assert entry['level'] == 'INFO'
@@ -0,0 +1,85 @@
+"""
+This module contains unit tests for the multi-model comparison endpoint.
+
+The model inference is replaced with a short sleep so the tests can check
+that models run concurrently on the inference executor and that results are
+streamed back as each model finishes.
+
+Usage:
+    Run these tests using pytest:
+    $ pytest tests/test_melody_compare.py
+"""
+
+import json
+import time
+import pytest
+from quart import Quart
+from app.src.routes.endpoints.melody.melody import melody_bp
+from app.src.services import melody_generator
+
+# Simulated generation time for each fake model, in seconds
+MODEL_DELAYS = {'model_a': 0.3, 'model_b': 0.1, 'model_c': 0.2}
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """
+    Create a Quart app with the melody blueprint and fake cached models.
+
+    Returns:
+        Quart: A Quart application instance.
+    """
+    app = Quart(__name__)
+    app.config['OUTPUT_DIR'] = str(tmp_path)
+    app.config['MODELS'] = {model_id: (None, None, [], {}, 0) for model_id in MODEL_DELAYS}
+    app.register_blueprint(melody_bp, url_prefix='/melody')
+
+    def fake_generate(model_id, model_data, output_dir):
+        time.sleep(MODEL_DELAYS[model_id])
+        return f"{output_dir}/generated_melody_{model_id}.mid", MODEL_DELAYS[model_id]
+
+    monkeypatch.setattr(melody_generator, '_generate_melody_file', fake_generate)
+    return app
+
+@pytest.mark.asyncio
+async def test_compare_runs_models_concurrently(app):
+    """
+    Test that all models are generated concurrently and streamed in completion order.
+    """
+    async with app.test_client() as client:
+        start = time.perf_counter()
+        response = await client.post('/melody/compare', json={})
+        body = await response.get_data(as_text=True)
+        elapsed = time.perf_counter() - start
+
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in body.splitlines()]
+    results, summary = lines[:-1], lines[-1]
+
+    assert [r['model_id'] for r in results] == ['model_b', 'model_c', 'model_a']
+    assert all(r['file_name'] == f"generated_melody_{r['model_id']}.mid" for r in results)
+    assert summary['models'] == 3
+    # Concurrent fan-out should take about as long as the slowest model, not the sum
+    assert elapsed < sum(MODEL_DELAYS.values())
+
+@pytest.mark.asyncio
+async def test_compare_selected_models(app):
+    """
+    Test that only the requested models are generated.
+    """
+    async with app.test_client() as client:
+        response = await client.post('/melody/compare', json={'model_ids': ['model_b', 'model_a']})
+        body = await response.get_data(as_text=True)
+
+    results = [json.loads(line) for line in body.splitlines()][:-1]
+    assert sorted(r['model_id'] for r in results) == ['model_a', 'model_b']
+
+@pytest.mark.asyncio
+async def test_compare_invalid_model(app):
+    """
+    Test that an unknown model ID is rejected before any generation starts.
+    """
+    async with app.test_client() as client:
+        response = await client.post('/melody/compare', json={'model_ids': ['model_a', 'missing']})
+        assert response.status_code == 400
+        data = await response.get_json()
+        assert 'missing' in data['error']
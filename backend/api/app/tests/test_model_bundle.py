@@ -0,0 +1,178 @@
+"""
+This module contains unit tests for loading models from versioned bundles indexed in a manifest.
+
+The bundle is written with the same layout as the trainer's bundle.py export.
+
+Usage:
+    Run these tests using pytest:
+    $ pytest tests/test_model_bundle.py
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import numpy as np
+import pytest
+from quart import Quart
+from app.src.services import melody_generator
+from app.src.services.melody_generator import _load_bundle_entry, get_available_models, get_model
+from app.src.services.model_bundle import load_bundle_data, read_manifest, verify_bundle
+from app.src.services.seed_cache import main as build_seed_caches
+
+N_VOCAB = 12
+SEQUENCE_LENGTH = 20
+
+def _sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+@pytest.fixture(scope="module")
+def bundle_model(tmp_path_factory):
+    """
+    Write a small model as version 1 of bundle 'tiny' and index it in a manifest.
+
+    Returns:
+        tuple: The model directory, the bundle directory, the Keras model and its seed windows.
+    """
+    from tensorflow import keras
+    from tensorflow.keras import layers
+
+    model = keras.Sequential([
+        layers.LSTM(16, input_shape=(SEQUENCE_LENGTH, 1)),
+        layers.Dense(N_VOCAB, activation='softmax')
+    ])
+    model_dir = tmp_path_factory.mktemp("models")
+    bundle_dir = model_dir / "tiny" / "1"
+    bundle_dir.mkdir(parents=True)
+    tokens = np.random.randint(0, N_VOCAB, 40 + SEQUENCE_LENGTH - 1) / float(N_VOCAB)
+    network_input = np.lib.stride_tricks.sliding_window_view(tokens, SEQUENCE_LENGTH)[:, :, np.newaxis]
+
+    (bundle_dir / "architecture.json").write_text(model.to_json())
+    model.save_weights(bundle_dir / "model.weights.h5")
+    pitchnames = [str(i) for i in range(N_VOCAB)]
+    (bundle_dir / "vocab.json").write_text(json.dumps({
+        'pitchnames': pitchnames, 'note_to_int': {name: i for i, name in enumerate(pitchnames)}, 'n_vocab': N_VOCAB,
+        'sequence_length': SEQUENCE_LENGTH
+    }))
+    np.save(bundle_dir / "seed_tokens.npy", tokens)
+    (bundle_dir / "stats.json").write_text("{}")
+    files = {path.name: {'bytes': path.stat().st_size, 'sha256': _sha256(path)} for path in bundle_dir.iterdir()}
+    (bundle_dir / "bundle.json").write_text(json.dumps({'format': 1, 'name': 'tiny', 'version': 1, 'files': files}))
+    (model_dir / "manifest.json").write_text(json.dumps({
+        'format': 1, 'models': {'tiny': {'version': 1, 'versions': [1], 'path': "tiny/1"}}
+    }))
+    return str(model_dir), str(bundle_dir), model, network_input
+
+def test_read_manifest(bundle_model):
+    """
+    Test that the manifest maps model IDs to bundle directories, and that no manifest reads as None.
+    """
+    model_dir, bundle_dir, _, _ = bundle_model
+
+    assert read_manifest(model_dir) == {'tiny': bundle_dir}
+    assert read_manifest(os.path.dirname(bundle_dir)) is None
+
+def test_load_bundle_entry(bundle_model):
+    """
+    Test that a bundle loads into the same model and data as it was exported from.
+    """
+    _, bundle_dir, model, network_input = bundle_model
+    (loaded, seeds, pitchnames, note_to_int, n_vocab), _ = _load_bundle_entry("tiny", bundle_dir)
+
+    np.testing.assert_allclose(loaded.predict(network_input[:4], verbose=0), model.predict(network_input[:4], verbose=0),
+                               atol=1e-6)
+    np.testing.assert_array_equal(seeds, network_input)
+    assert seeds.base is not None and not seeds.flags.writeable
+    assert n_vocab == N_VOCAB and note_to_int[pitchnames[3]] == 3
+
+def test_load_bundle_data_reads_seed_windows(bundle_model, tmp_path):
+    """
+    Test that bundles written before seed tokens, which hold the windows themselves, still load.
+    """
+    _, bundle_dir, _, network_input = bundle_model
+    legacy = shutil.copytree(bundle_dir, tmp_path / "legacy")
+    os.remove(legacy / "seed_tokens.npy")
+    np.save(legacy / "seed_windows.npy", np.asarray(network_input))
+
+    seeds, _, _, n_vocab = load_bundle_data(str(legacy))
+    np.testing.assert_array_equal(seeds, network_input)
+    assert n_vocab == N_VOCAB
+
+def test_verify_bundle_rejects_corrupted_file(bundle_model, tmp_path):
+    """
+    Test that a bundle whose files don't match their checksums fails verification.
+    """
+    _, bundle_dir, _, _ = bundle_model
+    corrupted = shutil.copytree(bundle_dir, tmp_path / "corrupted")
+    assert verify_bundle(str(corrupted))['version'] == 1
+
+    vocab_path = corrupted / "vocab.json"
+    vocab_path.write_text(vocab_path.read_text().replace('"0"', '"X"'))
+    with pytest.raises(ValueError, match="vocab.json"):
+        verify_bundle(str(corrupted))
+
+def test_bundle_loads_with_its_seed_cache(bundle_model, tmp_path):
+    """
+    Test that the seed cache command builds a bundle's cache from its seed tokens, and that the bundle loads with it.
+    """
+    model_dir, bundle_dir, model, network_input = bundle_model
+    copied = tmp_path / "models"
+    shutil.copytree(os.path.dirname(bundle_dir), copied / "tiny")
+    shutil.copyfile(os.path.join(model_dir, "manifest.json"), copied / "manifest.json")
+    build_seed_caches(['--model-dir', str(copied), '--seeds', '4'])
+
+    assert (copied / "tiny" / "1" / "model.seeds.npy").exists()
+    verify_bundle(str(copied / "tiny" / "1"))
+    _load_bundle_entry("tiny", str(copied / "tiny" / "1"))
+    cache = melody_generator._seed_caches.pop("tiny")
+    seed_index = cache.seed_indices[1]
+    expected = model.predict(network_input[seed_index:seed_index + 1] / N_VOCAB, verbose=0)
+    np.testing.assert_allclose(cache.runtime.predict(cache.get_states(1)), expected, atol=1e-2)
+
+@pytest.mark.asyncio
+async def test_models_load_on_first_use(bundle_model):
+    """
+    Test that models in the manifest are listed without loading them, and loaded once on first use.
+    """
+    model_dir, _, _, _ = bundle_model
+    app = Quart(__name__)
+    app.config['MODEL_DIR'] = model_dir
+
+    async with app.app_context():
+        models = await get_available_models()
+        app.config['MODELS'] = models
+        assert models == {'tiny': None}
+
+        entry = await get_model("tiny")
+        assert entry[4] == N_VOCAB
+        assert await get_model("tiny") is entry
+        with pytest.raises(ValueError):
+            await get_model("missing")
+    melody_generator._bundle_dirs.clear()
+
+@pytest.mark.asyncio
+async def test_models_without_bundle_are_still_served(bundle_model, tmp_path):
+    """
+    Test that .h5 models next to the manifest are loaded unless it has a bundle of the same ID.
+    """
+    _, bundle_dir, model, network_input = bundle_model
+    model_dir = tmp_path / "models"
+    shutil.copytree(os.path.dirname(bundle_dir), model_dir / "tiny")
+    shutil.copyfile(os.path.join(os.path.dirname(os.path.dirname(bundle_dir)), "manifest.json"),
+                    model_dir / "manifest.json")
+    for model_id in ("legacy", "tiny"):
+        model.save(model_dir / f"{model_id}.h5")
+        with open(model_dir / f"{model_id}.h5_data.pkl", 'wb') as f:
+            pickle.dump((np.asarray(network_input), [str(i) for i in range(N_VOCAB)], {}, N_VOCAB), f)
+    app = Quart(__name__)
+    app.config['MODEL_DIR'] = str(model_dir)
+
+    async with app.app_context():
+        models = await get_available_models()
+
+    assert list(models) == ['legacy', 'tiny']
+    assert models['tiny'] is None
+    assert models['legacy'][4] == N_VOCAB
+    melody_generator._bundle_dirs.clear()
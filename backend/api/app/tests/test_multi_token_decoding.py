@@ -0,0 +1,114 @@
+"""
+This module contains unit tests for decoding models that predict several tokens per window.
+
+A small model is built with the same output layout as the trainer's multi-token
+models: one Dense layer for all heads, reshaped to (heads, n_vocab), with a softmax.
+
+Usage:
+    Run these tests using pytest:
+    $ pytest tests/test_multi_token_decoding.py
+"""
+
+import math
+import pickle
+import numpy as np
+import pytest
+from app.src.services import melody_generator
+from app.src.services.melody_generator import _generate_notes_multi, _load_model_entry
+
+HEADS = 4
+N_VOCAB = 12
+SEQUENCE_LENGTH = 20
+PITCHNAMES = [str(i) for i in range(N_VOCAB)]
+
+class CountingModel:
+    """Wrap a model and count its forward passes."""
+
+    def __init__(self, model):
+        self.model = model
+        self.output_shape = model.output_shape
+        self.passes = 0
+        self.batch_sizes = []
+
+    def predict(self, inputs, verbose=0):
+        self.passes += 1
+        self.batch_sizes.append(len(inputs))
+        return self.model.predict(inputs, verbose=verbose)
+
+@pytest.fixture(scope="module")
+def model_dir(tmp_path_factory):
+    """
+    Save a small multi-token model with its training data.
+
+    Returns:
+        tuple: The model directory, the Keras model and its network_input.
+    """
+    from tensorflow import keras
+    from tensorflow.keras import layers
+
+    model = keras.Sequential([
+        layers.LSTM(16, input_shape=(SEQUENCE_LENGTH, 1)),
+        layers.Dense(HEADS * N_VOCAB),
+        layers.Reshape((HEADS, N_VOCAB)),
+        layers.Activation('softmax')
+    ])
+    directory = tmp_path_factory.mktemp("models")
+    model.save(directory / "multi.h5")
+    network_input = np.random.randint(0, N_VOCAB, (40, SEQUENCE_LENGTH, 1)) / float(N_VOCAB)
+    with open(directory / "multi.h5_data.pkl", 'wb') as f:
+        pickle.dump((network_input, [str(i) for i in range(N_VOCAB)], {}, N_VOCAB), f)
+    return str(directory), model, network_input
+
+def test_draft_takes_all_heads_per_pass(model_dir):
+    """
+    Test that draft decoding needs one forward pass per HEADS notes.
+    """
+    _, model, network_input = model_dir
+    counting = CountingModel(model)
+    notes = _generate_notes_multi(counting, network_input, PITCHNAMES, N_VOCAB, num_notes=30, decoding='draft')
+
+    assert len(notes) == 30
+    assert counting.passes == math.ceil(30 / HEADS)
+
+def test_verify_accepts_drafts_in_one_batched_pass(model_dir):
+    """
+    Test that verified decoding accepts every draft when any probability passes, one batch per HEADS notes.
+    """
+    _, model, network_input = model_dir
+    counting = CountingModel(model)
+    notes = _generate_notes_multi(counting, network_input, PITCHNAMES, N_VOCAB, num_notes=30,
+                                  decoding='verify', min_acceptance=0.0)
+
+    assert len(notes) == 30
+    assert counting.passes == 1 + math.ceil(30 / HEADS)
+    assert counting.batch_sizes[1:] == [HEADS] * math.ceil(30 / HEADS)
+
+def test_verify_falls_back_to_one_step_head(model_dir):
+    """
+    Test that rejected drafts leave one note per pass, sampled from the one-step head.
+    """
+    _, model, network_input = model_dir
+    counting = CountingModel(model)
+    notes = _generate_notes_multi(counting, network_input, PITCHNAMES, N_VOCAB, num_notes=10,
+                                  decoding='verify', min_acceptance=1.1)
+
+    assert len(notes) == 10
+    assert counting.passes == 11
+
+def test_unknown_decoding_mode(model_dir):
+    """
+    Test that an unknown decoding mode is rejected.
+    """
+    _, model, network_input = model_dir
+    with pytest.raises(ValueError):
+        _generate_notes_multi(model, network_input, PITCHNAMES, N_VOCAB, decoding='beam')
+
+def test_load_model_entry_registers_decoding(model_dir):
+    """
+    Test that loading a multi-token model records its decoding mode.
+    """
+    directory, _, _ = model_dir
+    model_path = f"{directory}/multi.h5"
+    _load_model_entry("multi", model_path, f"{model_path}_data.pkl", decoding='draft')
+
+    assert melody_generator._multi_token_decoding["multi"] == 'draft'
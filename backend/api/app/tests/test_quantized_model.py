@@ -0,0 +1,86 @@
+"""
+This module contains unit tests for serving quantized TFLite exports of the models.
+
+A small model with the same layer layout as the production models is exported
+the way the trainer does it, with its LSTM layers unrolled and batch size 1.
+
+Usage:
+    Run these tests using pytest:
+    $ pytest tests/test_quantized_model.py
+"""
+
+import pickle
+import numpy as np
+import pytest
+from app.src.services.melody_generator import _generate_notes, _load_model_entry
+from app.src.services.quantized_model import QuantizedModel, quantized_model_path
+
+N_VOCAB = 12
+SEQUENCE_LENGTH = 20
+
+@pytest.fixture(scope="module")
+def model_dir(tmp_path_factory):
+    """
+    Save a small stacked-LSTM model with its training data and an int8 export.
+
+    Returns:
+        tuple: The model directory, the Keras model and its network_input.
+    """
+    import tensorflow as tf
+    from tensorflow import keras
+    from tensorflow.keras import layers
+
+    model = keras.Sequential([
+        layers.LSTM(16, input_shape=(SEQUENCE_LENGTH, 1), return_sequences=True, unroll=True),
+        layers.Dropout(0.3),
+        layers.LSTM(16, unroll=True),
+        layers.Dense(8),
+        layers.Dense(N_VOCAB, activation='softmax')
+    ])
+    directory = tmp_path_factory.mktemp("models")
+    model.save(directory / "tiny.h5")
+    network_input = np.random.randint(0, N_VOCAB, (40, SEQUENCE_LENGTH, 1)) / float(N_VOCAB)
+    with open(directory / "tiny.h5_data.pkl", 'wb') as f:
+        pickle.dump((network_input, [str(i) for i in range(N_VOCAB)], {}, N_VOCAB), f)
+
+    run_model = tf.function(lambda inputs: model(inputs, training=False))
+    concrete_function = run_model.get_concrete_function(tf.TensorSpec((1, SEQUENCE_LENGTH, 1), tf.float32))
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete_function], model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    with open(quantized_model_path(str(directory), "tiny", "int8"), 'wb') as f:
+        f.write(converter.convert())
+    return str(directory), model, network_input
+
+def test_quantized_model_matches_keras(model_dir):
+    """
+    Test that the int8 export predicts close to the float model, for batches of windows too.
+    """
+    import tensorflow as tf
+    directory, model, network_input = model_dir
+    quantized = QuantizedModel(quantized_model_path(directory, "tiny", "int8"), tf.lite.Interpreter)
+
+    assert quantized.precision == "int8"
+    expected = model.predict(network_input[:4], verbose=0)
+    np.testing.assert_allclose(quantized.predict(network_input[:4], verbose=0), expected, atol=0.02)
+
+def test_load_model_entry_prefers_export(model_dir):
+    """
+    Test that the export is loaded when its precision is configured and exists.
+    """
+    directory, _, network_input = model_dir
+    model_path = f"{directory}/tiny.h5"
+    (model, *_), _ = _load_model_entry("tiny", model_path, f"{model_path}_data.pkl", "int8")
+
+    assert isinstance(model, QuantizedModel)
+    notes = _generate_notes(model, network_input, [str(i) for i in range(N_VOCAB)], N_VOCAB, num_notes=5)
+    assert len(notes) == 5
+
+def test_load_model_entry_falls_back_to_keras(model_dir):
+    """
+    Test that the Keras model is used when there is no export at the configured precision.
+    """
+    directory, _, _ = model_dir
+    model_path = f"{directory}/tiny.h5"
+    (model, *_), _ = _load_model_entry("tiny", model_path, f"{model_path}_data.pkl", "float16")
+
+    assert not isinstance(model, QuantizedModel)
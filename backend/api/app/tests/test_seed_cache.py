@@ -0,0 +1,176 @@
+"""
+This module contains unit tests for the seed-state cache and the NumPy LSTM runtime.
+
+A small model with the same layer layout as the production models is built
+so the runtime's outputs can be compared against Keras.
+
+Usage:
+    Run these tests using pytest:
+    $ pytest tests/test_seed_cache.py
+"""
+
+import json
+import pickle
+import numpy as np
+import pytest
+from app.src.services.lstm_runtime import LSTMRuntime
+from app.src.services import melody_generator
+from app.src.services.seed_cache import SeedStateCache, build_seed_cache, file_checksum, load_model_data, seed_cache_paths
+
+N_VOCAB = 12
+SEQUENCE_LENGTH = 20
+
+@pytest.fixture(scope="module")
+def model_dir(tmp_path_factory):
+    """
+    Save a small stacked-LSTM model and return its directory and training windows.
+
+    Returns:
+        tuple: The model directory, the model and its network_input.
+    """
+    from tensorflow import keras
+    from tensorflow.keras import layers
+
+    model = keras.Sequential([
+        layers.LSTM(16, input_shape=(SEQUENCE_LENGTH, 1), return_sequences=True),
+        layers.Dropout(0.3),
+        layers.LSTM(16, return_sequences=True),
+        layers.Dropout(0.3),
+        layers.LSTM(16),
+        layers.Dense(8),
+        layers.Dropout(0.3),
+        layers.Dense(N_VOCAB, activation='softmax')
+    ])
+    directory = tmp_path_factory.mktemp("models")
+    model.save(directory / "tiny.h5")
+    network_input = np.random.randint(0, N_VOCAB, (40, SEQUENCE_LENGTH, 1)) / float(N_VOCAB)
+    return str(directory), model, network_input
+
+def test_runtime_matches_keras(model_dir):
+    """
+    Test that the NumPy runtime produces the same probabilities as Keras.
+    """
+    _, model, network_input = model_dir
+    runtime = LSTMRuntime.from_keras(model)
+    expected = model.predict(network_input[:4], verbose=0)
+    states = runtime.run_sequence(network_input[:4].reshape(4, -1))
+    np.testing.assert_allclose(runtime.predict(states), expected, atol=1e-5)
+
+def _export_sparse(model, path, sparsity=0.8):
+    """
+    Zero the smallest weights of a model's kernels and write them in the trainer's sparse format.
+
+    Returns:
+        LSTMRuntime: A dense runtime with the same pruned weights, to compare against.
+    """
+    from scipy.sparse import csr_matrix
+
+    arrays, layers = {}, []
+    for layer in model.layers:
+        weights = layer.get_weights()
+        if not weights:
+            continue
+        config = layer.get_config()
+        names = ['kernel', 'recurrent_kernel'] if type(layer).__name__ == 'LSTM' else ['kernel']
+        for i, name in enumerate(names):
+            weights[i][np.abs(weights[i]) < np.quantile(np.abs(weights[i]), sparsity)] = 0
+            matrix = csr_matrix(weights[i].T)
+            prefix = f"layer{len(layers)}_{name}"
+            arrays.update({f"{prefix}_data": matrix.data, f"{prefix}_indices": matrix.indices,
+                           f"{prefix}_indptr": matrix.indptr, f"{prefix}_shape": np.array(matrix.shape)})
+        arrays[f"layer{len(layers)}_bias"] = weights[-1]
+        layer.set_weights(weights)
+        entry = {'type': type(layer).__name__, 'activation': config['activation']}
+        if entry['type'] == 'LSTM':
+            entry['recurrent_activation'] = config['recurrent_activation']
+        layers.append(entry)
+    np.savez(path, layers=np.array(json.dumps(layers)), **arrays)
+    return LSTMRuntime.from_keras(model)
+
+def test_sparse_runtime_matches_dense(model_dir, tmp_path):
+    """
+    Test that a runtime loaded from sparse weights matches the dense runtime with the same weights.
+    """
+    from tensorflow import keras
+
+    _, model, network_input = model_dir
+    pruned = keras.models.clone_model(model)
+    pruned.set_weights(model.get_weights())
+    dense = _export_sparse(pruned, tmp_path / "tiny.sparse.npz")
+    sparse = LSTMRuntime.from_sparse_file(str(tmp_path / "tiny.sparse.npz"))
+
+    assert not isinstance(sparse.lstm_layers[1]['recurrent_kernel'], np.ndarray)
+    assert sparse.units == dense.units
+    sequences = network_input[:4].reshape(4, -1)
+    np.testing.assert_allclose(sparse.predict(sparse.run_sequence(sequences)),
+                               dense.predict(dense.run_sequence(sequences)), atol=1e-5)
+
+def test_seed_cache_round_trip(model_dir):
+    """
+    Test that cached states reproduce the post-seed prediction of the model.
+    """
+    directory, model, network_input = model_dir
+    build_seed_cache(directory, "tiny", model, network_input, N_VOCAB, num_seeds=8)
+    cache = SeedStateCache.load(directory, "tiny", model)
+
+    assert len(cache) == 8
+    assert isinstance(cache.states, np.memmap)
+    seed_index = cache.seed_indices[3]
+    expected = model.predict(network_input[seed_index:seed_index + 1] / N_VOCAB, verbose=0)
+    np.testing.assert_allclose(cache.runtime.predict(cache.get_states(3)), expected, atol=1e-2)
+
+def test_seed_cache_missing(model_dir, tmp_path):
+    """
+    Test that a model without a cache falls back to windowed generation.
+    """
+    _, model, _ = model_dir
+    assert SeedStateCache.load(str(tmp_path), "tiny", model) is None
+
+def test_seed_cache_skipped_for_unsupported_layers(tmp_path):
+    """
+    Test that a model the LSTM runtime can't run, such as a GRU student, loads without its seed cache.
+    """
+    from tensorflow import keras
+    from tensorflow.keras import layers
+
+    student = keras.Sequential([
+        layers.GRU(8, input_shape=(SEQUENCE_LENGTH, 1)),
+        layers.Dense(N_VOCAB, name='logits'),
+        layers.Activation('softmax')
+    ])
+    model_path = tmp_path / "student.h5"
+    student.save(model_path)
+    network_input = np.random.randint(0, N_VOCAB, (10, SEQUENCE_LENGTH, 1)) / float(N_VOCAB)
+    with open(f"{model_path}_data.pkl", 'wb') as f:
+        pickle.dump((network_input, [str(i) for i in range(N_VOCAB)], {}, N_VOCAB), f)
+    states_path, meta_path = seed_cache_paths(str(tmp_path), "student")
+    np.save(states_path, np.zeros((2, 16), np.float16))
+    with open(meta_path, 'w') as f:
+        json.dump({'version': 1, 'model_sha256': file_checksum(model_path), 'units': [8], 'seed_indices': [0, 1]}, f)
+
+    assert [entry.split()[0] for entry in LSTMRuntime.unsupported_layers(student)] == ['GRU', 'Activation']
+    with pytest.raises(ValueError, match="GRU"):
+        LSTMRuntime.from_keras(student)
+    assert SeedStateCache.load(str(tmp_path), "student", student) is None
+
+    (model, *_), _ = melody_generator._load_model_entry("student", str(model_path), f"{model_path}_data.pkl")
+    assert "student" not in melody_generator._seed_caches
+    assert model.predict(network_input[:1], verbose=0).shape == (1, N_VOCAB)
+
+def test_load_model_data_rebuilds_windows(tmp_path):
+    """
+    Test that data saved as a token array loads as a view of the same windows, and old window files as they are.
+    """
+    tokens = np.random.randint(0, N_VOCAB, 60).astype(np.float32) / N_VOCAB
+    windows = np.stack([tokens[i:i + SEQUENCE_LENGTH] for i in range(len(tokens) - SEQUENCE_LENGTH + 1)])[:, :, None]
+    pitchnames = [str(i) for i in range(N_VOCAB)]
+    with open(tmp_path / "tokens.pkl", 'wb') as f:
+        pickle.dump((tokens, pitchnames, {}, N_VOCAB, SEQUENCE_LENGTH), f)
+    with open(tmp_path / "windows.pkl", 'wb') as f:
+        pickle.dump((windows, pitchnames, {}, N_VOCAB), f)
+
+    network_input, loaded_pitchnames, _, n_vocab = load_model_data(str(tmp_path / "tokens.pkl"))
+    np.testing.assert_array_equal(network_input, windows)
+    assert not network_input.flags.writeable and network_input.base is not None
+    assert loaded_pitchnames == pitchnames and n_vocab == N_VOCAB
+    np.testing.assert_array_equal(load_model_data(str(tmp_path / "windows.pkl"))[0], windows)
@@ -0,0 +1,183 @@
+import argparse
+import contextlib
+import fcntl
+import glob
+import hashlib
+import json
+import os
+import shutil
+import sys
+from datetime import datetime, timezone
+import numpy as np
+import tensorflow as tf
+from data_pipeline import input_tokens, load_model_data
+
+BUNDLE_FORMAT = 1
+MANIFEST_NAME = "manifest.json"
+
+# Held while a version is allocated or the manifest is updated, so parallel jobs can share a model directory
+LOCK_NAME = f"{MANIFEST_NAME}.lock"
+
+def file_sha256(path):
+    """Return the hex SHA-256 digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _write_json(path, data):
+    # Write next to the target and rename, so readers never see a partial file
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(temp_path, path)
+
+def read_manifest(models_dir):
+    """Return the bundle index of a model directory, or an empty one if there is none yet."""
+    path = os.path.join(models_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {'format': BUNDLE_FORMAT, 'models': {}}
+    with open(path) as f:
+        return json.load(f)
+
+@contextlib.contextmanager
+def manifest_lock(models_dir):
+    """Hold an exclusive lock on the manifest of a model directory, across processes."""
+    os.makedirs(models_dir, exist_ok=True)
+    with open(os.path.join(models_dir, LOCK_NAME), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def next_version(models_dir, name):
+    """Return the next free version number of a bundle name, starting at 1."""
+    bundle_root = os.path.join(models_dir, name)
+    if not os.path.isdir(bundle_root):
+        return 1
+    return max((int(entry) for entry in os.listdir(bundle_root) if entry.isdigit()), default=0) + 1
+
+def export_bundle(model, model_path, models_dir, name, stats=None):
+    """
+    Write a saved model and its data as the next version of a bundle and index it.
+
+    The bundle is a directory <models_dir>/<name>/<version>/ with everything the
+    API needs to serve the model, each in a plain format: architecture.json
+    (the Keras model config), model.weights.h5, vocab.json (with the window
+    length), seed_tokens.npy (the token array generation is seeded from,
+    which the windows are cut out of), stats.json, any TFLite or sparse
+    exports as model.<precision>.tflite and model.sparse.npz, and bundle.json
+    with the shapes and the size and SHA-256 of every other file. The API's
+    seed-state cache is built into the bundle afterwards, with
+    `python -m app.src.services.seed_cache` in the API, and isn't listed in
+    bundle.json.
+
+    <models_dir>/manifest.json indexes the bundles: for every name, its
+    current version, the versions on disk and the bundle's path. The API
+    reads the index instead of scanning for .h5 files, and verifies a
+    bundle's checksums when it loads it. Versions are allocated and the
+    manifest is updated under a lock, so jobs running in parallel can export
+    into the same directory.
+
+    Args:
+        model (keras.Model): The trained model.
+        model_path (str): The model's .h5 file, with its _data.pkl next to it.
+        models_dir (str): The directory holding the bundles and manifest.json.
+        name (str): The bundle name, the model ID the API serves it under.
+        stats (dict, optional): Training settings and results for stats.json.
+
+    Returns:
+        str: The bundle directory.
+    """
+    network_input, pitchnames, note_to_int, n_vocab = load_model_data(f"{model_path}_data.pkl")
+
+    with manifest_lock(models_dir):
+        version = next_version(models_dir, name)
+        bundle_dir = os.path.join(models_dir, name, str(version))
+        os.makedirs(bundle_dir)
+
+    with open(os.path.join(bundle_dir, "architecture.json"), 'w') as f:
+        f.write(model.to_json())
+    model.save_weights(os.path.join(bundle_dir, "model.weights.h5"))
+    with open(os.path.join(bundle_dir, "vocab.json"), 'w') as f:
+        json.dump({'pitchnames': list(pitchnames), 'note_to_int': {str(k): int(v) for k, v in note_to_int.items()},
+                   'n_vocab': int(n_vocab), 'sequence_length': int(network_input.shape[1])}, f)
+    # The windows overlap, so their token array is sequence_length times smaller than the windows
+    np.save(os.path.join(bundle_dir, "seed_tokens.npy"), input_tokens(network_input))
+    with open(os.path.join(bundle_dir, "stats.json"), 'w') as f:
+        json.dump(stats or {}, f, indent=2)
+
+    # Exports written next to the model, e.g. trained_model.int8.tflite, keep their suffix
+    base = os.path.splitext(model_path)[0]
+    for export_path in sorted(glob.glob(f"{glob.escape(base)}.*.tflite") + glob.glob(f"{glob.escape(base)}.sparse.npz")):
+        shutil.copyfile(export_path, os.path.join(bundle_dir, "model" + export_path[len(base):]))
+
+    files = {
+        file_name: {'bytes': os.path.getsize(os.path.join(bundle_dir, file_name)),
+                    'sha256': file_sha256(os.path.join(bundle_dir, file_name))}
+        for file_name in sorted(os.listdir(bundle_dir))
+    }
+    created = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    _write_json(os.path.join(bundle_dir, "bundle.json"), {
+        'format': BUNDLE_FORMAT,
+        'name': name,
+        'version': version,
+        'created': created,
+        'input_shape': list(model.input_shape[1:]),
+        'output_shape': list(model.output_shape[1:]),
+        'n_vocab': int(n_vocab),
+        'files': files
+    })
+
+    bundle_sha256 = file_sha256(os.path.join(bundle_dir, "bundle.json"))
+    with manifest_lock(models_dir):
+        # Read the manifest under the lock, so entries other jobs added meanwhile are kept
+        manifest = read_manifest(models_dir)
+        entry = manifest['models'].get(name, {'versions': []})
+        versions = sorted(set(entry['versions']) | {version})
+        if version >= entry.get('version', 0):
+            entry = {
+                'version': version,
+                'path': os.path.join(name, str(version)),
+                'created': created,
+                'bytes': sum(info['bytes'] for info in files.values()),
+                'bundle_sha256': bundle_sha256
+            }
+        # A job that finishes after a later version was indexed doesn't replace it as current
+        manifest['models'][name] = dict(entry, versions=versions)
+        _write_json(os.path.join(models_dir, MANIFEST_NAME), manifest)
+    print(f"Bundle {name} v{version} written to {bundle_dir} ({len(files)} files) and indexed in {MANIFEST_NAME}")
+    return bundle_dir
+
+def main(argv=None):
+    """
+    Bundle a saved model from the command line.
+
+    Args:
+        argv (list, optional): The arguments to parse. Defaults to sys.argv[1:].
+
+    Returns:
+        int: The exit status.
+
+    Example:
+        $ python bundle.py /app/model/melody_generator_lstm_v5.h5 --name v5
+    """
+    parser = argparse.ArgumentParser(description="Export a saved model as a versioned inference bundle.")
+    parser.add_argument('model', help="The model's .h5 file, with its _data.pkl next to it")
+    parser.add_argument('--name', help="Bundle name. Defaults to the model's file name without .h5")
+    parser.add_argument('--model-dir', help="Directory of the bundles and manifest.json. Defaults to the model's")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(f"{args.model}_data.pkl"):
+        print(f"No {args.model}_data.pkl next to the model")
+        return 1
+    model = tf.keras.models.load_model(args.model, compile=False)
+    name = args.name or os.path.splitext(os.path.basename(args.model))[0]
+    export_bundle(model, args.model, args.model_dir or os.path.dirname(os.path.abspath(args.model)), name,
+                  {'source': os.path.basename(args.model)})
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
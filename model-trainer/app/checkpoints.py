@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import tensorflow as tf
+
+def vocabulary_fingerprint(pitchnames):
+    """Return a SHA-256 of a vocabulary, which changes with any token or with their order (the ids)."""
+    return hashlib.sha256(json.dumps([str(name) for name in pitchnames]).encode()).hexdigest()
+
+class CheckpointManager(tf.keras.callbacks.Callback):
+    """
+    A Keras callback that checkpoints training so an interrupted run can resume.
+
+    At the end of each epoch the model's weights and the optimizer's state
+    (Adam's moments and step count) are copied to host memory, which takes
+    milliseconds, and written to disk by a background thread while training
+    continues. Only the last keep_last checkpoints and the keep_best with
+    the lowest loss are kept.
+
+    Each checkpoint is a ckpt-<epoch>.npz file. The index of completed
+    checkpoints is kept in checkpoints.json, which is only updated once a
+    file has been fully written, so a crash never leaves the index pointing
+    at a partial checkpoint. The index also records the corpus the run
+    trained on, its vocabulary and augmentation transpositions, so a resumed
+    run can rebuild the same corpus and never loads weights against a
+    different token-to-id mapping.
+    """
+
+    INDEX_FILE = 'checkpoints.json'
+
+    def __init__(self, checkpoint_dir, keep_last=2, keep_best=1, monitor='loss', corpus=None):
+        """
+        Initialise the CheckpointManager.
+
+        Args:
+            checkpoint_dir (str): Directory the checkpoints are written to. Created if missing.
+            keep_last (int): Number of most recent checkpoints to keep.
+            keep_best (int): Number of checkpoints with the lowest monitored value to keep.
+            monitor (str): The epoch log value checkpoints are ranked by.
+            corpus (dict, optional): The run's corpus: 'n_vocab', 'vocab_sha256' from
+                vocabulary_fingerprint and the augmentation 'transpositions'. Recorded
+                in the index and checked by restore.
+        """
+        super().__init__()
+        self.checkpoint_dir = checkpoint_dir
+        self.keep_last = keep_last
+        self.keep_best = keep_best
+        self.monitor = monitor
+        self.corpus = corpus
+        self._writer = None
+        self._pending = None
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    def _index_path(self):
+        return os.path.join(self.checkpoint_dir, self.INDEX_FILE)
+
+    def checkpoints(self):
+        """
+        List the completed checkpoints.
+
+        Returns:
+            list: Dicts with the epoch, monitored value and file name of each checkpoint, oldest first.
+        """
+        try:
+            with open(self._index_path()) as f:
+                return json.load(f)['checkpoints']
+        except (OSError, ValueError, KeyError):
+            return []
+
+    def saved_corpus(self):
+        """Return the corpus recorded with the checkpoints, or None for checkpoints without one."""
+        try:
+            with open(self._index_path()) as f:
+                return json.load(f).get('corpus')
+        except (OSError, ValueError):
+            return None
+
+    def latest(self):
+        """Return the most recent completed checkpoint, or None if there is none."""
+        checkpoints = self.checkpoints()
+        return checkpoints[-1] if checkpoints else None
+
+    def restore(self, model, checkpoint=None):
+        """
+        Load a checkpoint's weights and optimizer state into a compiled model.
+
+        Args:
+            model (keras.Model): The model to restore, built with the same architecture and vocabulary.
+            checkpoint (dict, optional): The checkpoint to load. Defaults to the latest.
+
+        Returns:
+            int: The number of epochs completed at the checkpoint, or 0 if there is nothing to restore.
+
+        Raises:
+            ValueError: If the checkpoint was trained with a different vocabulary or doesn't match the model.
+        """
+        checkpoint = checkpoint or self.latest()
+        if checkpoint is None:
+            return 0
+
+        saved = self.saved_corpus()
+        if saved is None:
+            print(f"Checkpoint {checkpoint['file']} has no corpus record; only its shapes can be checked")
+        elif self.corpus is not None and saved['vocab_sha256'] != self.corpus['vocab_sha256']:
+            raise ValueError(f"Checkpoint {checkpoint['file']} was trained with a different vocabulary "
+                             f"({saved['n_vocab']} tokens) than this run ({self.corpus['n_vocab']} tokens), so its "
+                             "outputs would stand for other tokens. Resume on the same corpus, augmentation and "
+                             "VOCAB_MIN_COUNT, or start over without --resume.")
+
+        with np.load(os.path.join(self.checkpoint_dir, checkpoint['file'])) as data:
+            weights = [data[f'weight_{i}'] for i in range(checkpoint['num_weights'])]
+            optimizer_state = [data[f'optimizer_{i}'] for i in range(checkpoint['num_optimizer_variables'])]
+
+        shapes = [tuple(w.shape) for w in model.get_weights()]
+        if shapes != [w.shape for w in weights]:
+            raise ValueError(f"Checkpoint {checkpoint['file']} doesn't match the model; "
+                             "was it trained on a different corpus or architecture?")
+        model.set_weights(weights)
+
+        # The optimizer creates its variables lazily, so build them before assigning
+        model.optimizer.build(model.trainable_variables)
+        if len(model.optimizer.variables) != len(optimizer_state):
+            raise ValueError(f"Checkpoint {checkpoint['file']} has a different optimizer state")
+        for variable, value in zip(model.optimizer.variables, optimizer_state):
+            variable.assign(value)
+
+        print(f"Resumed from {checkpoint['file']} after epoch {checkpoint['epoch']}")
+        return checkpoint['epoch']
+
+    def on_train_begin(self, logs=None):
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='checkpoint-writer')
+
+    def on_epoch_end(self, epoch, logs=None):
+        # Raise any error from the previous write rather than losing it
+        if self._pending is not None:
+            self._pending.result()
+
+        weights = self.model.get_weights()
+        optimizer_state = [variable.numpy() for variable in self.model.optimizer.variables]
+        value = float((logs or {}).get(self.monitor, np.nan))
+        self._pending = self._writer.submit(self._write, epoch + 1, value, weights, optimizer_state)
+
+    def on_train_end(self, logs=None):
+        self._writer.shutdown(wait=True)
+        if self._pending is not None:
+            self._pending.result()
+            self._pending = None
+
+    def _write(self, epoch, value, weights, optimizer_state):
+        """Write one checkpoint, then update the index and apply the retention policy."""
+        file_name = f"ckpt-{epoch:04d}.npz"
+        path = os.path.join(self.checkpoint_dir, file_name)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        arrays = {f'weight_{i}': w for i, w in enumerate(weights)}
+        arrays.update({f'optimizer_{i}': v for i, v in enumerate(optimizer_state)})
+        with open(temp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temp_path, path)
+
+        checkpoints = [c for c in self.checkpoints() if c['epoch'] != epoch]
+        checkpoints.append({'epoch': epoch, self.monitor: value, 'file': file_name,
+                            'num_weights': len(weights), 'num_optimizer_variables': len(optimizer_state)})
+        keep = set(c['file'] for c in checkpoints[-self.keep_last:]) if self.keep_last > 0 else set()
+        ranked = sorted((c for c in checkpoints if not np.isnan(c[self.monitor])), key=lambda c: c[self.monitor])
+        keep |= set(c['file'] for c in ranked[:self.keep_best])
+        removed = [c for c in checkpoints if c['file'] not in keep]
+        checkpoints = [c for c in checkpoints if c['file'] in keep]
+
+        temp_index = f"{self._index_path()}.{os.getpid()}.tmp"
+        with open(temp_index, 'w') as f:
+            json.dump({'corpus': self.corpus, 'checkpoints': checkpoints}, f, indent=2)
+        os.replace(temp_index, self._index_path())
+
+        # Delete files only once the index no longer refers to them
+        for c in removed:
+            try:
+                os.remove(os.path.join(self.checkpoint_dir, c['file']))
+            except OSError:
+                pass
@@ -1,3 +1,4 @@
+import json
 import os
 
 class Config:
@@ -5,8 +6,8 @@ class Config:
     Configuration class for the model trainer.
 
     This class holds all the configuration parameters for the model training process.
-    It uses class attributes for simplicity, but could be extended to load from
-    environment variables or a configuration file if needed.
+    It uses class attributes for simplicity; load_config applies overrides from
+    TRAINER_<SETTING> environment variables.
     """
 
     # Base directory for input MIDI files
@@ -15,6 +16,79 @@ class Config:
     # Base directory for saving trained models
     MODEL_BASE = "/app/model"
 
+    # Corpus directory to train on (None prompts for one of the directories in INPUT_BASE)
+    INPUT_DIR = None
+
+    # File name of the trained model in MODEL_BASE, without the .h5 extension
+    OUTPUT_NAME = "trained_model"
+
+    # Number of CPU threads TensorFlow may use (None lets TensorFlow use every core)
+    CPU_THREADS = None
+
+    # CPU ids to pin training to, e.g. [0, 1] (None runs on every CPU); jobs.py and sweep.py set it per job
+    CPU_AFFINITY = None
+
+    # Directory for resumable training checkpoints, one subdirectory per OUTPUT_NAME
+    # (None saves the best weights to the working directory instead). Relative paths
+    # here and in the other *_DIR settings below are inside MODEL_BASE
+    CHECKPOINT_DIR = "checkpoints"
+
+    # Number of most recent checkpoints to keep
+    KEEP_LAST_CHECKPOINTS = 2
+
+    # Number of lowest-loss checkpoints to keep
+    KEEP_BEST_CHECKPOINTS = 1
+
+    # Continue from the latest checkpoint of OUTPUT_NAME instead of starting over
+    RESUME = False
+
+    # Directory for training telemetry, one <OUTPUT_NAME>.jsonl file per model (None disables it)
+    TELEMETRY_DIR = "telemetry"
+
+    # First and last global training step to capture a profiler trace of, e.g. [20, 40] (None disables it)
+    PROFILE_STEPS = None
+
+    # Directory for profiler traces, viewable in TensorBoard's profile tab
+    PROFILE_DIR = "profiles"
+
+    # Trained model (.h5) to distil into a smaller student instead of training from scratch (None disables it)
+    DISTILL_TEACHER = None
+
+    # Student architecture: units per recurrent layer, number of layers, and "lstm" or "gru"
+    STUDENT_UNITS = 256
+    STUDENT_LAYERS = 1
+    STUDENT_CELL = "lstm"
+
+    # Softening temperature of the teacher's and student's outputs
+    DISTILL_TEMPERATURE = 2.0
+
+    # Weight of the next-note loss against the teacher-matching loss
+    DISTILL_ALPHA = 0.1
+
+    # Trained model (.h5) to fine-tune on the corpus instead of training from scratch (None disables it).
+    # New tokens are added to its vocabulary and windows of its original data are mixed in.
+    FINETUNE_FROM = None
+
+    # Number of fine-tuning epochs
+    FINETUNE_EPOCHS = 5
+
+    # Windows of the original training data mixed in per window of new data
+    FINETUNE_REPLAY_RATIO = 1.0
+
+    # Learning rate for fine-tuning, lower than a fresh model's so the original training isn't undone
+    FINETUNE_LEARNING_RATE = 0.0001
+
+    # Precisions to also export the trained model at as TFLite files for the API, e.g. ["int8"]
+    # ("int8", "float16" or "float32"; None exports none)
+    QUANTIZE_PRECISIONS = None
+
+    # Also export the trained model as a versioned bundle in MODEL_BASE/<BUNDLE_NAME>/<version>,
+    # indexed in MODEL_BASE/manifest.json, which the API loads models from
+    EXPORT_BUNDLE = True
+
+    # Name of the bundle, the model ID the API serves it under (None uses OUTPUT_NAME)
+    BUNDLE_NAME = None
+
     # Number of training epochs
     EPOCHS = 50
 
@@ -24,14 +98,111 @@ class Config:
     # Length of input sequences
     SEQUENCE_LENGTH = 100
 
-def load_config():
+    # Units in each of the model's three LSTM layers
+    LSTM_UNITS = 512
+
+    # Dropout rate between the model's layers
+    DROPOUT = 0.3
+
+    # Number of following tokens the model predicts from each window, one output head each.
+    # Above 1, the API can generate several notes per forward pass (needs STREAMING_INPUT)
+    PREDICT_TOKENS = 1
+
+    # Number of worker processes used to parse MIDI files (None uses every CPU)
+    PARSE_WORKERS = None
+
+    # Directory for cached note tokens of parsed MIDI files (None disables the cache)
+    PARSE_CACHE_DIR = ".parse_cache"
+
+    # Token extractor: "music21" builds full scores, "native" reads the MIDI events directly and is
+    # much faster, but doesn't yet match music21's tokens on every file (see midi_reader.py's parity check)
+    MIDI_EXTRACTOR = "music21"
+
+    # Number of randomly transposed copies of the corpus added for training
+    NUM_AUGMENTATIONS = 2
+
+    # Fixed transpositions in semitones to use instead of random ones (None for random)
+    AUGMENT_TRANSPOSITIONS = None
+
+    # Seed for the random transpositions (None for a different corpus each run)
+    AUGMENT_SEED = None
+
+    # Duplicate and near-duplicate files in the corpus: "off" doesn't look for them, "report" lists
+    # them (saved as <model>_duplicates.json) and "drop" also leaves them out of training
+    DEDUP_MODE = "report"
+
+    # Estimated fraction of shared token n-grams from which two files count as near-duplicates
+    DEDUP_THRESHOLD = 0.8
+
+    # Tokens occurring fewer times than this are replaced with their nearest frequent note or chord,
+    # shrinking the output layer (1 keeps every token)
+    VOCAB_MIN_COUNT = 1
+
+    # Build training windows as strided views with sparse targets instead of copied arrays with one-hot targets
+    WINDOWED_SEQUENCES = True
+
+    # dtype of the windowed inputs: float types are scaled by the vocabulary size, int types keep the ids
+    SEQUENCE_INPUT_DTYPE = "float32"
+
+    # Stream shuffled batches through tf.data instead of loading every window into the model at once
+    # (needs WINDOWED_SEQUENCES or another sparse-target model)
+    STREAMING_INPUT = True
+
+    # Seed for the streaming shuffle order (None for a different order each run)
+    SHUFFLE_SEED = None
+
+    # Train only on the windows starting at every WINDOW_STRIDE-th note; neighbouring windows
+    # overlap in all but one note, so a stride of 5-10 cuts epoch time as much for quick experiments
+    WINDOW_STRIDE = 1
+
+    # Fraction of the windows to train on each epoch, drawn at random every epoch (needs STREAMING_INPUT)
+    WINDOW_SAMPLE = 1.0
+
+# Directory settings whose relative paths are inside MODEL_BASE
+MODEL_BASE_DIRS = ('CHECKPOINT_DIR', 'TELEMETRY_DIR', 'PROFILE_DIR', 'PARSE_CACHE_DIR')
+
+def _parse_setting(value, default):
+    """Convert an environment variable to the type of a setting's default value."""
+    if isinstance(default, bool):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    if value.strip().lower() in ('none', 'null'):
+        return None
+    if isinstance(default, str) or not value.strip():
+        return value or None
+    try:
+        # Numbers, and lists such as AUGMENT_TRANSPOSITIONS="[-2, 3]"
+        return json.loads(value)
+    except ValueError:
+        return value
+
+def load_config(overrides=None):
     """
     Load and return the configuration.
 
-    This function could be extended to load configuration from environment
-    variables or a file. Currently, it simply returns an instance of the Config class.
+    Every setting can be overridden with an environment variable named
+    TRAINER_<SETTING>, e.g. TRAINER_EPOCHS=20 or TRAINER_INPUT_DIR=/data/v2,
+    so training runs can be configured without editing this file.
+
+    Relative directory settings are resolved inside MODEL_BASE last, so they
+    follow a MODEL_BASE given by environment variable or override.
+
+    Args:
+        overrides (dict, optional): Settings that take precedence over the
+            environment, e.g. from the command line. None values are ignored.
 
     Returns:
         Config: An instance of the Config class.
     """
-    return Config()
\ No newline at end of file
+    config = Config()
+    for name, default in vars(Config).items():
+        value = os.environ.get(f"TRAINER_{name}")
+        if name.isupper() and value is not None:
+            setattr(config, name, _parse_setting(value, default))
+    for name, value in (overrides or {}).items():
+        if value is not None:
+            setattr(config, name, value)
+    for name in MODEL_BASE_DIRS:
+        value = getattr(config, name)
+        if value:
+            setattr(config, name, os.path.join(config.MODEL_BASE, value))
+    return config
\ No newline at end of file
@@ -0,0 +1,288 @@
+import argparse
+import json
+import math
+import os
+import sys
+import time
+import numpy as np
+from config import load_config
+from data_pipeline import windows_per_epoch
+from midi_processor import MIDIProcessor
+from token_codec import CHORD_BASE, CODE_NAMES, NUM_CODES, encode_tokens, prune_codes
+
+# Bytes per element of a Python list (one pointer) and per list object, for the lists prepare_sequences builds
+_POINTER_BYTES = 8
+_LIST_BYTES = 56
+
+# Batches tf.data keeps prefetched while the model trains, an estimate of what AUTOTUNE settles on
+_PREFETCH_BATCHES = 4
+
+def token_distribution(codes, top=20):
+    """
+    Summarize how often each token of a corpus occurs.
+
+    Args:
+        codes (np.ndarray): Token codes of the corpus.
+        top (int): Number of most frequent tokens to list.
+
+    Returns:
+        dict: The vocabulary size, the most frequent tokens, how many tokens
+        occur only once, the share of the corpus the most frequent tokens
+        cover, the entropy in bits, and the vocabulary left at each
+        VOCAB_MIN_COUNT.
+    """
+    counts = np.bincount(codes, minlength=NUM_CODES)
+    present = np.flatnonzero(counts)
+    ordered = present[np.argsort(-counts[present], kind='stable')]
+    shares = counts[ordered] / len(codes)
+    return {
+        'vocab': len(present),
+        'top': [{'token': CODE_NAMES[code], 'count': int(counts[code]), 'share': round(float(share), 4)}
+                for code, share in zip(ordered[:top], shares)],
+        'singletons': int(np.count_nonzero(counts[present] == 1)),
+        'count_percentiles': {str(q): float(np.percentile(counts[present], q)) for q in (50, 90, 99)},
+        'coverage': {str(k): round(float(shares[:k].sum()), 4) for k in (10, 50, 100, 500) if k < len(present)},
+        'entropy_bits': round(float(-(shares * np.log2(shares)).sum()), 3),
+        'vocab_at_min_count': {str(min_count): len(np.unique(prune_codes(codes, min_count)[codes]))
+                               for min_count in (2, 5, 10)}
+    }
+
+def estimate_memory(n_tokens, n_vocab, sequence_length=100, batch_size=64, input_dtype='float32'):
+    """
+    Estimate the memory the training data takes with each way of preparing it.
+
+    'sequences' is prepare_sequences: every window copied as float64 and
+    one-hot targets, which fit copies again into tensors. 'windows' is
+    prepare_windows fitted as arrays, which materializes the strided views.
+    'streaming' is prepare_windows fed through make_window_dataset, which
+    holds the token array and one index per window and cuts batches on the
+    fly. Model weights and activations are not included.
+
+    Args:
+        n_tokens (int): Number of tokens in the corpus, after augmentation.
+        n_vocab (int): The vocabulary size.
+        sequence_length (int): Length of each input sequence.
+        batch_size (int): Number of windows per batch.
+        input_dtype (str): SEQUENCE_INPUT_DTYPE, the dtype of windowed inputs.
+
+    Returns:
+        dict: For each mode, the bytes of the prepared arrays, the peak while
+        preparing them and the total held while training.
+    """
+    n = max(0, n_tokens - sequence_length)
+    itemsize = np.dtype(input_dtype).itemsize
+    window_bytes = n * sequence_length
+
+    # The id lists and their int64 array exist together while reshaping, then the int64 and float64
+    # arrays while scaling, and last the float64 inputs and the one-hot targets
+    lists = n * (_LIST_BYTES + _POINTER_BYTES * sequence_length) + n * _POINTER_BYTES
+    inputs = window_bytes * 8
+    one_hot = n * n_vocab * 4
+    sequences = {
+        'prepared': inputs + one_hot,
+        'peak_prepare': max(lists + inputs, 2 * inputs, inputs + one_hot),
+        'training': 2 * (inputs + one_hot)
+    }
+
+    # The token array and the int32 ids, which the targets are a view of; the int16 codes only while encoding
+    prepared = n_tokens * (itemsize + 4)
+    windows = {
+        'prepared': prepared,
+        'peak_prepare': prepared + n_tokens * 2,
+        'training': prepared + window_bytes * itemsize + n * 4
+    }
+
+    # The dataset copies tokens and targets, then into constants, and shuffles an int64 index per window
+    streaming = {
+        'prepared': prepared,
+        'peak_prepare': prepared + n_tokens * 2,
+        'training': prepared + 2 * (n_tokens * itemsize + n * 4) + n * 8
+                    + _PREFETCH_BATCHES * batch_size * (sequence_length * itemsize + 4)
+    }
+    return {'sequences': sequences, 'windows': windows, 'streaming': streaming}
+
+def corpus_report(midi_processor, midi_directory, sequence_length=100, batch_size=64, input_dtype='float32',
+                  window_stride=1, window_sample=1.0):
+    """
+    Parse a corpus and profile it for planning a training run.
+
+    Files are parsed as prepare_data parses them, and augmented with the
+    processor's settings, but nothing is trained.
+
+    Args:
+        midi_processor (MIDIProcessor): The processor, with the parse and augmentation settings of the run.
+        midi_directory (str): Path to the directory containing MIDI files.
+        sequence_length (int): Length of each input sequence.
+        batch_size (int): Number of windows per batch.
+        input_dtype (str): SEQUENCE_INPUT_DTYPE, the dtype of windowed inputs.
+        window_stride (int): WINDOW_STRIDE, the offset between the windows an epoch uses.
+        window_sample (float): WINDOW_SAMPLE, the fraction of those windows drawn each epoch.
+
+    Returns:
+        dict: Per-file parse time, note, chord and new-vocabulary counts, and
+        for the corpus the totals, token distribution, window counts and
+        estimated data memory of each preparation mode.
+
+    Raises:
+        ValueError: If no MIDI files are found.
+    """
+    midi_files = sorted(f for f in os.listdir(midi_directory) if f.endswith(".mid"))
+    if not midi_files:
+        raise ValueError(f"No MIDI files found in {midi_directory}")
+    midi_paths = [os.path.join(midi_directory, f) for f in midi_files]
+
+    start_time = time.perf_counter()
+    file_notes, errors = midi_processor.parse_files(midi_paths)
+    parse_seconds = time.perf_counter() - start_time
+
+    files = []
+    seen = np.zeros(NUM_CODES, dtype=bool)
+    for midi_path, notes in zip(midi_paths, file_notes):
+        parse_time = midi_processor.parse_times.get(midi_path)
+        entry = {
+            'file': os.path.basename(midi_path),
+            'bytes': os.path.getsize(midi_path),
+            'parse_s': None if parse_time is None else round(parse_time, 4),
+            'cached': parse_time is None
+        }
+        if notes is None:
+            entry['error'] = errors.get(midi_path)
+        else:
+            codes = encode_tokens(notes)
+            unique = np.unique(codes)
+            entry.update({
+                'tokens': len(codes),
+                'notes': int(np.count_nonzero(codes < CHORD_BASE)),
+                'chords': int(np.count_nonzero(codes >= CHORD_BASE)),
+                'vocab': len(unique),
+                # Vocabulary growth in file order: tokens no earlier file used
+                'new_tokens': int(np.count_nonzero(~seen[unique]))
+            })
+            seen[unique] = True
+            entry['vocab_total'] = int(seen.sum())
+        files.append(entry)
+
+    notes = [token for tokens in file_notes if tokens for token in tokens]
+    codes = encode_tokens(notes)
+    augmented = encode_tokens(midi_processor.augment_data(notes, midi_processor.num_augmentations,
+                                                          midi_processor.transpositions))
+    distribution = token_distribution(codes)
+    augmented_distribution = token_distribution(augmented)
+    n_vocab = augmented_distribution['vocab']
+    n_windows = max(0, len(augmented) - sequence_length)
+    epoch_windows = windows_per_epoch(n_windows, window_stride, window_sample) if n_windows else 0
+    timed = [entry['parse_s'] for entry in files if entry['parse_s'] is not None]
+
+    corpus = {
+        'directory': midi_directory,
+        'files': len(midi_paths),
+        'failed': len(errors),
+        'cached': sum(entry['cached'] for entry in files),
+        'bytes': sum(entry['bytes'] for entry in files),
+        'parse_s': round(parse_seconds, 3),
+        'parse_s_per_file': round(sum(timed) / len(timed), 4) if timed else None,
+        'tokens': len(codes),
+        'notes': int(np.count_nonzero(codes < CHORD_BASE)),
+        'chords': int(np.count_nonzero(codes >= CHORD_BASE)),
+        'distribution': distribution,
+        'augmented_tokens': len(augmented),
+        'augmented_distribution': augmented_distribution,
+        'sequence_length': sequence_length,
+        'windows': n_windows,
+        'window_stride': window_stride,
+        'window_sample': window_sample,
+        'windows_per_epoch': epoch_windows,
+        'steps_per_epoch': math.ceil(epoch_windows / batch_size),
+        'batch_size': batch_size,
+        'input_dtype': str(np.dtype(input_dtype)),
+        'memory_bytes': estimate_memory(len(augmented), n_vocab, sequence_length, batch_size, input_dtype)
+    }
+    return {'corpus': corpus, 'files': files}
+
+def _megabytes(n_bytes):
+    return f"{n_bytes / 2**20:,.1f} MB"
+
+def print_report(report, max_files=20):
+    """
+    Print a corpus report as a summary table.
+
+    Args:
+        report (dict): A report from corpus_report.
+        max_files (int): Number of slowest-parsing files to list.
+    """
+    corpus = report['corpus']
+    print(f"{'file':<40} {'parse_s':>8} {'tokens':>8} {'notes':>8} {'chords':>8} {'vocab':>6} {'new':>5}")
+    files = sorted(report['files'], key=lambda entry: entry['parse_s'] or 0.0, reverse=True)
+    for entry in files[:max_files]:
+        parse_s = 'cached' if entry['cached'] else f"{entry['parse_s']:.2f}"
+        if 'error' in entry:
+            print(f"{entry['file'][:40]:<40} {parse_s:>8} error: {entry['error']}")
+            continue
+        print(f"{entry['file'][:40]:<40} {parse_s:>8} {entry['tokens']:>8} {entry['notes']:>8} "
+              f"{entry['chords']:>8} {entry['vocab']:>6} {entry['new_tokens']:>5}")
+    if len(files) > max_files:
+        print(f"... {len(files) - max_files} more file(s) in the JSON report")
+
+    distribution = corpus['distribution']
+    augmented = corpus['augmented_distribution']
+    print(f"\n{corpus['files']} files ({corpus['failed']} failed, {corpus['cached']} cached), "
+          f"parsed in {corpus['parse_s']:.1f}s")
+    print(f"{corpus['tokens']} tokens: {corpus['notes']} notes, {corpus['chords']} chords; "
+          f"vocabulary {distribution['vocab']} ({distribution['singletons']} used once, "
+          f"{distribution['entropy_bits']} bits/token)")
+    print(f"After augmentation: {corpus['augmented_tokens']} tokens, vocabulary {augmented['vocab']} "
+          f"({', '.join(f'{n} at min count {k}' for k, n in augmented['vocab_at_min_count'].items())})")
+    print(f"{corpus['windows']} windows of {corpus['sequence_length']}, {corpus['windows_per_epoch']} per epoch "
+          f"= {corpus['steps_per_epoch']} steps of {corpus['batch_size']}")
+    print(f"\n{'mode':<10} {'prepared':>12} {'peak_prepare':>14} {'training':>12}")
+    for mode, memory in corpus['memory_bytes'].items():
+        print(f"{mode:<10} {_megabytes(memory['prepared']):>12} {_megabytes(memory['peak_prepare']):>14} "
+              f"{_megabytes(memory['training']):>12}")
+
+def main(argv=None):
+    """
+    Profile a MIDI corpus from the command line, with the trainer's configuration as defaults.
+
+    Args:
+        argv (list, optional): The arguments to parse. Defaults to sys.argv[1:].
+
+    Returns:
+        int: The exit status.
+
+    Example:
+        $ python corpus_report.py /app/training_data/v5_various --sequence-length 64
+    """
+    config = load_config()
+    parser = argparse.ArgumentParser(description="Report parse time, token statistics and estimated training "
+                                                 "memory of a MIDI corpus, without training.")
+    parser.add_argument('directory', help="Directory of the MIDI files")
+    parser.add_argument('--output', help="Path of the JSON report. Defaults to MODEL_BASE/<directory name>_corpus.json")
+    parser.add_argument('--sequence-length', type=int, default=config.SEQUENCE_LENGTH)
+    parser.add_argument('--batch-size', type=int, default=config.BATCH_SIZE)
+    parser.add_argument('--cache', action='store_true',
+                        help="Read files from PARSE_CACHE_DIR. Cached files have no parse time")
+    args = parser.parse_args(argv)
+
+    midi_processor = MIDIProcessor(workers=config.PARSE_WORKERS,
+                                   cache_dir=config.PARSE_CACHE_DIR if args.cache else None,
+                                   extractor=config.MIDI_EXTRACTOR, num_augmentations=config.NUM_AUGMENTATIONS,
+                                   transpositions=config.AUGMENT_TRANSPOSITIONS, seed=config.AUGMENT_SEED)
+    try:
+        report = corpus_report(midi_processor, args.directory, args.sequence_length, args.batch_size,
+                               config.SEQUENCE_INPUT_DTYPE, config.WINDOW_STRIDE, config.WINDOW_SAMPLE)
+    except ValueError as e:
+        print(e)
+        return 1
+
+    print()
+    print_report(report)
+    output = args.output or os.path.join(config.MODEL_BASE,
+                                         f"{os.path.basename(os.path.normpath(args.directory))}_corpus.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Corpus report saved to {output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
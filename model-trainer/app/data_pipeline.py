@@ -0,0 +1,162 @@
+import math
+import pickle
+import numpy as np
+import tensorflow as tf
+from numpy.lib.stride_tricks import sliding_window_view
+
+def input_tokens(network_input):
+    """
+    Recover the token array that consecutive training windows were cut from.
+
+    Args:
+        network_input (numpy.ndarray): Windows of shape (n_patterns, sequence_length, 1).
+
+    Returns:
+        numpy.ndarray: The n_patterns + sequence_length - 1 input tokens.
+    """
+    return np.concatenate([network_input[:, 0, 0], network_input[-1, 1:, 0]])
+
+def token_windows(tokens, sequence_length):
+    """
+    Cut every window of a token array as a read-only view, the inverse of input_tokens.
+
+    Args:
+        tokens (numpy.ndarray): The input tokens.
+        sequence_length (int): Length of each window.
+
+    Returns:
+        numpy.ndarray: A view of shape (n_patterns, sequence_length, 1).
+    """
+    return sliding_window_view(tokens, sequence_length)[:, :, np.newaxis]
+
+def save_model_data(data_path, network_input, pitchnames, note_to_int):
+    """
+    Save the windows and vocabulary a model needs for generation.
+
+    The windows are saved as their token array and sequence length, so the
+    file grows with the number of notes rather than notes x sequence length.
+
+    Args:
+        data_path (str): Path of the model's _data.pkl file.
+        network_input (numpy.ndarray): Consecutive windows of shape (n_patterns, sequence_length, 1).
+        pitchnames (list): The vocabulary.
+        note_to_int (dict): Mapping of notes to vocabulary ids.
+    """
+    with open(data_path, 'wb') as f:
+        pickle.dump((input_tokens(network_input), pitchnames, note_to_int, len(pitchnames), network_input.shape[1]), f)
+
+def load_model_data(data_path):
+    """
+    Load a model's _data.pkl, with the windows as a view of its token array.
+
+    Files written before the token format, which hold the windows themselves, load as they are.
+
+    Args:
+        data_path (str): Path of the model's _data.pkl file.
+
+    Returns:
+        tuple: The windows, pitch names, note-to-integer mapping and vocabulary size.
+    """
+    with open(data_path, 'rb') as f:
+        data = pickle.load(f)
+    if len(data) == 4:
+        return data
+    tokens, pitchnames, note_to_int, n_vocab, sequence_length = data
+    return token_windows(tokens, sequence_length), pitchnames, note_to_int, n_vocab
+
+def window_tokens(network_input, network_output):
+    """
+    Recover the token array and target ids that training windows were cut from.
+
+    Works for the copied arrays of prepare_sequences as well as the strided
+    views of prepare_windows, and costs O(n) memory either way.
+
+    Args:
+        network_input (numpy.ndarray): Windows of shape (n_patterns, sequence_length, 1).
+        network_output (numpy.ndarray): Target ids, or one-hot rows.
+
+    Returns:
+        tuple: The input token of every note and the int32 target id of every window.
+    """
+    tokens = input_tokens(network_input)
+    targets = np.asarray(network_output)
+    if targets.ndim == 2:
+        targets = targets.argmax(axis=1)
+    return tokens, targets.astype(np.int32)
+
+def windows_per_epoch(n_windows, stride=1, sample=1.0):
+    """
+    Count the windows an epoch trains on.
+
+    Args:
+        n_windows (int): Number of windows, one at every offset of the corpus.
+        stride (int): Offset between the starts of the windows used.
+        sample (float): Fraction of those windows drawn each epoch.
+
+    Returns:
+        int: The number of windows per epoch, at least 1.
+    """
+    return max(1, math.ceil(math.ceil(n_windows / stride) * sample))
+
+def make_window_dataset(network_input, network_output, batch_size=64, shuffle=True, seed=None, horizon=1,
+                        stride=1, sample=1.0):
+    """
+    Build a tf.data pipeline that cuts training windows on the fly.
+
+    Only the token array and the window start indices are held in memory.
+    Each epoch the starts are shuffled, batched, and expanded into windows
+    by a parallel gather, and batches are prefetched while the model trains
+    on the previous one. The model sees the same samples as when fitting on
+    the arrays, with targets as ids, so it needs a sparse categorical loss.
+
+    Neighbouring windows overlap in all but one note, so for quick
+    experiments an epoch can use fewer of them: every stride-th window, and
+    of those a random sample drawn anew each epoch. Over several epochs the
+    samples still cover the whole corpus.
+
+    Args:
+        network_input (numpy.ndarray): Windows from prepare_windows or prepare_sequences.
+        network_output (numpy.ndarray): The matching targets.
+        batch_size (int): Number of windows per batch.
+        shuffle (bool): Whether to reshuffle the windows every epoch.
+        seed (int, optional): Seed for the shuffle order.
+        horizon (int): Number of following notes each window is labelled with,
+            for models that predict several tokens at once. The last
+            horizon - 1 windows have too few following notes and are left out.
+        stride (int): Use only the windows starting at every stride-th note.
+        sample (float): Fraction of the windows to train on each epoch, drawn
+            at random every epoch. Needs shuffle.
+
+    Returns:
+        tf.data.Dataset: Batches of (inputs, target ids), with targets of shape
+        (batch, horizon) when horizon is above 1.
+
+    Raises:
+        ValueError: If windows are sampled without shuffling.
+    """
+    if sample < 1.0 and not shuffle:
+        raise ValueError("Sampling windows per epoch needs shuffle")
+    n_patterns, sequence_length = network_input.shape[0] - horizon + 1, network_input.shape[1]
+    tokens, targets = window_tokens(network_input, network_output)
+    tokens = tf.constant(tokens)
+    targets = tf.constant(targets)
+    offsets = tf.range(sequence_length, dtype=tf.int64)
+    target_offsets = tf.range(horizon, dtype=tf.int64)
+
+    def gather_windows(starts):
+        windows = tf.gather(tokens, starts[:, tf.newaxis] + offsets)
+        if horizon > 1:
+            # The k-th following note of window i is the target of window i + k
+            return windows[:, :, tf.newaxis], tf.gather(targets, starts[:, tf.newaxis] + target_offsets)
+        return windows[:, :, tf.newaxis], tf.gather(targets, starts)
+
+    dataset = tf.data.Dataset.range(0, n_patterns, stride)
+    if shuffle:
+        # Shuffling indices rather than windows keeps a full-corpus buffer cheap
+        dataset = dataset.shuffle(math.ceil(n_patterns / stride), seed=seed, reshuffle_each_iteration=True)
+    if sample < 1.0:
+        # The order is reshuffled every epoch, so its head is a new random sample each time
+        dataset = dataset.take(windows_per_epoch(n_patterns, stride, sample))
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.map(gather_windows, num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.prefetch(tf.data.AUTOTUNE)
@@ -0,0 +1,171 @@
+import json
+import time
+import numpy as np
+import tensorflow as tf
+from data_pipeline import load_model_data, make_window_dataset
+
+class Distiller(tf.keras.Model):
+    """
+    Trains a student model to reproduce a teacher model's predictions.
+
+    The loss mixes the usual cross-entropy on the next note (weighted by
+    alpha) with the KL divergence between the teacher's and the student's
+    distributions, both softened by a temperature. Softened targets carry
+    how the teacher ranks the other notes too, which is what lets a much
+    smaller student get close to it. Only the student's weights are trained.
+    """
+
+    def __init__(self, teacher, student, temperature=2.0, alpha=0.1):
+        """
+        Initialise the Distiller.
+
+        Args:
+            teacher (keras.Model): The trained model, with a softmax output.
+            student (keras.Model): A model from ModelBuilder.create_student_model.
+            temperature (float): Softening applied to both distributions.
+            alpha (float): Weight of the hard-target loss; the soft loss gets 1 - alpha.
+        """
+        super().__init__()
+        self.teacher = teacher
+        self.student = student
+        self.student_logits = tf.keras.Model(student.inputs, student.get_layer('logits').output)
+        self.temperature = temperature
+        self.alpha = alpha
+        self.loss_tracker = tf.keras.metrics.Mean(name='loss')
+        self.agreement_tracker = tf.keras.metrics.Mean(name='agreement')
+
+    @property
+    def metrics(self):
+        return [self.loss_tracker, self.agreement_tracker]
+
+    def call(self, inputs, training=False):
+        return self.student(inputs, training=training)
+
+    def train_step(self, data):
+        inputs, targets = data
+        # The teacher's log-probabilities are its logits up to a constant, which softmax ignores
+        teacher_probs = self.teacher(inputs, training=False)
+        teacher_logits = tf.math.log(teacher_probs + 1e-8)
+        soft_targets = tf.nn.softmax(teacher_logits / self.temperature)
+
+        with tf.GradientTape() as tape:
+            logits = self.student_logits(inputs, training=True)
+            hard_loss = tf.keras.losses.sparse_categorical_crossentropy(targets, logits, from_logits=True)
+            soft_loss = tf.keras.losses.kl_divergence(soft_targets, tf.nn.softmax(logits / self.temperature))
+            loss = tf.reduce_mean(self.alpha * hard_loss + (1 - self.alpha) * self.temperature ** 2 * soft_loss)
+
+        gradients = tape.gradient(loss, self.student.trainable_variables)
+        self.optimizer.apply_gradients(zip(gradients, self.student.trainable_variables))
+
+        agreement = tf.cast(tf.equal(tf.argmax(logits, axis=-1), tf.argmax(teacher_probs, axis=-1)), tf.float32)
+        self.loss_tracker.update_state(loss)
+        self.agreement_tracker.update_state(agreement)
+        return {'loss': self.loss_tracker.result(), 'agreement': self.agreement_tracker.result()}
+
+def step_latency_ms(model, network_input, runs=50):
+    """
+    Measure how long one generation step (a single window) takes.
+
+    Args:
+        model (keras.Model): The model to time.
+        network_input (numpy.ndarray): Windows; the first one is used.
+        runs (int): Number of timed calls, after one warm-up call.
+
+    Returns:
+        float: The median milliseconds per call.
+    """
+    window = tf.constant(np.asarray(network_input[:1], dtype=np.float32))
+    model(window, training=False)
+    timings = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        model(window, training=False)
+        timings.append((time.perf_counter() - start_time) * 1000)
+    return float(np.median(timings))
+
+def compare_models(teacher, student, network_input, samples=2048, seed=0):
+    """
+    Measure how closely a student follows its teacher.
+
+    Args:
+        teacher (keras.Model): The trained model.
+        student (keras.Model): The distilled model.
+        network_input (numpy.ndarray): Windows to compare the predictions on.
+        samples (int): Number of windows, drawn at random.
+        seed (int): Seed for drawing the windows.
+
+    Returns:
+        dict: Top-1 agreement, share of student picks in the teacher's top 5,
+        mean KL divergence from teacher to student, parameter counts and
+        per-step latency of both models.
+    """
+    rng = np.random.default_rng(seed)
+    indices = np.sort(rng.choice(len(network_input), min(samples, len(network_input)), replace=False))
+    windows = np.asarray(network_input[indices], dtype=np.float32)
+    teacher_probs = teacher.predict(windows, batch_size=256, verbose=0)
+    student_probs = student.predict(windows, batch_size=256, verbose=0)
+
+    student_top1 = student_probs.argmax(axis=1)
+    teacher_top5 = np.argsort(teacher_probs, axis=1)[:, -5:]
+    kl = np.sum(teacher_probs * (np.log(teacher_probs + 1e-8) - np.log(student_probs + 1e-8)), axis=1)
+
+    teacher_ms = step_latency_ms(teacher, windows)
+    student_ms = step_latency_ms(student, windows)
+    return {
+        'samples': len(indices),
+        'top1_agreement': round(float(np.mean(student_top1 == teacher_probs.argmax(axis=1))), 4),
+        'top5_agreement': round(float(np.mean((teacher_top5 == student_top1[:, np.newaxis]).any(axis=1))), 4),
+        'kl_divergence': round(float(np.mean(kl)), 4),
+        'teacher_params': int(teacher.count_params()),
+        'student_params': int(student.count_params()),
+        'teacher_step_ms': round(teacher_ms, 3),
+        'student_step_ms': round(student_ms, 3),
+        'speedup': round(teacher_ms / student_ms, 2)
+    }
+
+def load_teacher(teacher_path):
+    """
+    Load a trained model and the vocabulary it was trained with.
+
+    Args:
+        teacher_path (str): Path to the model's .h5 file, next to its _data.pkl.
+
+    Returns:
+        tuple: The model and its pitch names.
+    """
+    teacher = tf.keras.models.load_model(teacher_path, compile=False)
+    _, pitchnames, _, _ = load_model_data(f"{teacher_path}_data.pkl")
+    return teacher, pitchnames
+
+def distill(teacher, student, network_input, network_output, epochs=10, batch_size=64, temperature=2.0,
+            alpha=0.1, shuffle_seed=None, callbacks=()):
+    """
+    Train a student on a teacher's softened predictions.
+
+    Args:
+        teacher (keras.Model): The trained model.
+        student (keras.Model): A model from ModelBuilder.create_student_model.
+        network_input (numpy.ndarray): Windows, encoded with the teacher's vocabulary.
+        network_output (numpy.ndarray): The matching target ids.
+        epochs (int): Number of training epochs.
+        batch_size (int): Batch size for training.
+        temperature (float): Softening applied to both models' distributions.
+        alpha (float): Weight of the hard-target loss.
+        shuffle_seed (int, optional): Seed for the shuffle order.
+        callbacks (list): Extra Keras callbacks.
+
+    Returns:
+        keras.callbacks.History: The training history, with loss and teacher agreement per epoch.
+    """
+    print(f"Distilling with temperature {temperature} and alpha {alpha} for {epochs} epochs...")
+    distiller = Distiller(teacher, student, temperature, alpha)
+    distiller.compile(optimizer='adam')
+    dataset = make_window_dataset(network_input, network_output, batch_size, seed=shuffle_seed)
+    return distiller.fit(dataset, epochs=epochs, callbacks=list(callbacks))
+
+def save_metrics(metrics, model_path):
+    """Write a student's comparison metrics next to the exported model."""
+    metrics_path = f"{model_path}_distillation.json"
+    with open(metrics_path, 'w') as f:
+        json.dump(metrics, f, indent=2)
+    print(f"Distillation metrics saved to {metrics_path}")
@@ -0,0 +1,162 @@
+import numpy as np
+import tensorflow as tf
+from data_pipeline import input_tokens, load_model_data
+from token_codec import CODE_NAMES, encode_tokens, vocabulary_index
+
+def load_base_model(model_path):
+    """
+    Load a trained model and the artifacts saved with it.
+
+    Args:
+        model_path (str): Path to the model's .h5 file, next to its _data.pkl.
+
+    Returns:
+        tuple: The model, its training windows, pitch names, note-to-integer
+        mapping and vocabulary size.
+    """
+    model = tf.keras.models.load_model(model_path, compile=False)
+    network_input, pitchnames, note_to_int, n_vocab = load_model_data(f"{model_path}_data.pkl")
+    return model, network_input, list(pitchnames), note_to_int, n_vocab
+
+def extend_vocabulary(pitchnames, notes):
+    """
+    Add the tokens of new notes that a model's vocabulary doesn't have yet.
+
+    New tokens get the next ids, after the existing ones, so every token the
+    model already knows keeps its output. Tokens are matched by their exact
+    name (see token_codec.vocabulary_index), so older vocabularies with
+    letter-named chords or enharmonic duplicates keep every id.
+
+    Args:
+        pitchnames (list): The model's vocabulary.
+        notes (list): The new notes and chords.
+
+    Returns:
+        list: The extended vocabulary.
+    """
+    codes = np.unique(encode_tokens(notes))
+    new_tokens = sorted(CODE_NAMES[codes[vocabulary_index(pitchnames)[codes] < 0]].tolist())
+    if new_tokens:
+        print(f"Adding {len(new_tokens)} new tokens to the vocabulary of {len(pitchnames)}")
+    return list(pitchnames) + new_tokens
+
+def grow_output_layer(model, n_vocab, learning_rate=0.0001):
+    """
+    Rebuild a model with room for more tokens in its output layer.
+
+    All weights are copied. The new output units start with small random
+    weights and the lowest bias of the existing ones, so new tokens begin as
+    unlikely as the rarest known token and the known tokens keep their
+    ranking. A model that predicts several tokens has one block of outputs
+    per head, each of which is widened, and its Reshape is rebuilt to match.
+
+    Args:
+        model (keras.Sequential): The trained model.
+        n_vocab (int): The new vocabulary size, at least the current one.
+        learning_rate (float): Learning rate of the fresh Adam optimizer.
+
+    Returns:
+        keras.Sequential: The grown model, compiled for sparse targets.
+
+    Raises:
+        ValueError: If the vocabulary would shrink.
+    """
+    config = model.get_config()
+    output_index = max(i for i, layer in enumerate(config['layers']) if layer['class_name'] == 'Dense')
+    old_vocab = config['layers'][output_index]['config']['units']
+    # Multi-token models reshape the output to (heads, n_vocab) after the last Dense
+    heads = 1
+    for layer in config['layers'][output_index + 1:]:
+        if layer['class_name'] == 'Reshape':
+            heads = layer['config']['target_shape'][0]
+            layer['config']['target_shape'] = [heads, n_vocab]
+    old_vocab //= heads
+    if n_vocab < old_vocab:
+        raise ValueError(f"The vocabulary can't shrink from {old_vocab} to {n_vocab} tokens")
+    config['layers'][output_index]['config']['units'] = heads * n_vocab
+    grown = tf.keras.Sequential.from_config(config)
+
+    output_layer = [layer for layer in model.layers if isinstance(layer, tf.keras.layers.Dense)][-1]
+    for old_layer, new_layer in zip(model.layers, grown.layers):
+        if old_layer is not output_layer:
+            new_layer.set_weights(old_layer.get_weights())
+            continue
+        kernel, bias = old_layer.get_weights()
+        added = n_vocab - old_vocab
+        rng = np.random.default_rng(0)
+        kernels, biases = [], []
+        for head in range(heads):
+            head_kernel = kernel[:, head * old_vocab:(head + 1) * old_vocab]
+            head_bias = bias[head * old_vocab:(head + 1) * old_vocab]
+            new_kernel = rng.normal(0.0, head_kernel.std() * 0.1, (kernel.shape[0], added)).astype(kernel.dtype)
+            kernels += [head_kernel, new_kernel]
+            biases += [head_bias, np.full(added, head_bias.min(), dtype=bias.dtype)]
+        new_layer.set_weights([np.concatenate(kernels, axis=1), np.concatenate(biases)])
+
+    grown.compile(loss='sparse_categorical_crossentropy', optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate))
+    return grown
+
+def replay_windows(network_input, old_vocab, new_vocab, count, seed=None):
+    """
+    Sample windows from a model's original training data, for rehearsal.
+
+    The saved windows are scaled by the old vocabulary size, so they are
+    rescaled to the new one. Targets are recovered from the following window,
+    so the last window is never drawn.
+
+    Args:
+        network_input (numpy.ndarray): The windows saved with the model.
+        old_vocab (int): The vocabulary size they were scaled by.
+        new_vocab (int): The vocabulary size to scale them by.
+        count (int): Number of windows to draw, at most all of them.
+        seed (int, optional): Seed for drawing the windows.
+
+    Returns:
+        tuple: The sampled windows and their target ids.
+    """
+    rng = np.random.default_rng(seed)
+    indices = np.sort(rng.choice(len(network_input) - 1, min(count, len(network_input) - 1), replace=False))
+    windows = np.asarray(network_input[indices], dtype=np.float32)
+    targets = np.asarray(network_input[indices + 1, -1, 0], dtype=np.float32)
+    if np.issubdtype(network_input.dtype, np.floating):
+        windows = windows * (old_vocab / new_vocab)
+        targets = np.rint(targets * old_vocab)
+    return windows, targets.astype(np.int32)
+
+def rescale_windows(network_input, old_vocab, new_vocab):
+    """Rescale windows saved with a model to a larger vocabulary, as generation seeds."""
+    if not np.issubdtype(network_input.dtype, np.floating):
+        return network_input
+    return (np.asarray(network_input) * (old_vocab / new_vocab)).astype(network_input.dtype)
+
+def replay_ids(network_input, old_vocab, count, seed=None):
+    """
+    Draw a run of consecutive token ids from a model's original training data, for rehearsal.
+
+    Models that predict several tokens label each window with the tokens
+    that follow it, so they rehearse on a stretch of the original corpus
+    rather than on windows drawn apart. Ids are kept as they are, since a
+    grown vocabulary keeps the id of every known token.
+
+    Args:
+        network_input (numpy.ndarray): The windows saved with the model.
+        old_vocab (int): The vocabulary size they were scaled by.
+        count (int): Number of ids to draw, at most all of them.
+        seed (int, optional): Seed for where the run starts.
+
+    Returns:
+        numpy.ndarray: The int32 ids of the run.
+    """
+    tokens = input_tokens(network_input)
+    if np.issubdtype(tokens.dtype, np.floating):
+        tokens = np.rint(tokens * old_vocab)
+    count = min(count, len(tokens))
+    start = np.random.default_rng(seed).integers(0, len(tokens) - count + 1)
+    return tokens[start:start + count].astype(np.int32)
+
+def window_ids(network_input, network_output, n_vocab):
+    """Recover the vocabulary id of every note that consecutive windows and their targets were cut from."""
+    first = np.asarray(network_input[0, :, 0])
+    if np.issubdtype(first.dtype, np.floating):
+        first = np.rint(first * n_vocab)
+    return np.concatenate([first.astype(np.int32), np.asarray(network_output, dtype=np.int32)])
@@ -0,0 +1,149 @@
+import argparse
+import json
+import os
+import queue
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import load_config
+
+def core_budgets(parallel, cores_per_job=None):
+    """
+    Split the CPUs this process may use into disjoint sets, one per concurrent job.
+
+    Args:
+        parallel (int): Number of jobs that run at the same time.
+        cores_per_job (int, optional): CPUs for each job. Defaults to an even split.
+
+    Returns:
+        list: A sorted list of CPU ids for each concurrent job.
+
+    Raises:
+        ValueError: If there are not enough CPUs for the requested budgets.
+    """
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+    cores_per_job = cores_per_job or max(len(cpus) // parallel, 1)
+    if cores_per_job * parallel > len(cpus):
+        raise ValueError(f"{parallel} jobs x {cores_per_job} cores needs more than the {len(cpus)} CPUs available")
+    return [cpus[i * cores_per_job:(i + 1) * cores_per_job] for i in range(parallel)]
+
+def run_pinned(command, cores, log_path):
+    """
+    Run a command in a child process pinned to a set of CPUs.
+
+    The cores are passed in TRAINER_CPU_AFFINITY, which the child applies to
+    itself at startup (subprocess's preexec_fn isn't safe to use from the
+    threads run_jobs starts children from). The child's TensorFlow threads
+    and parse workers are sized to the budget, and its output goes to log_path.
+
+    Args:
+        command (list): The command and its arguments.
+        cores (list): CPU ids the child may run on.
+        log_path (str): File the child's output is written to.
+
+    Returns:
+        int: The child's exit code.
+    """
+    env = dict(os.environ)
+    env.update({
+        'TRAINER_CPU_AFFINITY': json.dumps(list(cores)),
+        'TRAINER_CPU_THREADS': str(len(cores)),
+        'TRAINER_PARSE_WORKERS': str(len(cores)),
+        'OMP_NUM_THREADS': str(len(cores)),
+        'PYTHONUNBUFFERED': '1'
+    })
+
+    with open(log_path, 'w') as log_file:
+        return subprocess.run(command, env=env, stdin=subprocess.DEVNULL, stdout=log_file,
+                              stderr=subprocess.STDOUT).returncode
+
+def run_job(corpus, output_name, cores, train_args, log_dir):
+    """
+    Train one model in a child process pinned to a set of CPUs.
+
+    Args:
+        corpus (str): Corpus directory, or the name of one in INPUT_BASE.
+        output_name (str): File name of the trained model, without .h5.
+        cores (list): CPU ids the job may run on.
+        train_args (list): Extra main.py options, e.g. ['--epochs', '20'].
+        log_dir (str): Directory for the job's log file, <output_name>.log.
+
+    Returns:
+        tuple: The job's exit code and its wall time in seconds.
+    """
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py'),
+               '--corpus', corpus, '--output-name', output_name] + train_args
+    log_path = os.path.join(log_dir, f"{output_name}.log")
+    print(f"Starting {output_name} on {corpus} with cores {cores}, logging to {log_path}")
+    start_time = time.perf_counter()
+    returncode = run_pinned(command, cores, log_path)
+    elapsed = time.perf_counter() - start_time
+    print(f"Finished {output_name}: exit code {returncode} after {elapsed / 60:.1f} min")
+    return returncode, elapsed
+
+def run_jobs(corpora, parallel=1, cores_per_job=None, output_prefix='', train_args=(), log_dir=None):
+    """
+    Train a model for each corpus, a fixed number at a time.
+
+    Each running job holds one of the CPU budgets from core_budgets and
+    hands it to the next job when it finishes, so concurrent jobs never
+    share cores.
+
+    Args:
+        corpora (list): Corpus directories or names in INPUT_BASE, trained in order.
+        parallel (int): Number of jobs that run at the same time.
+        cores_per_job (int, optional): CPUs for each job. Defaults to an even split.
+        output_prefix (str): Prefix of each model's name, followed by the corpus directory name.
+        train_args (list): Extra main.py options passed to every job.
+        log_dir (str, optional): Directory for job logs. Defaults to MODEL_BASE/logs.
+
+    Returns:
+        dict: (exit code, wall time in seconds) keyed by corpus.
+    """
+    log_dir = log_dir or os.path.join(load_config().MODEL_BASE, 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+
+    budgets = queue.Queue()
+    for cores in core_budgets(parallel, cores_per_job):
+        budgets.put(cores)
+
+    def run(corpus):
+        cores = budgets.get()
+        try:
+            output_name = f"{output_prefix}{os.path.basename(os.path.normpath(corpus))}"
+            return run_job(corpus, output_name, cores, list(train_args), log_dir)
+        finally:
+            budgets.put(cores)
+
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        return dict(zip(corpora, executor.map(run, corpora)))
+
+def main():
+    """
+    Train models for several corpora without supervision.
+
+    Example:
+        python jobs.py v2 v3_dance v4_jazz v5_various --parallel 2 --epochs 50
+
+    Options other than those below are passed through to main.py. Exits with
+    a non-zero status if any job failed.
+    """
+    parser = argparse.ArgumentParser(description="Train a model for each of several MIDI corpora.")
+    parser.add_argument('corpora', nargs='+', help="Corpus directories, or names of directories in INPUT_BASE")
+    parser.add_argument('--parallel', type=int, default=1, help="Number of jobs to run at the same time")
+    parser.add_argument('--cores-per-job', type=int, default=None,
+                        help="CPUs for each job (default: the available CPUs split evenly)")
+    parser.add_argument('--output-prefix', default='melody_generator_lstm_',
+                        help="Prefix of each model's name, followed by the corpus name")
+    parser.add_argument('--log-dir', default=None, help="Directory for job logs (default: MODEL_BASE/logs)")
+    args, train_args = parser.parse_known_args()
+
+    results = run_jobs(args.corpora, args.parallel, args.cores_per_job, args.output_prefix, train_args, args.log_dir)
+    print("Summary:")
+    for corpus, (returncode, elapsed) in results.items():
+        print(f"  {corpus}: {'ok' if returncode == 0 else f'failed ({returncode})'} in {elapsed / 60:.1f} min")
+    sys.exit(0 if all(returncode == 0 for returncode, _ in results.values()) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,289 @@
+import argparse
+import json
 import os
 import asyncio
+import sys
+import numpy as np
 from config import load_config
-from midi_processor import MIDIProcessor
+from bundle import export_bundle
+from checkpoints import CheckpointManager, vocabulary_fingerprint
+from data_pipeline import input_tokens, token_windows
+from distillation import compare_models, distill, load_teacher, save_metrics
+from fine_tuning import (extend_vocabulary, grow_output_layer, load_base_model, replay_ids, replay_windows,
+                         rescale_windows, window_ids)
+from midi_processor import DEDUP_MODES, MIDIProcessor, windows_from_ids
 from model_builder import ModelBuilder
 from model_trainer import ModelTrainer
-from utils import setup_gpu, select_directory
+from quantization import PRECISIONS, quantize_model
+from telemetry import TrainingTelemetry
+from utils import configure_threads, set_cpu_affinity, setup_gpu, select_directory
 
-async def main():
+def parse_args(argv=None):
+    """
+    Parse the command line, whose options override the configuration.
+
+    Args:
+        argv (list, optional): The arguments to parse. Defaults to sys.argv[1:].
+
+    Returns:
+        argparse.Namespace: The parsed arguments; options not given are None.
+    """
+    parser = argparse.ArgumentParser(description="Train a melody generation model on a MIDI corpus.")
+    parser.add_argument('--corpus', help="Corpus directory, or the name of one in INPUT_BASE")
+    parser.add_argument('--epochs', type=int, help="Number of training epochs")
+    parser.add_argument('--batch-size', type=int, help="Batch size for training")
+    parser.add_argument('--sequence-length', type=int, help="Length of input sequences")
+    parser.add_argument('--output-name', help="File name of the trained model, without .h5")
+    parser.add_argument('--model-dir', help="Directory the trained model is saved in")
+    parser.add_argument('--window-stride', type=int, help="Train on the windows starting at every Nth note only")
+    parser.add_argument('--window-sample', type=float, help="Fraction of the windows to train on each epoch")
+    parser.add_argument('--predict-tokens', type=int, help="Number of following tokens the model predicts per window")
+    parser.add_argument('--threads', type=int, help="Number of CPU threads TensorFlow may use")
+    parser.add_argument('--checkpoint-dir', help="Directory for resumable training checkpoints, relative to --model-dir")
+    parser.add_argument('--profile-steps', type=int, nargs=2, metavar=('FIRST', 'LAST'),
+                        help="Capture a profiler trace of these global training steps")
+    parser.add_argument('--distill-from', metavar='TEACHER', help="Trained model (.h5) to distil into a smaller student")
+    parser.add_argument('--student-units', type=int, help="Units per recurrent layer of the student")
+    parser.add_argument('--student-layers', type=int, help="Number of recurrent layers of the student")
+    parser.add_argument('--student-cell', choices=['lstm', 'gru'], help="Recurrent cell of the student")
+    parser.add_argument('--finetune-from', metavar='MODEL', help="Trained model (.h5) to fine-tune on the corpus")
+    parser.add_argument('--finetune-epochs', type=int, help="Number of fine-tuning epochs")
+    parser.add_argument('--dedup', choices=DEDUP_MODES,
+                        help="Report duplicate and near-duplicate corpus files, or drop them before training")
+    parser.add_argument('--vocab-min-count', type=int,
+                        help="Replace tokens occurring fewer times than this with their nearest frequent token")
+    parser.add_argument('--quantize', nargs='+', choices=PRECISIONS, metavar='PRECISION',
+                        help="Also export the trained model as TFLite at these precisions (int8, float16, float32)")
+    parser.add_argument('--bundle-name', help="Model ID to export the versioned inference bundle under")
+    parser.add_argument('--no-bundle', dest='bundle', action='store_false', default=None,
+                        help="Don't export a versioned inference bundle")
+    parser.add_argument('--resume', action='store_true', default=None,
+                        help="Continue from the latest checkpoint of this output name")
+    return parser.parse_args(argv)
+
+def cli_overrides(args):
+    """Return the configuration settings the command-line options override, None where an option wasn't given."""
+    return {
+        'INPUT_DIR': args.corpus,
+        'EPOCHS': args.epochs,
+        'BATCH_SIZE': args.batch_size,
+        'SEQUENCE_LENGTH': args.sequence_length,
+        'PREDICT_TOKENS': args.predict_tokens,
+        'WINDOW_STRIDE': args.window_stride,
+        'WINDOW_SAMPLE': args.window_sample,
+        'VOCAB_MIN_COUNT': args.vocab_min_count,
+        'DEDUP_MODE': args.dedup,
+        'OUTPUT_NAME': args.output_name,
+        'MODEL_BASE': args.model_dir,
+        'CPU_THREADS': args.threads,
+        'CHECKPOINT_DIR': args.checkpoint_dir,
+        'RESUME': args.resume,
+        'PROFILE_STEPS': args.profile_steps,
+        'DISTILL_TEACHER': args.distill_from,
+        'STUDENT_UNITS': args.student_units,
+        'STUDENT_LAYERS': args.student_layers,
+        'STUDENT_CELL': args.student_cell,
+        'FINETUNE_FROM': args.finetune_from,
+        'FINETUNE_EPOCHS': args.finetune_epochs,
+        'QUANTIZE_PRECISIONS': args.quantize,
+        'EXPORT_BUNDLE': args.bundle,
+        'BUNDLE_NAME': args.bundle_name
+    }
+
+def resolve_input_dir(config):
+    """
+    Find the corpus directory to train on.
+
+    Returns:
+        str: INPUT_DIR as a path, or as a directory name in INPUT_BASE. Without
+        INPUT_DIR the user is asked to pick one, if there is a terminal to ask on.
+        None if there is no corpus to train on.
+    """
+    if config.INPUT_DIR:
+        if os.path.isdir(config.INPUT_DIR):
+            return config.INPUT_DIR
+        input_dir = os.path.join(config.INPUT_BASE, config.INPUT_DIR)
+        if os.path.isdir(input_dir):
+            return input_dir
+        print(f"Corpus directory not found: {config.INPUT_DIR}")
+        return None
+    if not sys.stdin.isatty():
+        print("No corpus given. Use --corpus or TRAINER_INPUT_DIR when running unattended.")
+        return None
+    return select_directory(config.INPUT_BASE, "Select the input directory containing MIDI files:")
+
+def save_duplicate_report(report, model_path):
+    """Write the duplicate files found in the corpus next to the model."""
+    report_path = f"{model_path}_duplicates.json"
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Duplicate report saved to {report_path}")
+
+def save_vocabulary_report(report, remap_table, model_path):
+    """Write the vocabulary pruning coverage and remap table next to the model."""
+    report_path = f"{model_path}_vocabulary.json"
+    with open(report_path, 'w') as f:
+        json.dump(dict(report, remap=remap_table), f, indent=2)
+    print(f"Vocabulary report saved to {report_path}")
+
+def export_quantized(config, model, model_path, network_input, network_output):
+    """Export the trained model at the configured precisions, with an accuracy report against the float model."""
+    if not config.QUANTIZE_PRECISIONS:
+        return
+    # One-hot rows become ids; multi-token models train on ids already, of the next note
+    targets = np.asarray(network_output)
+    if targets.ndim == 2:
+        targets = targets.argmax(axis=1)
+    quantize_model(model, model_path, config.QUANTIZE_PRECISIONS, network_input, targets)
+
+def export_model_bundle(config, model, model_path, stats):
+    """Export the saved model as the next version of its bundle, with the training settings and results."""
+    if not config.EXPORT_BUNDLE:
+        return
+    stats = dict(stats, sequence_length=config.SEQUENCE_LENGTH, batch_size=config.BATCH_SIZE,
+                 parameters=model.count_params(), quantized=config.QUANTIZE_PRECISIONS or [])
+    export_bundle(model, model_path, config.MODEL_BASE, config.BUNDLE_NAME or config.OUTPUT_NAME, stats)
+
+def _history_stats(history):
+    losses = (history or {}).get('loss') or []
+    return {'epochs_run': len(losses), 'final_loss': losses[-1] if losses else None, 'loss_history': losses}
+
+def corpus_record(midi_processor, pitchnames):
+    """Describe the corpus a run trains on, for the checkpoint index."""
+    return {'n_vocab': len(pitchnames), 'vocab_sha256': vocabulary_fingerprint(pitchnames),
+            'transpositions': midi_processor.applied_transpositions}
+
+def reuse_transpositions(config, midi_processor):
+    """
+    Augment a resumed run's corpus with the transpositions its checkpoints were trained on.
+
+    Random transpositions would otherwise build a different corpus, and
+    likely a different vocabulary, than the one the checkpoints learnt.
+
+    Returns:
+        bool: False if AUGMENT_TRANSPOSITIONS is set to different ones.
+    """
+    saved = CheckpointManager(os.path.join(config.CHECKPOINT_DIR, config.OUTPUT_NAME)).saved_corpus()
+    if saved is None or saved.get('transpositions') is None:
+        return True
+    if config.AUGMENT_TRANSPOSITIONS is None:
+        midi_processor.transpositions = saved['transpositions']
+        print(f"Augmenting with the checkpointed run's transpositions {saved['transpositions']}")
+    elif list(config.AUGMENT_TRANSPOSITIONS) != saved['transpositions']:
+        print(f"AUGMENT_TRANSPOSITIONS {config.AUGMENT_TRANSPOSITIONS} differ from the checkpointed run's "
+              f"{saved['transpositions']}. Resume with the same ones, or start over without --resume.")
+        return False
+    return True
+
+def distill_student(config, midi_processor, notes, model_path):
+    """
+    Distil a trained model into a smaller student and export it like a trained model.
+
+    The student uses the teacher's vocabulary, so corpus notes the teacher
+    never saw are left out. Teacher/student agreement and per-step latency
+    are saved next to the student.
+
+    Returns:
+        int: The exit status.
+    """
+    teacher, pitchnames = load_teacher(config.DISTILL_TEACHER)
+    network_input, network_output, pitchnames, note_to_int = midi_processor.prepare_windows(
+        notes, config.SEQUENCE_LENGTH, config.SEQUENCE_INPUT_DTYPE, pitchnames)
+    if network_input.shape[1:] != tuple(teacher.input_shape[1:]):
+        print(f"Sequence length {config.SEQUENCE_LENGTH} doesn't match the teacher's input shape {teacher.input_shape}")
+        return 1
+
+    student = ModelBuilder().create_student_model(network_input, len(pitchnames), config.STUDENT_UNITS,
+                                                  config.STUDENT_LAYERS, config.STUDENT_CELL)
+    callbacks = []
+    if config.TELEMETRY_DIR:
+        callbacks.append(TrainingTelemetry(os.path.join(config.TELEMETRY_DIR, f"{config.OUTPUT_NAME}.jsonl"),
+                                           len(network_input), config.BATCH_SIZE))
+    distill(teacher, student, network_input, network_output, config.EPOCHS, config.BATCH_SIZE,
+            config.DISTILL_TEMPERATURE, config.DISTILL_ALPHA, config.SHUFFLE_SEED, callbacks)
+
+    metrics = compare_models(teacher, student, network_input)
+    print(f"Student agrees with the teacher on {metrics['top1_agreement']:.1%} of next notes "
+          f"({metrics['top5_agreement']:.1%} within its top 5) and is {metrics['speedup']}x faster per step")
+    ModelTrainer(student).save(model_path, network_input, pitchnames, note_to_int)
+    save_metrics(metrics, model_path)
+    export_quantized(config, student, model_path, network_input, network_output)
+    export_model_bundle(config, student, model_path, dict(metrics, mode='distill', teacher=config.DISTILL_TEACHER,
+                                                          epochs=config.EPOCHS, windows=len(network_input),
+                                                          n_vocab=len(pitchnames)))
+    print("Distillation complete.")
+    return 0
+
+async def fine_tune_model(config, midi_processor, notes, model_path):
+    """
+    Continue training an existing model on new songs, instead of retraining from scratch.
+
+    Tokens the model hasn't seen are added to its vocabulary by growing its
+    output layer. Each epoch trains on the new windows plus a sample of the
+    model's original windows, so it doesn't forget the original corpus. The
+    saved seeds are the original windows and the new ones. Models that
+    predict several tokens need the tokens following each window, so they
+    rehearse on a stretch of the original corpus joined after the new songs,
+    and are fed by the streaming pipeline.
+
+    Returns:
+        int: The exit status.
+    """
+    model, old_input, pitchnames, old_note_to_int, old_vocab = load_base_model(config.FINETUNE_FROM)
+    pitchnames = extend_vocabulary(pitchnames, notes)
+    network_input, network_output, pitchnames, note_to_int = midi_processor.prepare_windows(
+        notes, config.SEQUENCE_LENGTH, config.SEQUENCE_INPUT_DTYPE, pitchnames)
+    if network_input.shape[1:] != tuple(model.input_shape[1:]):
+        print(f"Sequence length {config.SEQUENCE_LENGTH} doesn't match the model's input shape {model.input_shape}")
+        return 1
+    n_vocab = len(pitchnames)
+    # Keep tokens that pruning mapped onto others, unless they are now in the vocabulary themselves
+    note_to_int = dict(old_note_to_int, **note_to_int)
+
+    replay_count = int(len(network_input) * config.FINETUNE_REPLAY_RATIO)
+    # The seeds are the original corpus followed by the new one, joined like the files of a corpus
+    seed_tokens = np.concatenate([rescale_windows(input_tokens(old_input), old_vocab, n_vocab),
+                                  input_tokens(network_input)])
+    seed_input = token_windows(seed_tokens.astype(network_input.dtype), config.SEQUENCE_LENGTH)
+    multi_token = len(model.output_shape) == 3
+    if multi_token:
+        replay = replay_ids(old_input, old_vocab, replay_count + config.SEQUENCE_LENGTH, config.SHUFFLE_SEED)
+        replay_count = len(replay) - config.SEQUENCE_LENGTH
+        ids = np.concatenate([window_ids(network_input, network_output, n_vocab), replay])
+        print(f"Fine-tuning on {len(network_input)} new and {replay_count} original windows")
+        network_input, network_output = windows_from_ids(ids, n_vocab, config.SEQUENCE_LENGTH,
+                                                         config.SEQUENCE_INPUT_DTYPE)
+    else:
+        replay_input, replay_output = replay_windows(old_input, old_vocab, n_vocab, replay_count, config.SHUFFLE_SEED)
+        print(f"Fine-tuning on {len(network_input)} new and {len(replay_input)} original windows")
+        network_input = np.concatenate([network_input, replay_input.astype(network_input.dtype)])
+        network_output = np.concatenate([network_output, replay_output])
+
+    model = grow_output_layer(model, n_vocab, config.FINETUNE_LEARNING_RATE)
+
+    checkpoint_dir = os.path.join(config.CHECKPOINT_DIR, config.OUTPUT_NAME) if config.CHECKPOINT_DIR else None
+    telemetry_path = os.path.join(config.TELEMETRY_DIR, f"{config.OUTPUT_NAME}.jsonl") if config.TELEMETRY_DIR else None
+    trainer = ModelTrainer(model, checkpoint_dir, config.KEEP_LAST_CHECKPOINTS, config.KEEP_BEST_CHECKPOINTS,
+                           telemetry_path, corpus=corpus_record(midi_processor, pitchnames))
+    history = await trainer.train(network_input, network_output, model_path, config.FINETUNE_EPOCHS,
+                                  config.BATCH_SIZE, pitchnames, note_to_int, streaming=multi_token,
+                                  shuffle_seed=config.SHUFFLE_SEED, resume=config.RESUME, seed_input=seed_input)
+    export_quantized(config, trainer.model, model_path, network_input, network_output)
+    export_model_bundle(config, trainer.model, model_path, dict(_history_stats(history), mode='finetune',
+                                                                base_model=config.FINETUNE_FROM,
+                                                                epochs=config.FINETUNE_EPOCHS,
+                                                                windows=len(network_input), n_vocab=n_vocab))
+    print("Fine-tuning complete.")
+    return 0
+
+async def main(args=None):
     """
     The main function that orchestrates the entire model training process.
 
     This asynchronous function performs the following steps:
-    1. Loads the configuration
+    1. Loads the configuration, with command-line overrides
     2. Sets up the GPU for TensorFlow
-    3. Prompts the user to select an input directory
+    3. Finds the input directory, prompting the user if none is configured
     4. Processes MIDI files and prepares sequences
     5. Builds and trains the model
     6. Saves the trained model
@@ -22,46 +292,93 @@ async def main():
     although the current implementation is mostly synchronous.
     """
     # Load the configuration settings
-    config = load_config()
+    config = load_config(cli_overrides(args if args is not None else parse_args([])))
 
     # Set up the GPU for TensorFlow
+    if config.CPU_AFFINITY:
+        set_cpu_affinity(config.CPU_AFFINITY)
+    if config.CPU_THREADS:
+        configure_threads(config.CPU_THREADS)
     setup_gpu()
 
-    # Prompt the user to select an input directory containing MIDI files
-    input_dir = select_directory(config.INPUT_BASE, "Select the input directory containing MIDI files:")
+    # Find the input directory containing MIDI files
+    input_dir = resolve_input_dir(config)
     if not input_dir:
         print("No input directory selected. Exiting.")
-        return
+        return 1
 
     # Define the path where the trained model will be saved
-    model_path = os.path.join(config.MODEL_BASE, "trained_model.h5")
+    model_path = os.path.join(config.MODEL_BASE, f"{config.OUTPUT_NAME}.h5")
     # Ensure the model directory exists
     os.makedirs(config.MODEL_BASE, exist_ok=True)
 
     # Create an instance of the MIDIProcessor
-    midi_processor = MIDIProcessor()
+    midi_processor = MIDIProcessor(workers=config.PARSE_WORKERS, cache_dir=config.PARSE_CACHE_DIR,
+                                   extractor=config.MIDI_EXTRACTOR, num_augmentations=config.NUM_AUGMENTATIONS,
+                                   transpositions=config.AUGMENT_TRANSPOSITIONS, seed=config.AUGMENT_SEED,
+                                   dedup=config.DEDUP_MODE, dedup_threshold=config.DEDUP_THRESHOLD)
+
+    if config.RESUME and config.CHECKPOINT_DIR and not reuse_transpositions(config, midi_processor):
+        return 1
 
     # Process MIDI files and extract notes
     print("Processing MIDI files...")
     notes = midi_processor.prepare_data(input_dir)
+    if midi_processor.duplicate_report is not None:
+        save_duplicate_report(midi_processor.duplicate_report, model_path)
+
+    if config.DISTILL_TEACHER:
+        return distill_student(config, midi_processor, notes, model_path)
+    if config.FINETUNE_FROM:
+        return await fine_tune_model(config, midi_processor, notes, model_path)
     
+    remap_table = {}
+    if config.VOCAB_MIN_COUNT and config.VOCAB_MIN_COUNT > 1:
+        notes, remap_table, vocabulary_report = midi_processor.prune_vocabulary(notes, config.VOCAB_MIN_COUNT)
+        save_vocabulary_report(vocabulary_report, remap_table, model_path)
+
     # Prepare sequences for model input
     print("Preparing sequences...")
-    network_input, network_output, pitchnames, note_to_int = midi_processor.prepare_sequences(notes, config.SEQUENCE_LENGTH)
-    n_vocab = len(set(notes))
+    if config.WINDOWED_SEQUENCES:
+        network_input, network_output, pitchnames, note_to_int = midi_processor.prepare_windows(
+            notes, config.SEQUENCE_LENGTH, config.SEQUENCE_INPUT_DTYPE)
+    else:
+        network_input, network_output, pitchnames, note_to_int = midi_processor.prepare_sequences(notes, config.SEQUENCE_LENGTH)
+    n_vocab = len(pitchnames)
+    # Pruned tokens map to their replacement's id, so the saved mapping still encodes every corpus token
+    note_to_int.update((token, note_to_int[replacement]) for token, replacement in remap_table.items())
 
     # Create an instance of the ModelBuilder and build the model
     print("Building the model...")
     model_builder = ModelBuilder()
-    model = model_builder.create_model(network_input, n_vocab)
+    model = model_builder.create_model(network_input, n_vocab, sparse_targets=config.WINDOWED_SEQUENCES,
+                                       units=config.LSTM_UNITS, dropout=config.DROPOUT,
+                                       predict_tokens=config.PREDICT_TOKENS)
 
     # Create an instance of the ModelTrainer and train the model
     print("Training the model...")
-    trainer = ModelTrainer(model)
-    await trainer.train(network_input, network_output, model_path, config.EPOCHS, config.BATCH_SIZE, pitchnames, note_to_int)
+    checkpoint_dir = os.path.join(config.CHECKPOINT_DIR, config.OUTPUT_NAME) if config.CHECKPOINT_DIR else None
+    telemetry_path = os.path.join(config.TELEMETRY_DIR, f"{config.OUTPUT_NAME}.jsonl") if config.TELEMETRY_DIR else None
+    profile_dir = os.path.join(config.PROFILE_DIR, config.OUTPUT_NAME)
+    trainer = ModelTrainer(model, checkpoint_dir, config.KEEP_LAST_CHECKPOINTS, config.KEEP_BEST_CHECKPOINTS,
+                           telemetry_path, config.PROFILE_STEPS, profile_dir, corpus_record(midi_processor, pitchnames))
+    history = await trainer.train(network_input, network_output, model_path, config.EPOCHS, config.BATCH_SIZE,
+                                  pitchnames, note_to_int,
+                                  streaming=config.STREAMING_INPUT and config.WINDOWED_SEQUENCES,
+                                  shuffle_seed=config.SHUFFLE_SEED, resume=config.RESUME,
+                                  window_stride=config.WINDOW_STRIDE, window_sample=config.WINDOW_SAMPLE)
+    export_quantized(config, trainer.model, model_path, network_input, network_output)
+    export_model_bundle(config, trainer.model, model_path, dict(_history_stats(history), mode='train',
+                                                                corpus=os.path.basename(os.path.normpath(input_dir)),
+                                                                epochs=config.EPOCHS, windows=len(network_input),
+                                                                n_vocab=n_vocab, predict_tokens=config.PREDICT_TOKENS,
+                                                                vocab_min_count=config.VOCAB_MIN_COUNT,
+                                                                window_stride=config.WINDOW_STRIDE,
+                                                                window_sample=config.WINDOW_SAMPLE))
 
     print("Model training complete.")
+    return 0
 
 if __name__ == "__main__":
     # Run the main function using asyncio
-    asyncio.run(main())
\ No newline at end of file
+    sys.exit(asyncio.run(main(parse_args())))
\ No newline at end of file
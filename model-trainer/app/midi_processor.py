@@ -1,8 +1,95 @@
 import os
 import random
-from music21 import converter, note, chord, interval, pitch
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import music21
+from music21 import converter, note, chord
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from tensorflow.keras.utils import to_categorical
+from midi_reader import NATIVE_PARSER_VERSION, extract_notes_fast
+from dedup import duplicate_groups, minhash_signatures, normalize_key, similar_pairs
+from parse_cache import ParseCache
+from token_codec import CODE_NAMES, decode_tokens, encode_tokens, prune_codes, replace_unknown, transpose_codes, vocabulary
+
+# Identifies the token extraction logic; bump it whenever extract_notes changes
+PARSER_VERSION = f"music21-{music21.__version__}-1"
+
+def extract_notes(midi_path):
+    """
+    Extract the note and chord tokens from a single MIDI file.
+
+    Notes are encoded as their pitch name (e.g. 'C#4') and chords as the
+    dot-joined integers of their normal order (e.g. '0.4.7').
+
+    Args:
+        midi_path (str): Path to the MIDI file.
+
+    Returns:
+        list: The note and chord tokens in the order they occur.
+    """
+    midi = converter.parse(midi_path)
+    notes = []
+    for element in midi.flat.notes:
+        if isinstance(element, note.Note):
+            notes.append(str(element.pitch))
+        elif isinstance(element, chord.Chord):
+            notes.append('.'.join(str(n) for n in element.normalOrder))
+    return notes
+
+# Token extractors by name, with the parser version their cache entries are keyed by
+EXTRACTORS = {
+    'music21': (extract_notes, PARSER_VERSION),
+    'native': (extract_notes_fast, NATIVE_PARSER_VERSION)
+}
+
+# What prepare_data does with duplicate files: nothing, list them, or list and drop them
+DEDUP_MODES = ('off', 'report', 'drop')
+
+def _parse_file(midi_path, extractor='music21'):
+    """
+    Parse one MIDI file, capturing any error instead of raising it.
+
+    This is the unit of work sent to the parse worker processes, so a bad
+    file can't take down the whole pool.
+
+    Args:
+        midi_path (str): Path to the MIDI file.
+        extractor (str): Name of the token extractor in EXTRACTORS.
+
+    Returns:
+        tuple: The extracted notes (or None), the error message (or None) and the parse time in seconds.
+    """
+    start_time = time.perf_counter()
+    try:
+        return EXTRACTORS[extractor][0](midi_path), None, time.perf_counter() - start_time
+    except Exception as e:
+        return None, str(e), time.perf_counter() - start_time
+
+def windows_from_ids(ids, n_vocab, sequence_length=100, input_dtype=np.float32):
+    """
+    Cut training windows out of a sequence of vocabulary ids without copying them.
+
+    Args:
+        ids (numpy.ndarray): The vocabulary id of every note, in order.
+        n_vocab (int): The vocabulary size, which float inputs are scaled by.
+        sequence_length (int): Length of each input sequence.
+        input_dtype: dtype of the inputs; integer types keep the raw ids.
+
+    Returns:
+        tuple: Read-only network input view of shape (n_patterns, sequence_length, 1)
+        and the int32 target ids.
+    """
+    input_dtype = np.dtype(input_dtype)
+    if np.issubdtype(input_dtype, np.floating):
+        tokens = ids.astype(input_dtype) / input_dtype.type(n_vocab)
+    else:
+        tokens = ids.astype(input_dtype)
+
+    # Window i covers notes i to i + sequence_length - 1; the last note only appears as a target
+    network_input = sliding_window_view(tokens[:-1], sequence_length)[:, :, np.newaxis]
+    network_output = np.asarray(ids[sequence_length:], dtype=np.int32)
+    return network_input, network_output
 
 class MIDIProcessor:
     """
@@ -12,12 +99,127 @@ class MIDIProcessor:
     and prepare sequences for input to the neural network model.
     """
 
+    def __init__(self, workers=None, cache_dir=None, extractor='music21', num_augmentations=2,
+                 transpositions=None, seed=None, dedup='off', dedup_threshold=0.8):
+        """
+        Initialise the MIDIProcessor.
+
+        Args:
+            workers (int, optional): Number of worker processes used to parse MIDI files.
+                Defaults to the number of CPUs. Use 1 to parse serially in this process.
+            cache_dir (str, optional): Directory for the parse cache. Files whose content
+                has already been parsed are read from the cache instead. Defaults to no cache.
+            extractor (str): How tokens are extracted: 'music21' builds a full score,
+                'native' reads the MIDI events directly and is much faster.
+            num_augmentations (int): Number of randomly transposed copies added to the corpus.
+            transpositions (list, optional): Fixed transpositions in semitones to add
+                instead of random ones, for deterministic augmentation.
+            seed (int, optional): Seed for the random transpositions.
+            dedup (str): What prepare_data does with duplicate and near-duplicate
+                files: 'off' doesn't look for them, 'report' lists them and 'drop'
+                also leaves them out of the corpus.
+            dedup_threshold (float): Estimated fraction of shared token shingles
+                from which two files count as near-duplicates.
+
+        Raises:
+            ValueError: If the extractor or dedup mode is unknown.
+        """
+        if extractor not in EXTRACTORS:
+            raise ValueError(f"Unknown extractor '{extractor}', expected one of {sorted(EXTRACTORS)}")
+        if dedup not in DEDUP_MODES:
+            raise ValueError(f"Unknown dedup mode '{dedup}', expected one of {list(DEDUP_MODES)}")
+        self.workers = workers or os.cpu_count() or 1
+        self.extractor = extractor
+        self.cache = ParseCache(cache_dir, EXTRACTORS[extractor][1]) if cache_dir else None
+        self.num_augmentations = num_augmentations
+        self.transpositions = transpositions
+        self.random = random.Random(seed)
+        self.dedup = dedup
+        self.dedup_threshold = dedup_threshold
+        # Report of the duplicates prepare_data found, None until it has looked for them
+        self.duplicate_report = None
+        # Parse time in seconds of every file parse_files parsed, keyed by path (cached files aren't timed)
+        self.parse_times = {}
+        # Transpositions augment_data last applied, drawn at random unless fixed
+        self.applied_transpositions = None
+
+    def parse_files(self, midi_paths):
+        """
+        Parse MIDI files, in parallel worker processes when more than one worker is configured.
+
+        Results are returned in the same order as the input paths regardless
+        of which worker finishes first, so the extracted corpus is deterministic.
+        When a parse cache is configured, only new or changed files are parsed.
+
+        Args:
+            midi_paths (list): Paths of the MIDI files to parse.
+
+        Returns:
+            tuple: A list with the notes of each file (None for files that failed)
+            and a dict of error messages keyed by file path.
+        """
+        results = [None] * len(midi_paths)
+        errors = {}
+        total = len(midi_paths)
+
+        def record(index, result, done):
+            notes, error, elapsed = result
+            name = os.path.basename(midi_paths[index])
+            self.parse_times[midi_paths[index]] = elapsed
+            if error is not None:
+                errors[midi_paths[index]] = error
+                print(f"[{done}/{total}] Error processing {name}: {error}")
+            else:
+                results[index] = notes
+                print(f"[{done}/{total}] Processed {name}: {len(notes)} notes in {elapsed:.2f}s")
+
+        keys = {}
+        pending = list(range(total))
+        if self.cache is not None:
+            pending = []
+            for index, midi_path in enumerate(midi_paths):
+                try:
+                    keys[index] = self.cache.key(midi_path)
+                except OSError as e:
+                    # Reported like a file that fails to parse, rather than stopping the whole corpus
+                    errors[midi_path] = str(e)
+                    print(f"Error reading {os.path.basename(midi_path)}: {e}")
+                    continue
+                cached = self.cache.get(keys[index])
+                if cached is None:
+                    pending.append(index)
+                else:
+                    results[index] = cached
+            print(f"Parse cache: {total - len(pending) - len(errors)} of {total} files cached, {len(pending)} to parse")
+
+        done = total - len(pending)
+        workers = min(self.workers, len(pending))
+        if workers <= 1:
+            for index in pending:
+                done += 1
+                record(index, _parse_file(midi_paths[index], self.extractor), done)
+        else:
+            print(f"Parsing with {workers} worker processes...")
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(_parse_file, midi_paths[index], self.extractor): index for index in pending}
+                for future in as_completed(futures):
+                    done += 1
+                    record(futures[future], future.result(), done)
+
+        if self.cache is not None:
+            for index in pending:
+                if results[index] is not None:
+                    self.cache.put(keys[index], results[index])
+
+        return results, errors
+
     def prepare_data(self, midi_directory):
         """
         Process MIDI files and extract notes and chords.
 
-        This method walks through the specified directory, reads each MIDI file,
-        and extracts the notes and chords from them. It then augments the data.
+        This method reads each MIDI file in the specified directory, in sorted
+        order and across the configured worker processes, and extracts the
+        notes and chords from them. It then augments the data.
 
         Args:
             midi_directory (str): Path to the directory containing MIDI files.
@@ -35,20 +237,26 @@ class MIDIProcessor:
         if not midi_files:
             raise ValueError("No MIDI files found. Please add some MIDI files to the midi_files directory.")
 
-        notes = []
-        for file in midi_files:
-            midi_path = os.path.join(midi_directory, file)
-            print(f"Processing file: {midi_path}")
-            try:
-                midi = converter.parse(midi_path)
-                notes_to_parse = midi.flat.notes
-                for element in notes_to_parse:
-                    if isinstance(element, note.Note):
-                        notes.append(str(element.pitch))
-                    elif isinstance(element, chord.Chord):
-                        notes.append('.'.join(str(n) for n in element.normalOrder))
-            except Exception as e:
-                print(f"Error processing {file}: {str(e)}")
+        midi_paths = [os.path.join(midi_directory, f) for f in sorted(midi_files)]
+        start_time = time.perf_counter()
+        file_notes, errors = self.parse_files(midi_paths)
+        print(f"Parsed {len(midi_paths) - len(errors)} of {len(midi_paths)} files in {time.perf_counter() - start_time:.1f}s")
+        if errors:
+            print(f"{len(errors)} file(s) could not be processed:")
+            for midi_path, error in errors.items():
+                print(f"  {os.path.basename(midi_path)}: {error}")
+
+        if self.dedup != 'off':
+            start_time = time.perf_counter()
+            self.duplicate_report = self.find_duplicates(file_notes, [os.path.basename(p) for p in midi_paths],
+                                                         self.dedup_threshold)
+            print(f"Checked for duplicates in {time.perf_counter() - start_time:.2f}s")
+            if self.dedup == 'drop':
+                dropped = {entry['index'] for group in self.duplicate_report['groups'] for entry in group['duplicates']}
+                file_notes = [tokens for index, tokens in enumerate(file_notes) if index not in dropped]
+                self.duplicate_report['dropped'] = True
+
+        notes = [token for tokens in file_notes if tokens for token in tokens]
 
         print(f"Total notes extracted: {len(notes)}")
 
@@ -56,51 +264,136 @@ class MIDIProcessor:
             raise ValueError("No notes were extracted from the MIDI files. Please check if the MIDI files are valid.")
 
         # Augment the extracted notes
-        augmented_notes = self.augment_data(notes)
+        start_time = time.perf_counter()
+        augmented_notes = self.augment_data(notes, self.num_augmentations, self.transpositions)
+        print(f"Augmented in {time.perf_counter() - start_time:.2f}s")
         print(f"Total notes after augmentation: {len(augmented_notes)}")
 
         return augmented_notes
 
-    def augment_data(self, notes, num_augmentations=2):
+    def find_duplicates(self, file_notes, names, threshold=0.8, shingle_size=6):
+        """
+        Find files that are exact or near-duplicates of others in the corpus.
+
+        Every file's tokens are transposed to a common key and cut into
+        overlapping shingles of shingle_size tokens. MinHash signatures with
+        locality-sensitive hashing then find the files whose shingle sets
+        overlap by at least the threshold, in time roughly linear in the size
+        of the corpus. In each group of similar files, the one with the most
+        tokens is kept, so the other arrangements are the ones to drop.
+
+        Args:
+            file_notes (list): The notes of each file, None or empty for files without any.
+            names (list): The name of each file, for the report.
+            threshold (float): Lowest estimated Jaccard similarity of two files' shingles.
+            shingle_size (int): Number of consecutive tokens per shingle.
+
+        Returns:
+            dict: A report with the groups of duplicates, each with the kept file
+            and the duplicates' names, indices into file_notes and similarity to
+            it, and the share of the corpus's tokens the duplicates make up.
+        """
+        indices = [index for index, tokens in enumerate(file_notes) if tokens]
+        file_codes = [encode_tokens(file_notes[index]) for index in indices]
+        signatures = minhash_signatures([normalize_key(codes) for codes in file_codes], shingle_size=shingle_size)
+        pairs = similar_pairs(signatures, threshold)
+
+        groups = []
+        duplicate_tokens = 0
+        for members in duplicate_groups(len(indices), pairs):
+            kept = max(members, key=lambda member: (len(file_codes[member]), -member))
+            duplicates = []
+            for member in members:
+                if member == kept:
+                    continue
+                exact = np.array_equal(file_codes[member], file_codes[kept])
+                similarity = 1.0 if exact else float(np.mean(signatures[member] == signatures[kept]))
+                duplicates.append({'file': names[indices[member]], 'index': indices[member],
+                                   'similarity': round(similarity, 3), 'exact': exact})
+                duplicate_tokens += len(file_codes[member])
+            groups.append({'kept': names[indices[kept]], 'duplicates': duplicates})
+
+        total_tokens = sum(len(codes) for codes in file_codes)
+        report = {
+            'threshold': threshold,
+            'shingle_size': shingle_size,
+            'files': len(indices),
+            'duplicate_files': sum(len(group['duplicates']) for group in groups),
+            'duplicate_tokens': duplicate_tokens,
+            'token_fraction': round(duplicate_tokens / total_tokens, 4) if total_tokens else 0.0,
+            'dropped': False,
+            'groups': groups
+        }
+        print(f"Found {report['duplicate_files']} duplicate file(s) in {len(groups)} group(s), "
+              f"{report['token_fraction']:.1%} of the corpus's tokens")
+        for group in groups:
+            for duplicate in group['duplicates']:
+                kind = "exact copy of" if duplicate['exact'] else f"{duplicate['similarity']:.0%} similar to"
+                print(f"  {duplicate['file']}: {kind} {group['kept']}")
+        return report
+
+    def augment_data(self, notes, num_augmentations=2, transpositions=None):
         """
         Augment the extracted notes by transposing them.
 
-        This method creates additional versions of the input notes by transposing
-        them up or down by a random interval.
+        The tokens are converted to integer codes once and every copy is
+        transposed with array arithmetic: notes move by the interval and chords
+        by rotating their pitch classes, so their tokens stay in normal order.
 
         Args:
             notes (list): List of extracted notes and chords.
-            num_augmentations (int): Number of augmented versions to create.
+            num_augmentations (int): Number of randomly transposed versions to create,
+                each by up to six semitones up or down.
+            transpositions (list, optional): Transpositions in semitones to use
+                instead of random ones.
 
         Returns:
             list: Original and augmented notes.
         """
-        augmented_notes = [notes]
-        for _ in range(num_augmentations):
-            transposition = random.randint(-6, 6)  # Transpose up to a perfect fifth up or down
-            transposed_notes = []
-            for note_str in notes:
-                if '.' in note_str:  # It's a chord
-                    chord_notes = note_str.split('.')
-                    transposed_chord = []
-                    for n in chord_notes:
-                        if n.strip():  # Check if the note is not empty
-                            try:
-                                transposed_note = str(interval.Interval(transposition).transposePitch(pitch.Pitch(n)))
-                                transposed_chord.append(transposed_note)
-                            except Exception as e:
-                                print(f"Error transposing note {n}: {str(e)}")
-                    if transposed_chord:
-                        transposed_notes.append('.'.join(transposed_chord))
-                else:  # It's a single note
-                    if note_str.strip():  # Check if the note is not empty
-                        try:
-                            transposed_note = str(interval.Interval(transposition).transposePitch(pitch.Pitch(note_str)))
-                            transposed_notes.append(transposed_note)
-                        except Exception as e:
-                            print(f"Error transposing note {note_str}: {str(e)}")
-            augmented_notes.append(transposed_notes)
-        return [note for sublist in augmented_notes for note in sublist]
+        if transpositions is None:
+            transpositions = [self.random.randint(-6, 6) for _ in range(num_augmentations)]
+        self.applied_transpositions = list(transpositions)
+        codes = encode_tokens(notes)
+        augmented = [codes] + [transpose_codes(codes, semitones) for semitones in transpositions]
+        return decode_tokens(np.concatenate(augmented))
+
+    def prune_vocabulary(self, notes, min_count=2):
+        """
+        Replace rare notes and chords with their nearest frequent ones.
+
+        Rare chord voicings, and their transposed copies from augmentation,
+        each take an output of the model while barely being trained. Every
+        token that occurs fewer than min_count times is replaced, which
+        shrinks the output layer that every training and generation step
+        computes.
+
+        Args:
+            notes (list): List of notes and chords.
+            min_count (int): How often a token has to occur to keep its own id.
+
+        Returns:
+            tuple: The notes with rare tokens replaced, the remap table from
+            each replaced token to its replacement, and a coverage report.
+        """
+        codes = encode_tokens(notes)
+        remap = prune_codes(codes, min_count)
+        pruned = remap[codes]
+
+        present = np.unique(codes)
+        replaced = present[remap[present] != present]
+        remap_table = dict(zip(CODE_NAMES[replaced].tolist(), CODE_NAMES[remap[replaced]].tolist()))
+        unchanged = int(np.count_nonzero(pruned == codes))
+        report = {
+            'min_count': min_count,
+            'vocab_before': len(present),
+            'vocab_after': len(np.unique(pruned)),
+            'tokens_remapped': len(remap_table),
+            'notes': len(codes),
+            'coverage': round(unchanged / len(codes), 4)
+        }
+        print(f"Vocabulary pruned from {report['vocab_before']} to {report['vocab_after']} tokens; "
+              f"{report['coverage']:.2%} of notes keep their own token")
+        return decode_tokens(pruned), remap_table, report
 
     def prepare_sequences(self, notes, sequence_length=100):
         """
@@ -146,4 +439,51 @@ class MIDIProcessor:
         network_output = to_categorical(network_output)
         
         print(f"Sequences prepared. Input shape: {network_input.shape}, Output shape: {network_output.shape}")
-        return network_input, network_output, pitchnames, note_to_int
\ No newline at end of file
+        return network_input, network_output, pitchnames, note_to_int
+
+    def prepare_windows(self, notes, sequence_length=100, input_dtype=np.float32, pitchnames=None):
+        """
+        Prepare the same training samples as prepare_sequences without copying them.
+
+        The notes are converted to a single array of vocabulary ids, and every
+        input window is a strided view into it, so memory grows with the number
+        of notes rather than with notes x sequence length. Targets are the ids
+        of the following notes (sparse), not one-hot rows, so they need a sparse
+        categorical loss.
+
+        Args:
+            notes (list): List of musical notes and chords.
+            sequence_length (int): Length of each input sequence.
+            input_dtype: dtype of the inputs. Float types are scaled by the
+                vocabulary size as in prepare_sequences (float64 gives identical
+                values); integer types keep the raw ids.
+            pitchnames (list, optional): A trained model's vocabulary to use instead of
+                building one from the notes. Notes outside it are replaced with the
+                nearest token in it (see token_codec.replace_unknown), so no window
+                joins notes that weren't next to each other.
+
+        Returns:
+            tuple: Read-only network input view of shape (n_patterns, sequence_length, 1),
+            int32 target ids, pitch names, and note-to-integer mapping.
+
+        Raises:
+            ValueError: If the notes list is empty or no sequences could be prepared.
+        """
+        print(f"Preparing windows with {len(notes)} notes...")
+        if not notes:
+            raise ValueError("The notes list is empty. No data to process.")
+
+        codes = encode_tokens(notes)
+        if pitchnames is not None:
+            codes, replaced = replace_unknown(codes, pitchnames)
+            if replaced:
+                print(f"Replaced {replaced} notes that aren't in the vocabulary with the nearest token in it")
+        pitchnames, ids = vocabulary(codes, pitchnames)
+        note_to_int = dict((note, number) for number, note in enumerate(pitchnames))
+        if len(ids) <= sequence_length:
+            raise ValueError("No sequences could be prepared. Check if the input data is sufficient.")
+
+        network_input, network_output = windows_from_ids(ids, len(pitchnames), sequence_length, input_dtype)
+
+        print(f"Windows prepared. Input shape: {network_input.shape}, Output shape: {network_output.shape}")
+        return network_input, network_output, pitchnames, note_to_int
@@ -0,0 +1,738 @@
+import argparse
+import bisect
+import itertools
+import math
+import os
+import struct
+import time
+from collections import deque, namedtuple
+from fractions import Fraction
+
+# Identifies the token extraction logic; bump it whenever extract_notes_fast changes. It emulates
+# the MIDI import of the music21 version pinned in requirements.txt, and must be re-checked with
+# check_parity and renamed when that pin changes
+NATIVE_PARSER_VERSION = "native-music21-7.3.3-2"
+
+# Pitch class spellings music21 uses for pitches created from MIDI numbers
+PITCH_CLASS_NAMES = ['C', 'C#', 'D', 'E-', 'E', 'F', 'F#', 'G', 'G#', 'A', 'B-', 'B']
+
+# music21 quantizes MIDI onsets and durations to the nearest 16th or eighth-note triplet
+QUARTER_LENGTH_DIVISORS = (4, 3)
+
+# Channel 10 is percussion; music21 imports it as unpitched notes, which are not note tokens
+PERCUSSION_CHANNEL = 10
+
+# Meta event types music21 imports as objects of the part (track and instrument
+# names, tempos, time and key signatures); they take no time, but count as
+# contents of their measure when rests are filled
+PART_META_TYPES = (0x03, 0x04, 0x51, 0x58, 0x59)
+
+# Meta event types copied from the conductor track into every part
+CONDUCTOR_META_TYPES = (0x51, 0x58, 0x59)
+
+# Program changes are imported as instruments, like the part meta events
+PROGRAM_CHANGE = 0xC0
+
+NoteEvent = namedtuple('NoteEvent', ['on_tick', 'off_tick', 'channel', 'pitch'])
+
+# A track's (tick, is_note_on, channel, pitch) note events, the (tick, type) of
+# its other imported events, and its (tick, numerator, denominator) time signatures
+MIDITrack = namedtuple('MIDITrack', ['events', 'meta_events', 'time_signatures'])
+
+class MIDIFormatError(ValueError):
+    """Raised when a file is not a readable Standard MIDI File."""
+
+def pitch_name(midi_pitch):
+    """
+    Return the music21-compatible name of a MIDI pitch, e.g. 61 -> 'C#4'.
+
+    Args:
+        midi_pitch (int): The MIDI note number.
+
+    Returns:
+        str: The pitch name with octave.
+    """
+    return f"{PITCH_CLASS_NAMES[midi_pitch % 12]}{midi_pitch // 12 - 1}"
+
+def _packed_form(pitch_classes):
+    """
+    Return the rotation of a sorted pitch-class set packed most to the left, transposed to start on 0.
+
+    The most compact rotation has the smallest span from first to last pitch
+    class, then the smallest intervals from the first pitch class to each of
+    the others in turn (Forte's convention).
+    """
+    n = len(pitch_classes)
+    forms = []
+    for r in range(n):
+        rotation = pitch_classes[r:] + [p + 12 for p in pitch_classes[:r]]
+        form = [p - rotation[0] for p in rotation]
+        forms.append(((form[-1],) + tuple(form[1:-1]), form))
+    return min(forms)
+
+def normal_order(pitch_classes):
+    """
+    Return the normal order of a pitch-class set, as music21's Chord.normalOrder does.
+
+    music21 looks the set up in Forte's table of set classes and transposes
+    the class's prime form, or its inversion if the set is inverted, onto the
+    set, trying transpositions to each of the set's pitch classes in
+    ascending order. For sets whose most compact rotations tie, this is not
+    always the rotation starting on the lowest pitch class.
+
+    Args:
+        pitch_classes (iterable): Pitch classes (0-11), duplicates allowed.
+
+    Returns:
+        list: The pitch classes in normal order.
+    """
+    pcs = sorted(set(pitch_classes))
+    if len(pcs) <= 1:
+        return pcs
+
+    packed = _packed_form(pcs)
+    inverted = _packed_form(sorted((12 - p) % 12 for p in pcs))
+    prime = min(packed, inverted)[1]
+    # A set packed like its prime form is a transposition of it, otherwise of its inversion
+    form = prime if packed[1] == prime else [prime[-1] - p for p in reversed(prime)]
+    for transposition in pcs:
+        candidate = [(p + transposition) % 12 for p in form]
+        if set(candidate) == set(pcs):
+            return candidate
+
+# Chord tokens for every non-empty pitch-class set, indexed by its 12-bit mask
+_CHORD_TOKENS = [None] + [
+    '.'.join(str(pc) for pc in normal_order(pc for pc in range(12) if mask >> pc & 1))
+    for mask in range(1, 4096)
+]
+
+def _read_varlen(data, pos):
+    """Read a MIDI variable-length quantity, returning the value and the new position."""
+    value = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            return value, pos
+
+def read_midi_file(midi_path):
+    """
+    Read the events of a Standard MIDI File that affect its note tokens.
+
+    Args:
+        midi_path (str): Path to the MIDI file.
+
+    Returns:
+        tuple: Ticks per quarter note and a list of MIDITracks, with events in file order.
+
+    Raises:
+        MIDIFormatError: If the file is not a Standard MIDI File.
+    """
+    with open(midi_path, 'rb') as f:
+        data = f.read()
+
+    if data[:4] != b'MThd' or len(data) < 14:
+        raise MIDIFormatError(f"badly formatted midi bytes, got: {data[:20]}")
+    header_length, _, track_count, division = struct.unpack('>IHHH', data[4:14])
+    if division & 0x8000:
+        raise MIDIFormatError("SMPTE time division is not supported")
+    ticks_per_quarter = division
+
+    tracks = []
+    pos = 8 + header_length
+    while len(tracks) < track_count and pos + 8 <= len(data):
+        chunk_type = data[pos:pos + 4]
+        chunk_length = struct.unpack('>I', data[pos + 4:pos + 8])[0]
+        pos += 8
+        chunk_end = min(pos + chunk_length, len(data))
+        if chunk_type != b'MTrk':
+            pos = chunk_end
+            continue
+
+        events, meta_events, time_signatures = [], [], []
+        tick, status = 0, 0
+        try:
+            while pos < chunk_end:
+                delta, pos = _read_varlen(data, pos)
+                tick += delta
+                byte = data[pos]
+                if byte & 0x80:
+                    status = byte
+                    pos += 1
+                elif not status:
+                    raise MIDIFormatError("running status without a preceding status byte")
+
+                if status == 0xFF:
+                    meta_type = data[pos]
+                    length, pos = _read_varlen(data, pos + 1)
+                    if meta_type in PART_META_TYPES:
+                        meta_events.append((tick, meta_type))
+                    if meta_type == 0x58 and length >= 2:
+                        time_signatures.append((tick, data[pos], 2 ** data[pos + 1]))
+                    pos += length
+                    # Meta and sysex events cancel running status
+                    status = 0
+                elif status in (0xF0, 0xF7):
+                    length, pos = _read_varlen(data, pos)
+                    pos += length
+                    status = 0
+                else:
+                    kind, channel = status & 0xF0, (status & 0x0F) + 1
+                    if kind in (0xC0, 0xD0):
+                        pos += 1
+                        if kind == PROGRAM_CHANGE:
+                            meta_events.append((tick, PROGRAM_CHANGE))
+                    else:
+                        data1, data2 = data[pos], data[pos + 1]
+                        pos += 2
+                        if kind == 0x90:
+                            events.append((tick, data2 > 0, channel, data1))
+                        elif kind == 0x80:
+                            events.append((tick, False, channel, data1))
+        except IndexError:
+            # Truncated track: keep the events read so far, as music21 does
+            pass
+
+        tracks.append(MIDITrack(events, meta_events, time_signatures))
+        pos = chunk_end
+
+    return ticks_per_quarter, tracks
+
+def _pair_notes(events):
+    """
+    Match note-ons to note-offs the way music21 does.
+
+    Each note-on takes the first later note-off of the same pitch and channel
+    that an earlier note-on hasn't taken. Note-ons without one are dropped.
+    """
+    notes, awaiting_off = [], {}
+    for tick, is_note_on, channel, pitch in events:
+        if is_note_on:
+            note = [tick, None, channel, pitch]
+            notes.append(note)
+            awaiting_off.setdefault((pitch, channel), deque()).append(note)
+        elif awaiting_off.get((pitch, channel)):
+            awaiting_off[pitch, channel].popleft()[1] = tick
+    return [NoteEvent(*note) for note in notes if note[1] is not None]
+
+def _op_frac(value):
+    """
+    Normalise an offset or duration like music21's opFrac.
+
+    Floats that aren't exact binary fractions (e.g. triplet positions) become
+    Fractions, so sums and barline comparisons are exact, as they are in music21.
+    """
+    if isinstance(value, Fraction) or value.as_integer_ratio()[1] <= 65535:
+        return value
+    fraction = Fraction(value).limit_denominator(65535)
+    if fraction.denominator & (fraction.denominator - 1) == 0:
+        return float(fraction)
+    return fraction
+
+def _nearest_multiple(value, unit):
+    """Return the nearest multiple of unit and the absolute error, rounding halves down."""
+    low = unit * math.floor(value / unit)
+    if low <= value <= low + unit / 2.0:
+        return low, round(value - low, 7)
+    return unit * (math.floor(value / unit) + 1), round(unit * (math.floor(value / unit) + 1) - value, 7)
+
+def _quantize(value, divisors=QUARTER_LENGTH_DIVISORS):
+    """
+    Quantize a quarter length with the rules of music21's Stream.quantize.
+
+    Returns:
+        tuple: The nearest grid position, preferring 16ths on a tie, and the
+        divisor of the grid it is on.
+    """
+    found = []
+    for divisor in divisors:
+        match, error = _nearest_multiple(value, 1 / divisor)
+        found.append((error, 1 / divisor, match, divisor))
+    return min(found)[2:]
+
+def _group_chords(notes, ticks_per_quarter):
+    """
+    Group notes that start (and end) within a 16th of each other into chords.
+
+    Args:
+        notes (list): NoteEvents of one track, sorted by onset.
+        ticks_per_quarter (int): The file's time division.
+
+    Returns:
+        tuple: (onset_tick, duration, pitches) tuples with durations in quarter
+        lengths, where pitches is None for groups with a percussion note, and
+        whether any notes starting together had to go into separate voices.
+    """
+    tolerance = ticks_per_quarter / max(QUARTER_LENGTH_DIVISORS)
+    gathered = [False] * len(notes)
+    groups = []
+    voices_required = False
+    for i, first in enumerate(notes):
+        if gathered[i]:
+            continue
+        members = [first]
+        for j in range(i + 1, len(notes)):
+            if abs(notes[j].on_tick - first.on_tick) >= tolerance:
+                break
+            if abs(notes[j].off_tick - first.off_tick) > tolerance:
+                voices_required = True
+                continue
+            members.append(notes[j])
+            gathered[j] = True
+
+        # A chord starts with its first note but takes its length from its last.
+        # One with any percussion note becomes a PercussionChord, which yields no token.
+        percussion = any(note.channel == PERCUSSION_CHANNEL for note in members)
+        groups.append((
+            first.on_tick,
+            (members[-1].off_tick - members[-1].on_tick) / ticks_per_quarter,
+            None if percussion else [note.pitch for note in members]
+        ))
+    return groups, voices_required
+
+class _Measure:
+    """
+    A measure of a part being laid out, as music21 builds it during MIDI import.
+
+    Items are [offset, duration, token, order, is_chord] lists, with offsets
+    relative to the measure and order the sequence in which they were placed.
+    Notes that overlap are spread over voices; items placed outside the voices
+    of a measure that has them are loose. Markers are the offsets of the
+    measure's meta events, which take no time but count when rests are filled.
+    Like _Voice, a measure holds a cached extent that music21 keeps through
+    chord splits, and whether music21 considers it sorted.
+    """
+
+    __slots__ = ('offset', 'length', 'loose', 'voices', 'markers', 'cached_end', 'sorted')
+
+    def __init__(self, offset, length):
+        self.offset = offset
+        self.length = length
+        self.loose = []
+        self.voices = None
+        self.markers = []
+        self.cached_end = None
+        self.sorted = True
+
+    def end(self):
+        """Return the measure's extent, from the cache if music21 would use it."""
+        if self.cached_end is None:
+            ends = [_op_frac(item[0] + item[1]) for item in self.loose]
+            ends += [voice.end() for voice in self.voices or ()]
+            self.cached_end = max(ends + self.markers, default=0.0)
+        return self.cached_end
+
+    def add(self, item):
+        """Add a loose item, which clears the cached extent."""
+        self.sorted = self.sorted and float(item[0]) >= self.end()
+        self.loose.append(item)
+        self.cached_end = None
+
+    def add_to_voice(self, item):
+        """Add an item to the first voice, which clears the measure's cached extent too."""
+        self.voices[0].add(item)
+        self.cached_end = None
+        self.sorted = False
+
+class _Voice(list):
+    """
+    The items of one voice in a measure, with music21's cached extent.
+
+    music21 caches how far a voice extends when it is first asked and only
+    forgets it when an item is added or a single note is shortened, not when a
+    chord is. A measure can therefore keep the length of a chord it has since
+    split at the barline, which moves every following measure later.
+
+    Sorting a stream clears its cache as well, so whether music21 considers
+    the voice sorted decides if the cache survives until the voice is split.
+    """
+
+    __slots__ = ('cached_end', 'sorted')
+
+    def __init__(self, items=()):
+        super().__init__(items)
+        self.cached_end = None
+        self.sorted = _in_order(items)
+
+    def end(self):
+        """Return the voice's extent, from the cache if music21 would use it."""
+        if self.cached_end is None:
+            self.cached_end = max((_op_frac(item[0] + item[1]) for item in self), default=0.0)
+        return self.cached_end
+
+    def add(self, item):
+        """Add an item, which clears the cached extent."""
+        self.sorted = self.sorted and float(item[0]) >= self.end()
+        self.append(item)
+        self.cached_end = None
+
+def _in_order(items):
+    """
+    Return whether music21 keeps a stream sorted while items are inserted in this order.
+
+    A stream stays sorted while each item starts at or after the end of
+    everything inserted before it. music21 compares the start as a float, so
+    one at a triplet position just misses an exact end there.
+    """
+    end = 0.0
+    for item in items:
+        if float(item[0]) < end:
+            return False
+        end = max(end, _op_frac(item[0] + item[1]))
+    return True
+
+def _bar_lengths(time_signatures, ticks_per_quarter):
+    """Return a function giving the bar length in effect at an offset, using 4/4 where none is given."""
+    changes = sorted((tick / ticks_per_quarter, 4.0 * numerator / denominator)
+                     for tick, numerator, denominator in time_signatures)
+    if not changes or changes[0][0] > 0:
+        changes.insert(0, (0.0, 4.0))
+    change_offsets = [offset for offset, _ in changes]
+    return lambda offset: changes[bisect.bisect_right(change_offsets, offset) - 1][1]
+
+def _assign_voices(measure):
+    """Spread the notes of a measure over voices if any of them overlap, first fit in onset order."""
+    voices = []
+    for item in measure.loose:
+        for voice in voices:
+            if voice.end() <= item[0]:
+                break
+        else:
+            voice = _Voice()
+            voices.append(voice)
+        voice.add(item)
+    # music21 sorts the measure first, and unsorts it again by adding the voices
+    measure.sorted = len(voices) < 2
+    if len(voices) > 1:
+        measure.voices = voices
+        measure.loose = []
+        measure.cached_end = None
+
+def _fill_rests(voice, measure):
+    """Apply the cache effect of music21 filling a voice's gaps with rests, which also clears the measure's."""
+    items = sorted(voice, key=lambda item: item[0])
+    stale_end = voice.end()
+    covered = 0.0
+    for item in items:
+        if item[0] > covered:
+            break
+        covered = max(covered, _op_frac(item[0] + item[1]))
+    else:
+        if stale_end >= measure.length:
+            return
+    voice.cached_end = None
+    measure.cached_end = None
+
+def _fill_measure_rests(measure, voices):
+    """
+    Apply the cache effect of music21 filling a measure's gaps with rests.
+
+    Returns:
+        The measure's extent as music21 reads it when laying out the measures.
+    """
+    spans = [(0.0, voice.end()) for voice in voices]
+    spans += [(item[0], _op_frac(item[0] + item[1])) for item in measure.loose]
+    spans += [(marker, marker) for marker in measure.markers]
+    fresh_end = max((end for _, end in spans), default=0.0)
+    if measure.cached_end is not None:
+        covered = 0.0
+        for start, end in sorted(spans):
+            if start > covered:
+                measure.cached_end = None
+                break
+            covered = max(covered, end)
+        else:
+            if measure.cached_end < measure.length:
+                measure.cached_end = None
+    if measure.cached_end is not None:
+        return measure.cached_end
+    return max(fresh_end, measure.length)
+
+def _layout_part(elements, markers, bar_length, voices_required):
+    """
+    Place a part's notes in measures and split those that cross barlines.
+
+    This mirrors the measure, voice and tie handling of music21's MIDI import,
+    including its quirks: a continuation moving between two measures that both
+    have voices is left whole outside the voices, and each measure is finally
+    laid out after the previous one's contents, so a measure that appears
+    longer than its bar pushes the following measures later. A measure looks
+    longer when music21 cached its extent before splitting a chord in it,
+    which it does for every measure unless sorting it (or the voice holding
+    the chord) has cleared the cache again, and rests filled in afterwards
+    don't clear it.
+
+    Args:
+        elements (list): (onset, duration, pitches) tuples from _track_elements.
+        markers (list): Offsets of the part's meta events, including those
+            copied from the conductor track.
+        bar_length (callable): Gives the bar length in effect at an offset.
+        voices_required (bool): Whether the part has notes that start together
+            but end apart, which makes music21 separate overlapping notes into voices.
+
+    Returns:
+        list: (offset, is_not_grace, rank, token) tuples for the part's note
+        and chord tokens. Grace notes come first at their offset in the whole
+        score; rank orders the other pieces at the same offset within the part.
+    """
+    order = itertools.count()
+    by_position = lambda item: (item[0], item[3])
+    measures, starts = [], []
+    part_end = max(max(onset + duration for onset, duration, _ in elements), max(markers, default=0.0))
+    offset = 0.0
+    while True:
+        measures.append(_Measure(offset, bar_length(offset)))
+        starts.append(offset)
+        offset = _op_frac(offset + measures[-1].length)
+        if offset >= part_end:
+            break
+
+    for onset, duration, pitches in elements:
+        measure = measures[bisect.bisect_right(starts, onset) - 1]
+        token = _token(pitches) if pitches is not None else None
+        measure.loose.append([_op_frac(onset - measure.offset), duration, token, next(order), len(pitches or ()) > 1])
+    for marker in markers:
+        if marker < offset:
+            measure = measures[bisect.bisect_right(starts, marker) - 1]
+            measure.markers.append(_op_frac(marker - measure.offset))
+    # Measures are filled in the order of the part, meta events before notes at the same offset
+    for measure in measures:
+        measure.sorted = _in_order(sorted([(marker, 0.0, 0) for marker in measure.markers]
+                                          + [(item[0], item[1], 1) for item in measure.loose],
+                                          key=lambda entry: (entry[0], entry[2])))
+
+    if voices_required:
+        for measure in measures:
+            _assign_voices(measure)
+
+    i = 0
+    while i < len(measures):
+        measure = measures[i]
+        next_measure = measures[i + 1] if i + 1 < len(measures) else None
+        next_has_voices = next_measure is not None and next_measure.voices is not None
+        # music21 caches the extent of every measure before splitting this one's
+        # notes, except that sorting the last measure clears its cache again
+        measure.end()
+        if next_measure is None and not measure.sorted:
+            measure.cached_end = None
+        measure.sorted = True
+        for container in (measure.voices if measure.voices is not None else [measure.loose]):
+            if isinstance(container, _Voice) and not container.sorted:
+                # Sorting a voice clears its cache and the measure's
+                container.cached_end = None
+                container.sorted = True
+                measure.cached_end = None
+            for item in sorted(container, key=by_position):
+                if _op_frac(item[0] + item[1]) <= measure.length or item[0] >= measure.length:
+                    continue
+                remainder = [0.0, _op_frac(item[0] + item[1] - measure.length), item[2], next(order), item[4]]
+                item[1] = _op_frac(measure.length - item[0])
+                if not item[4]:
+                    if isinstance(container, _Voice):
+                        container.cached_end = None
+                    measure.cached_end = None
+
+                if next_measure is None:
+                    offset = _op_frac(measure.offset + measure.length)
+                    next_measure = _Measure(offset, bar_length(offset))
+                    measures.append(next_measure)
+                if next_has_voices and measure.voices is not None:
+                    # music21 looks for a voice with the same id, finds none and
+                    # leaves the continuation outside the voices, where it is never split
+                    next_measure.add(remainder)
+                elif next_has_voices:
+                    next_measure.add_to_voice(remainder)
+                elif measure.voices is not None:
+                    if next_measure.voices is None:
+                        next_measure.voices = [_Voice(sorted(next_measure.loose, key=by_position))]
+                        next_measure.loose = []
+                    next_measure.add_to_voice(remainder)
+                else:
+                    next_measure.add(remainder)
+        i += 1
+
+    pieces = []
+    offset = 0.0
+    for measure in measures:
+        voices = [voice for voice in measure.voices or () if voice]
+        if len(voices) == 1:
+            # A lone voice is merged back into the measure
+            measure.loose.extend(item[:3] + [next(order)] + item[4:] for item in sorted(voices[0], key=by_position))
+            measure.cached_end = None
+            voices = []
+
+        for voice in voices:
+            _fill_rests(voice, measure)
+        highest_time = _fill_measure_rests(measure, voices)
+        for rank, container in enumerate(voices + [measure.loose]):
+            for item_offset, duration, token, item_order, _ in container:
+                if token is not None:
+                    pieces.append((_op_frac(offset + item_offset), duration > 0, (rank, item_order), token))
+        # Each measure starts where the previous one's contents end
+        offset = _op_frac(offset + highest_time)
+    return pieces
+
+def _track_elements(track, ticks_per_quarter):
+    """
+    Quantize the notes and chords of one track the way music21 does.
+
+    Onsets snap to the nearest grid position. Durations snap too, but one
+    that would leave less than a 16th before the next element's onset snaps
+    to that onset's grid instead. Notes that take no time are grace notes,
+    which keep no duration; other durations are at least a 16th.
+
+    Args:
+        track (MIDITrack): The track to quantize.
+        ticks_per_quarter (int): The file's time division.
+
+    Returns:
+        tuple: (onset, duration, pitches) tuples in quarter lengths, in
+        onset order and including percussion groups, the offsets of the
+        track's meta events, and whether the track needs voices.
+    """
+    groups, voices_required = _group_chords(_pair_notes(track.events), ticks_per_quarter)
+    markers = [_op_frac(_quantize(tick / ticks_per_quarter)[0]) for tick, _ in track.meta_events]
+
+    elements = []
+    smallest_unit = 1 / max(QUARTER_LENGTH_DIVISORS)
+    for i, (tick, duration, pitches) in enumerate(groups):
+        onset = _op_frac(_quantize(tick / ticks_per_quarter)[0])
+        quantized, _ = _quantize(duration)
+        if i + 1 < len(groups):
+            # A duration leaving less than a 16th before the next onset is
+            # quantized again on the grid of that onset
+            next_onset, next_divisor = _quantize(groups[i + 1][0] / ticks_per_quarter)
+            if 0 < next_onset - (onset + quantized) < smallest_unit:
+                quantized, _ = _quantize(duration, (next_divisor,))
+        if not quantized and duration > 0:
+            quantized = smallest_unit
+        elements.append((onset, _op_frac(quantized), pitches))
+    return elements, markers, voices_required
+
+def _token(pitches):
+    """Return the note token (pitch name) or chord token (normal order) for a group of pitches."""
+    if len(pitches) == 1:
+        return pitch_name(pitches[0])
+    mask = 0
+    for p in pitches:
+        mask |= 1 << (p % 12)
+    return _CHORD_TOKENS[mask]
+
+def extract_notes_fast(midi_path):
+    """
+    Extract note and chord tokens by reading the MIDI file directly.
+
+    This follows music21's MIDI import closely enough to produce the same
+    tokens as converter.parse(...).flat.notes: note-ons are paired with
+    note-offs per track, simultaneous notes are grouped into chords,
+    onsets and durations are quantized to 16ths and triplet eighths, and
+    notes that cross a barline are repeated, as music21 splits them into
+    tied notes. Percussion (channel 10) is skipped. No score objects are
+    built, which makes this much faster and lighter than music21.
+
+    Args:
+        midi_path (str): Path to the MIDI file.
+
+    Returns:
+        list: The note and chord tokens in the order they occur.
+
+    Raises:
+        MIDIFormatError: If the file is not a Standard MIDI File.
+    """
+    ticks_per_quarter, tracks = read_midi_file(midi_path)
+
+    pieces = []
+    time_signatures, conductor_markers = [], []
+    for track_index, track in enumerate(tracks):
+        # Tracks without notes form the conductor part, whose time signatures,
+        # key signatures and tempos are copied into the following parts
+        if not any(is_note_on for _, is_note_on, _, _ in track.events):
+            time_signatures.extend(track.time_signatures)
+            conductor_markers.extend(_op_frac(_quantize(tick / ticks_per_quarter)[0])
+                                     for tick, meta_type in track.meta_events
+                                     if meta_type in CONDUCTOR_META_TYPES)
+            continue
+
+        elements, markers, voices_required = _track_elements(track, ticks_per_quarter)
+        if not elements:
+            continue
+        bar_length = _bar_lengths(time_signatures, ticks_per_quarter)
+        for offset, is_not_grace, rank, token in _layout_part(elements, markers + conductor_markers,
+                                                              bar_length, voices_required):
+            pieces.append((offset, is_not_grace, track_index, rank, token))
+
+    pieces.sort(key=lambda piece: piece[:4])
+    return [piece[4] for piece in pieces]
+
+def check_parity(midi_paths, reference=None):
+    """
+    Compare the native extractor's tokens with music21's for a set of files.
+
+    Args:
+        midi_paths (list): Paths of the MIDI files to compare.
+        reference (callable, optional): The reference extractor. Defaults to
+            midi_processor.extract_notes (music21).
+
+    Returns:
+        dict: Per-corpus totals: files, exactly matching files, token counts,
+        the share of reference tokens reproduced in order, and the time each
+        extractor took.
+    """
+    from difflib import SequenceMatcher
+    if reference is None:
+        from midi_processor import extract_notes as reference
+
+    totals = {'files': 0, 'exact_files': 0, 'reference_tokens': 0, 'native_tokens': 0,
+              'matched_tokens': 0, 'reference_seconds': 0.0, 'native_seconds': 0.0}
+    for midi_path in midi_paths:
+        start_time = time.perf_counter()
+        try:
+            expected = reference(midi_path)
+        except Exception as e:
+            print(f"Skipping {os.path.basename(midi_path)}: music21 could not parse it ({e})")
+            continue
+        totals['reference_seconds'] += time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        actual = extract_notes_fast(midi_path)
+        totals['native_seconds'] += time.perf_counter() - start_time
+
+        matcher = SequenceMatcher(None, expected, actual, autojunk=False)
+        matched = sum(block.size for block in matcher.get_matching_blocks())
+        totals['files'] += 1
+        totals['exact_files'] += expected == actual
+        totals['reference_tokens'] += len(expected)
+        totals['native_tokens'] += len(actual)
+        totals['matched_tokens'] += matched
+        print(f"{os.path.basename(midi_path)}: {matched}/{len(expected)} tokens match"
+              f"{' (exact)' if expected == actual else ''}")
+
+    totals['token_agreement'] = totals['matched_tokens'] / max(totals['reference_tokens'], 1)
+    totals['speedup'] = totals['reference_seconds'] / max(totals['native_seconds'], 1e-9)
+    return totals
+
+def main():
+    """
+    Run the parity check against music21 on one or more corpus directories.
+
+    Exits with a non-zero status if token agreement is below --min-agreement.
+    """
+    parser = argparse.ArgumentParser(description="Check the native MIDI extractor against music21.")
+    parser.add_argument('directories', nargs='+', help="Corpus directories containing .mid files")
+    parser.add_argument('--limit', type=int, default=None, help="Only check the first N files of each corpus")
+    parser.add_argument('--min-agreement', type=float, default=0.98,
+                        help="Minimum share of music21 tokens the native extractor must reproduce")
+    args = parser.parse_args()
+
+    failed = False
+    for directory in args.directories:
+        midi_paths = sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.endswith('.mid'))
+        totals = check_parity(midi_paths[:args.limit])
+        print(f"{directory}: {totals['exact_files']}/{totals['files']} files exact, "
+              f"token agreement {totals['token_agreement']:.4f}, speedup {totals['speedup']:.1f}x")
+        failed |= totals['token_agreement'] < args.min_agreement
+    raise SystemExit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import LSTM, Dense, Dropout
+from tensorflow.keras.layers import GRU, LSTM, Activation, Dense, Dropout, Reshape
 
 class ModelBuilder:
     """
@@ -9,7 +9,7 @@ class ModelBuilder:
     for music generation.
     """
 
-    def create_model(self, network_input, n_vocab):
+    def create_model(self, network_input, n_vocab, sparse_targets=False, units=512, dropout=0.3, predict_tokens=1):
         """
         Create and compile the LSTM neural network model.
 
@@ -19,6 +19,13 @@ class ModelBuilder:
         Args:
             network_input (numpy.ndarray): Processed input sequences.
             n_vocab (int): Size of the vocabulary (number of unique notes/chords).
+            sparse_targets (bool): Whether the targets are integer ids (from
+                MIDIProcessor.prepare_windows) rather than one-hot rows.
+            units (int): Number of units in each LSTM layer.
+            dropout (float): Dropout rate between layers.
+            predict_tokens (int): Number of following tokens to predict from each
+                window. Above 1, the output has one softmax head per token, of
+                shape (predict_tokens, n_vocab), and the targets must be sparse.
 
         Returns:
             keras.models.Sequential: Compiled Keras model.
@@ -30,28 +37,28 @@ class ModelBuilder:
 
         # First LSTM layer
         model.add(LSTM(
-            512,  # Number of LSTM units
+            units,  # Number of LSTM units
             input_shape=(network_input.shape[1], network_input.shape[2]),
             return_sequences=True  # Return full sequence
         ))
-        # This layer processes the input sequence and returns sequences of 512-dimensional vectors
+        # This layer processes the input sequence and returns sequences of units-dimensional vectors
 
         # Dropout layer for regularisation
-        model.add(Dropout(0.3))
-        # This randomly sets 30% of the inputs to 0 during training, which helps prevent overfitting
+        model.add(Dropout(dropout))
+        # This randomly sets a fraction of the inputs (30% by default) to 0 during training, which helps prevent overfitting
 
         # Second LSTM layer
         model.add(LSTM(
-            512,  # Number of LSTM units
+            units,  # Number of LSTM units
             return_sequences=True
         ))
         # This layer processes the sequences from the previous layer, creating more complex representations
 
         # Another Dropout layer
-        model.add(Dropout(0.3))
+        model.add(Dropout(dropout))
 
         # Third LSTM layer
-        model.add(LSTM(512))  # No return_sequences=True here
+        model.add(LSTM(units))  # No return_sequences=True here
        # This layer processes the sequences from the previous layer, creating more complex representations
 
         # Dense layer
@@ -59,20 +66,67 @@ class ModelBuilder:
         # This layer performs a linear transformation on the 256-dimensional input
 
         # Another Dropout layer
-        model.add(Dropout(0.3))
-
-        # Output layer
-        model.add(Dense(
-            n_vocab,
-            activation='softmax'  # Softmax activation for multi-class classification
-        ))
-        # This layer outputs probabilities for each possible note/chord in the vocabulary
+        model.add(Dropout(dropout))
+
+        if predict_tokens > 1:
+            # One head per following token, all reading the same hidden state
+            model.add(Dense(predict_tokens * n_vocab))
+            model.add(Reshape((predict_tokens, n_vocab)))
+            model.add(Activation('softmax'))
+            # Head k outputs probabilities for the note/chord k + 1 steps ahead
+        else:
+            # Output layer
+            model.add(Dense(
+                n_vocab,
+                activation='softmax'  # Softmax activation for multi-class classification
+            ))
+            # This layer outputs probabilities for each possible note/chord in the vocabulary
 
         # Compile the model
         model.compile(
-            loss='categorical_crossentropy',  # Loss function suitable for multi-class classification
+            # Loss function suitable for multi-class classification, taking ids or one-hot targets
+            loss='sparse_categorical_crossentropy' if sparse_targets else 'categorical_crossentropy',
             optimizer='adam'  # Adam optimiser for training
         )
 
         print("Model created successfully")
-        return model
\ No newline at end of file
+        return model
+
+    def create_student_model(self, network_input, n_vocab, units=256, layers=1, cell='lstm', dropout=0.2):
+        """
+        Create a small model to distil a trained model into.
+
+        The student takes the same inputs and produces the same softmax over
+        the vocabulary as create_model's, so it is a drop-in replacement, but
+        with far fewer recurrent units. Its output layer is split into a Dense
+        layer named 'logits' and the softmax, so distillation can use the logits.
+
+        Args:
+            network_input (numpy.ndarray): Processed input sequences.
+            n_vocab (int): Size of the vocabulary (number of unique notes/chords).
+            units (int): Number of units in each recurrent layer.
+            layers (int): Number of recurrent layers.
+            cell (str): 'lstm' or 'gru'.
+            dropout (float): Dropout rate after each recurrent layer.
+
+        Returns:
+            keras.models.Sequential: Compiled Keras model with sparse targets.
+
+        Raises:
+            ValueError: If the cell type is unknown.
+        """
+        cells = {'lstm': LSTM, 'gru': GRU}
+        if cell not in cells:
+            raise ValueError(f"Unknown cell '{cell}', expected one of {sorted(cells)}")
+        print(f"Creating {layers}x{units} {cell.upper()} student model with {n_vocab} vocabulary size...")
+
+        model = Sequential()
+        for i in range(layers):
+            kwargs = {'input_shape': (network_input.shape[1], network_input.shape[2])} if i == 0 else {}
+            model.add(cells[cell](units, return_sequences=i < layers - 1, **kwargs))
+            model.add(Dropout(dropout))
+        model.add(Dense(n_vocab, name='logits'))
+        model.add(Activation('softmax'))
+
+        model.compile(loss='sparse_categorical_crossentropy', optimizer='adam')
+        return model
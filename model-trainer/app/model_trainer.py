@@ -1,6 +1,8 @@
 import tensorflow as tf
 import os
-import pickle
+from checkpoints import CheckpointManager
+from data_pipeline import make_window_dataset, save_model_data, windows_per_epoch
+from telemetry import TrainingTelemetry, benchmark_input
 
 class ModelTrainer:
     """
@@ -9,16 +11,34 @@ class ModelTrainer:
     This class provides methods to train the model and save it to a file.
     """
 
-    def __init__(self, model):
+    def __init__(self, model, checkpoint_dir=None, keep_last=2, keep_best=1, telemetry_path=None,
+                 profile_steps=None, profile_dir=None, corpus=None):
         """
         Initialise the ModelTrainer.
 
         Args:
             model (keras.models.Sequential): The model to be trained.
+            checkpoint_dir (str, optional): Directory for resumable checkpoints written by
+                a CheckpointManager. Without it, the best weights are saved to
+                weights-improvement-*.hdf5 files in the working directory.
+            keep_last (int): Number of most recent checkpoints to keep.
+            keep_best (int): Number of lowest-loss checkpoints to keep.
+            telemetry_path (str, optional): JSONL file training throughput is recorded to.
+            profile_steps (tuple, optional): First and last global step to capture a
+                profiler trace of. Requires telemetry_path.
+            profile_dir (str, optional): Directory for the profiler trace.
+            corpus (dict, optional): The corpus recorded with the checkpoints, see CheckpointManager.
         """
         self.model = model
+        self.checkpoints = CheckpointManager(checkpoint_dir, keep_last, keep_best,
+                                             corpus=corpus) if checkpoint_dir else None
+        self.telemetry_path = telemetry_path
+        self.profile_steps = profile_steps
+        self.profile_dir = profile_dir
 
-    async def train(self, network_input, network_output, model_path, epochs=50, batch_size=64, pitchnames=None, note_to_int=None):
+    async def train(self, network_input, network_output, model_path, epochs=50, batch_size=64, pitchnames=None, note_to_int=None,
+                    streaming=False, shuffle_seed=None, resume=False, seed_input=None, window_stride=1,
+                    window_sample=1.0):
         """
         Train the neural network model.
 
@@ -31,39 +51,93 @@ class ModelTrainer:
             model_path (str): Path where the trained model should be saved.
             epochs (int): Number of training epochs.
             batch_size (int): Batch size for training.
+            streaming (bool): Feed the model from a tf.data pipeline that cuts windows
+                on the fly instead of converting the arrays to tensors up front. The
+                model must use a sparse categorical loss.
+            shuffle_seed (int, optional): Seed for the streaming pipeline's shuffle order.
+            resume (bool): Continue from the latest checkpoint in the checkpoint
+                directory, if there is one, instead of starting from epoch 1.
+            seed_input (numpy.ndarray, optional): Windows to save as generation seeds
+                instead of the training windows.
+            window_stride (int): Train only on the windows starting at every
+                window_stride-th note. All windows are still saved as seeds.
+            window_sample (float): Fraction of the windows to train on each
+                epoch, drawn at random every epoch. Needs streaming.
 
         Returns:
-            None
+            dict: The training history, a list of per-epoch values for each metric (e.g. 'loss').
         """
         print(f"Training model with {epochs} epochs and batch size {batch_size}...")
         
-        # Define a callback to save the model during training
-        filepath = "weights-improvement-{epoch:02d}-{loss:.4f}-bigger.hdf5"
-        checkpoint = tf.keras.callbacks.ModelCheckpoint(
-            filepath, monitor='loss', 
-            verbose=1,        
-            save_best_only=True,        
-            mode='min'
-        )    
-        callbacks_list = [checkpoint]
+        initial_epoch = 0
+        if self.checkpoints is not None:
+            # Save weights and optimizer state every epoch, in the background
+            callbacks_list = [self.checkpoints]
+            if resume:
+                initial_epoch = self.checkpoints.restore(self.model)
+        else:
+            # Define a callback to save the model during training
+            filepath = "weights-improvement-{epoch:02d}-{loss:.4f}-bigger.hdf5"
+            checkpoint = tf.keras.callbacks.ModelCheckpoint(
+                filepath, monitor='loss', 
+                verbose=1,        
+                save_best_only=True,        
+                mode='min'
+            )    
+            callbacks_list = [checkpoint]
+
+        # Models with several prediction heads are labelled with that many following notes
+        horizon = self.model.output_shape[1] if len(self.model.output_shape) == 3 else 1
+        if horizon > 1 and not streaming:
+            raise ValueError("Models that predict several tokens need streaming input")
+        if window_sample < 1.0 and not streaming:
+            raise ValueError("Sampling windows per epoch needs streaming input")
+        dataset = make_window_dataset(network_input, network_output, batch_size, seed=shuffle_seed,
+                                      horizon=horizon, stride=window_stride, sample=window_sample) if streaming else None
+        samples = windows_per_epoch(len(network_input), window_stride, window_sample)
+        if samples < len(network_input):
+            print(f"Training on {samples} of {len(network_input)} windows per epoch "
+                  f"(stride {window_stride}, sample {window_sample:g})")
+        if self.telemetry_path:
+            # Time the input pipeline alone, to tell whether training waits on it
+            input_ms = benchmark_input(dataset) if dataset is not None else None
+            callbacks_list.append(TrainingTelemetry(self.telemetry_path, samples, batch_size, input_ms,
+                                                    self.profile_steps, self.profile_dir))
 
         # Train the model
-        history = self.model.fit(
-            network_input, 
-            network_output, 
-            epochs=epochs, 
-            batch_size=batch_size, 
-            callbacks=callbacks_list
-        )
+        if streaming:
+            history = self.model.fit(dataset, epochs=epochs, callbacks=callbacks_list, initial_epoch=initial_epoch)
+        else:
+            history = self.model.fit(
+                network_input[::window_stride], 
+                network_output[::window_stride], 
+                epochs=epochs, 
+                batch_size=batch_size, 
+                callbacks=callbacks_list,
+                initial_epoch=initial_epoch
+            )
+
+        losses = history.history.get('loss')
+        print(f"Model training completed. Final loss: {losses[-1] if losses else 'n/a (no epochs left to run)'}")
+
+        self.save(model_path, network_input if seed_input is None else seed_input, pitchnames, note_to_int)
+        return history.history
 
-        print(f"Model training completed. Final loss: {history.history['loss'][-1]}")
+    def save(self, model_path, network_input, pitchnames, note_to_int):
+        """
+        Save the model and the data the API needs to generate with it.
 
+        Args:
+            model_path (str): Path where the model should be saved.
+            network_input (numpy.ndarray): Consecutive training windows, used as generation seeds.
+            pitchnames (list): The vocabulary.
+            note_to_int (dict): Mapping of notes to vocabulary ids.
+        """
         # Save the trained model
         self.model.save(model_path)
         print(f"Model saved to {model_path}")
 
-        # Save additional data to a pickle file
+        # Save the seed windows, as their token array, and the vocabulary to a pickle file
         pickle_path = f"{model_path}_data.pkl"
-        with open(pickle_path, 'wb') as f:
-            pickle.dump((network_input, pitchnames, note_to_int, len(pitchnames)), f)
+        save_model_data(pickle_path, network_input, pitchnames, note_to_int)
         print(f"Additional data saved to {pickle_path}")
\ No newline at end of file
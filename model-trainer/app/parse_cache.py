@@ -0,0 +1,94 @@
+import hashlib
+import os
+import struct
+import zlib
+
+class ParseCache:
+    """
+    An on-disk cache of the note tokens extracted from MIDI files.
+
+    Entries are keyed by the SHA-256 of the file's content together with the
+    parser version, so a file is only parsed again when its bytes change or
+    the extraction logic does. Renaming or moving a file keeps its entry.
+
+    Each entry is a small binary file: a 4-byte magic, a format version byte,
+    the token count as a little-endian uint32, then the tokens joined with
+    newlines, UTF-8 encoded and zlib-compressed.
+    """
+
+    MAGIC = b'MTOK'
+    FORMAT_VERSION = 1
+    HEADER = struct.Struct('<4sBI')
+
+    def __init__(self, cache_dir, parser_version):
+        """
+        Initialise the ParseCache.
+
+        Args:
+            cache_dir (str): Directory the cache entries are stored in. Created if missing.
+            parser_version (str): Identifies the extraction logic; changing it invalidates every entry.
+        """
+        self.cache_dir = cache_dir
+        self.parser_version = parser_version
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, midi_path):
+        """
+        Compute the cache key of a MIDI file.
+
+        Args:
+            midi_path (str): Path to the MIDI file.
+
+        Returns:
+            str: The hex digest of the parser version and file content.
+        """
+        digest = hashlib.sha256(self.parser_version.encode('utf-8') + b'\0')
+        with open(midi_path, 'rb') as f:
+            digest.update(f.read())
+        return digest.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.tok")
+
+    def get(self, key):
+        """
+        Read the cached tokens for a key.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            list: The cached tokens, or None if there is no valid entry.
+        """
+        try:
+            with open(self._entry_path(key), 'rb') as f:
+                data = f.read()
+            magic, version, count = self.HEADER.unpack_from(data)
+            if magic != self.MAGIC or version != self.FORMAT_VERSION:
+                return None
+            payload = zlib.decompress(data[self.HEADER.size:]).decode('utf-8')
+        except (OSError, struct.error, zlib.error, UnicodeDecodeError):
+            return None
+
+        tokens = payload.split('\n') if count else []
+        return tokens if len(tokens) == count else None
+
+    def put(self, key, tokens):
+        """
+        Store the tokens for a key.
+
+        The entry is written to a temporary file and renamed into place, so a
+        crashed or concurrent run never leaves a partial entry behind.
+
+        Args:
+            key (str): The cache key.
+            tokens (list): The extracted tokens.
+        """
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        payload = zlib.compress('\n'.join(tokens).encode('utf-8'), 6)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.FORMAT_VERSION, len(tokens)))
+            f.write(payload)
+        os.replace(temp_path, path)
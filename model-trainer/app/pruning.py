@@ -0,0 +1,379 @@
+import argparse
+import json
+import os
+import shutil
+import time
+import numpy as np
+import tensorflow as tf
+from data_pipeline import load_model_data, make_window_dataset
+from distillation import step_latency_ms
+from quantization import window_targets
+
+# Number of gates whose weights sit side by side in an LSTM kernel (input, forget, cell, output)
+LSTM_GATES = 4
+
+def _hidden_layers(model):
+    """Return the layers whose units can be removed: every LSTM and every Dense layer but the output."""
+    dense_layers = [layer for layer in model.layers if isinstance(layer, tf.keras.layers.Dense)]
+    hidden = []
+    for layer in model.layers:
+        if isinstance(layer, tf.keras.layers.LSTM) or (isinstance(layer, tf.keras.layers.Dense) and
+                                                       layer is not dense_layers[-1]):
+            hidden.append(layer)
+        elif layer.get_weights() and not isinstance(layer, tf.keras.layers.Dense):
+            raise ValueError(f"Can't prune units of {type(layer).__name__} layers")
+    return hidden
+
+def _unit_scores(model):
+    """
+    Score every hidden unit by the size of its outgoing weights.
+
+    A unit whose weights into the next layer, and for an LSTM into its own
+    gates at the next step, are small contributes little to the output.
+
+    Returns:
+        dict: An array of scores per hidden layer, keyed by layer name.
+    """
+    weighted = [layer for layer in model.layers if layer.get_weights()]
+    scores = {}
+    for layer in _hidden_layers(model):
+        next_kernel = weighted[weighted.index(layer) + 1].get_weights()[0]
+        outgoing = np.sum(next_kernel ** 2, axis=1)
+        if isinstance(layer, tf.keras.layers.LSTM):
+            outgoing = outgoing + np.sum(layer.get_weights()[1] ** 2, axis=1)
+        scores[layer.name] = np.sqrt(outgoing)
+    return scores
+
+def prune_units(model, sparsity, learning_rate=0.0001):
+    """
+    Rebuild a model with the weakest hidden units removed.
+
+    The same share of units is removed from every LSTM and hidden Dense
+    layer, along with their rows and columns in the neighbouring layers,
+    so the result is an ordinary, smaller dense model: a 512-unit LSTM
+    pruned by half runs its recurrence on a quarter of the weights.
+
+    Args:
+        model (keras.Sequential): The trained model.
+        sparsity (float): Share of hidden units to remove, between 0 and 1.
+        learning_rate (float): Learning rate of the fresh Adam optimizer.
+
+    Returns:
+        keras.Sequential: The smaller model, compiled for sparse targets.
+    """
+    scores = _unit_scores(model)
+    keep = {name: np.sort(np.argsort(-score)[:max(1, int(round(len(score) * (1 - sparsity))))])
+            for name, score in scores.items()}
+
+    config = model.get_config()
+    for layer_config in config['layers']:
+        if layer_config['config']['name'] in keep:
+            layer_config['config']['units'] = len(keep[layer_config['config']['name']])
+    pruned = tf.keras.Sequential.from_config(config)
+
+    inputs = None  # Indices of the previous layer's units that were kept; None keeps every input
+    for old_layer, new_layer in zip(model.layers, pruned.layers):
+        weights = old_layer.get_weights()
+        if not weights:
+            continue
+        units = keep.get(old_layer.name)
+        if isinstance(old_layer, tf.keras.layers.LSTM):
+            width = weights[1].shape[0]
+            columns = np.concatenate([gate * width + units for gate in range(LSTM_GATES)])
+            kernel = weights[0] if inputs is None else weights[0][inputs]
+            new_layer.set_weights([kernel[:, columns], weights[1][units][:, columns], weights[2][columns]])
+        else:
+            kernel = weights[0] if inputs is None else weights[0][inputs]
+            if units is None:
+                new_layer.set_weights([kernel, weights[1]])
+            else:
+                new_layer.set_weights([kernel[:, units], weights[1][units]])
+        inputs = units
+
+    pruned.compile(loss='sparse_categorical_crossentropy', optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate))
+    return pruned
+
+def _prunable_kernels(model):
+    """Return the kernels magnitude pruning applies to: every LSTM and Dense kernel with more than one row."""
+    kernels = []
+    for layer in model.layers:
+        if isinstance(layer, (tf.keras.layers.LSTM, tf.keras.layers.Dense)):
+            kernels += [w for w in layer.trainable_weights if 'kernel' in w.name and w.shape[0] > 1]
+    return kernels
+
+class MagnitudePruning(tf.keras.callbacks.Callback):
+    """
+    A Keras callback that gradually zeroes the smallest weights of a model.
+
+    The share of zeroed weights in every kernel rises each epoch along a
+    cubic schedule, fast at first and levelling off at the target, so the
+    model has time to recover while training. Masks are reapplied after
+    every batch, so pruned weights stay zero.
+    """
+
+    def __init__(self, target_sparsity, epochs):
+        """
+        Initialise the MagnitudePruning.
+
+        Args:
+            target_sparsity (float): Share of weights zeroed at the end, between 0 and 1.
+            epochs (int): Number of epochs the schedule runs over.
+        """
+        super().__init__()
+        self.target_sparsity = target_sparsity
+        self.epochs = epochs
+        self._masks = []
+
+    def sparsity_at(self, epoch):
+        """Return the scheduled sparsity at the end of an epoch (0-based)."""
+        progress = min((epoch + 1) / self.epochs, 1.0)
+        return self.target_sparsity * (1 - (1 - progress) ** 3)
+
+    def _update_masks(self, sparsity):
+        self._masks = []
+        for kernel in _prunable_kernels(self.model):
+            values = np.abs(kernel.numpy())
+            threshold = np.quantile(values, sparsity)
+            self._masks.append((kernel, tf.constant(values > threshold, dtype=kernel.dtype)))
+        self._apply_masks()
+
+    def _apply_masks(self):
+        for kernel, mask in self._masks:
+            kernel.assign(kernel * mask)
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._update_masks(self.sparsity_at(epoch))
+
+    def on_train_batch_end(self, batch, logs=None):
+        self._apply_masks()
+
+    def on_train_end(self, logs=None):
+        self._update_masks(self.target_sparsity)
+
+def weight_sparsity(model):
+    """Return the share of zero weights in the kernels magnitude pruning applies to."""
+    kernels = [kernel.numpy() for kernel in _prunable_kernels(model)]
+    return float(sum(np.count_nonzero(k == 0) for k in kernels) / sum(k.size for k in kernels))
+
+def export_sparse(model, path):
+    """
+    Write a model's weights in the sparse format the API's LSTM runtime runs.
+
+    Every kernel is stored transposed, as the data, indices and indptr of a
+    CSR matrix, so a generation step multiplies each one with a sparse
+    matrix-vector product. Biases are stored dense. The layer list, with
+    activations, is stored as JSON under 'layers'.
+
+    Args:
+        model (keras.Sequential): A model of LSTM, Dropout and Dense layers.
+        path (str): The .npz file to write, <model_id>.sparse.npz next to the model.
+    """
+    arrays, layers = {}, []
+    for layer in model.layers:
+        weights = layer.get_weights()
+        if not weights:
+            continue
+        config = layer.get_config()
+        if isinstance(layer, tf.keras.layers.LSTM):
+            entry = {'type': 'LSTM', 'activation': config['activation'],
+                     'recurrent_activation': config['recurrent_activation']}
+            matrices = {'kernel': weights[0], 'recurrent_kernel': weights[1]}
+        elif isinstance(layer, tf.keras.layers.Dense):
+            entry = {'type': 'Dense', 'activation': config['activation']}
+            matrices = {'kernel': weights[0]}
+        else:
+            raise ValueError(f"Can't export {type(layer).__name__} layers")
+
+        prefix = f"layer{len(layers)}"
+        for name, matrix in matrices.items():
+            transposed = np.ascontiguousarray(matrix.T)
+            rows, columns = np.nonzero(transposed)
+            arrays[f"{prefix}_{name}_data"] = transposed[rows, columns].astype(np.float32)
+            arrays[f"{prefix}_{name}_indices"] = columns.astype(np.int32)
+            arrays[f"{prefix}_{name}_indptr"] = np.concatenate(
+                [[0], np.cumsum(np.bincount(rows, minlength=transposed.shape[0]))]).astype(np.int32)
+            arrays[f"{prefix}_{name}_shape"] = np.array(transposed.shape, dtype=np.int32)
+        arrays[f"{prefix}_bias"] = weights[-1].astype(np.float32)
+        layers.append(entry)
+
+    arrays['layers'] = np.array(json.dumps(layers))
+    with open(path, 'wb') as f:
+        np.savez(f, **arrays)
+    print(f"Sparse weights saved to {path}")
+
+def matmul_step_ms(model, sparse, runs=200):
+    """
+    Time the matrix products of one generation step, as the API's NumPy runtime runs them.
+
+    Args:
+        model (keras.Sequential): The model.
+        sparse (bool): Multiply with CSR matrices instead of dense arrays.
+        runs (int): Number of timed steps.
+
+    Returns:
+        float: The median milliseconds per step.
+    """
+    from scipy.sparse import csr_matrix
+
+    matrices = [np.ascontiguousarray(kernel.numpy().T) for kernel in _prunable_kernels(model)]
+    if sparse:
+        matrices = [csr_matrix(matrix) for matrix in matrices]
+    vectors = [np.ones((matrix.shape[1], 1), dtype=np.float32) for matrix in matrices]
+    timings = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        for matrix, vector in zip(matrices, vectors):
+            matrix @ vector
+        timings.append((time.perf_counter() - start_time) * 1000)
+    return float(np.median(timings))
+
+def evaluate(model, base_model, network_input, targets, batch_size=256):
+    """
+    Measure a pruned model's loss and accuracy, and how often it agrees with the unpruned model.
+
+    Returns:
+        dict: Validation loss, next-note accuracy and top-1 agreement with the base model.
+    """
+    windows = np.asarray(network_input, dtype=np.float32)
+    probs = model.predict(windows, batch_size=batch_size, verbose=0)
+    base_probs = base_model.predict(windows, batch_size=batch_size, verbose=0)
+    loss = -np.mean(np.log(probs[np.arange(len(targets)), targets] + 1e-8))
+    return {
+        'val_loss': round(float(loss), 4),
+        'accuracy': round(float(np.mean(probs.argmax(axis=1) == targets)), 4),
+        'top1_agreement': round(float(np.mean(probs.argmax(axis=1) == base_probs.argmax(axis=1))), 4)
+    }
+
+def prune_model(model, network_input, targets, sparsity, structure='units', epochs=2, batch_size=64,
+                learning_rate=0.0001, shuffle_seed=None):
+    """
+    Prune a trained model to a target sparsity and fine-tune it to recover.
+
+    Args:
+        model (keras.Sequential): The trained model; it isn't modified.
+        network_input (numpy.ndarray): Training windows.
+        targets (numpy.ndarray): Their target ids.
+        sparsity (float): Share of hidden units ('units') or of weights ('weights') to remove.
+        structure (str): 'units' removes whole hidden units, giving a smaller dense model;
+            'weights' zeroes individual weights, for the API's sparse runtime.
+        epochs (int): Fine-tuning epochs.
+        batch_size (int): Batch size for fine-tuning.
+        learning_rate (float): Learning rate for fine-tuning.
+        shuffle_seed (int, optional): Seed for the shuffle order.
+
+    Returns:
+        keras.Sequential: The pruned, fine-tuned model.
+
+    Raises:
+        ValueError: If the structure is unknown.
+    """
+    if structure == 'units':
+        pruned = prune_units(model, sparsity, learning_rate)
+        callbacks = []
+    elif structure == 'weights':
+        pruned = tf.keras.Sequential.from_config(model.get_config())
+        pruned.set_weights(model.get_weights())
+        pruned.compile(loss='sparse_categorical_crossentropy',
+                       optimizer=tf.keras.optimizers.Adam(learning_rate=learning_rate))
+        callbacks = [MagnitudePruning(sparsity, epochs)]
+    else:
+        raise ValueError(f"Unknown pruning structure '{structure}', expected 'units' or 'weights'")
+
+    print(f"Pruning {structure} to {sparsity:.0%} sparsity and fine-tuning for {epochs} epochs...")
+    if epochs:
+        pruned.fit(make_window_dataset(network_input, targets, batch_size, seed=shuffle_seed),
+                   epochs=epochs, callbacks=callbacks)
+    elif callbacks:
+        callbacks[0].set_model(pruned)
+        callbacks[0].on_train_end()
+    return pruned
+
+def pruning_report(model_path, sparsities, structure='units', epochs=2, batch_size=64, learning_rate=0.0001,
+                   validation_split=0.1, shuffle_seed=None):
+    """
+    Prune a trained model at several sparsity levels and compare them.
+
+    Each pruned model is saved next to the original as
+    <name>_<structure>_pruned<percent>.h5 with a copy of its _data.pkl, so
+    the API serves it like any other model. Weight-pruned models also get a
+    <model_id>.sparse.npz for the API's sparse runtime. The comparison is
+    saved as <model>_pruning_<structure>.json.
+
+    Args:
+        model_path (str): Path of the trained model's .h5 file, next to its _data.pkl.
+        sparsities (list): Sparsity levels to try, between 0 and 1.
+        structure (str): 'units' or 'weights', see prune_model.
+        epochs (int): Fine-tuning epochs per level.
+        batch_size (int): Batch size for fine-tuning.
+        learning_rate (float): Learning rate for fine-tuning.
+        validation_split (float): Share of windows, at the end, held out for the comparison.
+        shuffle_seed (int, optional): Seed for the shuffle order.
+
+    Returns:
+        list: One dict of metrics per level, starting with the unpruned model.
+    """
+    model = tf.keras.models.load_model(model_path, compile=False)
+    network_input, _, _, n_vocab = load_model_data(f"{model_path}_data.pkl")
+    network_input, targets = window_targets(network_input, n_vocab)
+    split = int(len(network_input) * (1 - validation_split))
+
+    def measure(candidate, sparsity):
+        metrics = {'sparsity': sparsity, 'structure': structure, 'params': int(candidate.count_params()),
+                   'weight_sparsity': round(weight_sparsity(candidate), 4)}
+        metrics.update(evaluate(candidate, model, network_input[split:], targets[split:]))
+        metrics['step_ms'] = round(step_latency_ms(candidate, network_input[split:]), 3)
+        metrics['matmul_ms'] = round(matmul_step_ms(candidate, sparse=False), 3)
+        metrics['sparse_matmul_ms'] = round(matmul_step_ms(candidate, sparse=True), 3)
+        return metrics
+
+    report = [measure(model, 0.0)]
+    base_name = os.path.splitext(model_path)[0]
+    for sparsity in sparsities:
+        pruned = prune_model(model, network_input[:split], targets[:split], sparsity, structure, epochs, batch_size,
+                             learning_rate, shuffle_seed)
+        pruned_path = f"{base_name}_{structure}_pruned{int(round(sparsity * 100))}.h5"
+        pruned.save(pruned_path)
+        shutil.copyfile(f"{model_path}_data.pkl", f"{pruned_path}_data.pkl")
+        if structure == 'weights':
+            export_sparse(pruned, f"{os.path.splitext(pruned_path)[0]}.sparse.npz")
+        metrics = measure(pruned, sparsity)
+        metrics['file'] = os.path.basename(pruned_path)
+        report.append(metrics)
+
+    report_path = f"{model_path}_pruning_{structure}.json"
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Pruning report saved to {report_path}")
+    return report
+
+def print_report(report):
+    """Print a pruning report as a table of quality and latency against sparsity."""
+    print(f"{'sparsity':>8} {'params':>10} {'zeros':>6} {'val_loss':>8} {'accuracy':>8} {'agree':>6} "
+          f"{'step_ms':>8} {'dense_mm':>8} {'sparse_mm':>9}")
+    for r in report:
+        print(f"{r['sparsity']:>8.0%} {r['params']:>10} {r['weight_sparsity']:>6.0%} {r['val_loss']:>8.4f} "
+              f"{r['accuracy']:>8.2%} {r['top1_agreement']:>6.0%} {r['step_ms']:>8.2f} {r['matmul_ms']:>8.3f} "
+              f"{r['sparse_matmul_ms']:>9.3f}")
+
+def main(argv=None):
+    """
+    Prune a trained model from the command line.
+
+    Example:
+        python pruning.py /app/model/melody_generator_lstm_v2.h5 --sparsity 0.25 0.5 0.75 --structure units
+    """
+    parser = argparse.ArgumentParser(description="Prune a trained model and report latency and quality by sparsity.")
+    parser.add_argument('model', help="Path of the trained model's .h5 file, next to its _data.pkl")
+    parser.add_argument('--sparsity', type=float, nargs='+', default=[0.5], help="Sparsity levels to try (default: 0.5)")
+    parser.add_argument('--structure', choices=['units', 'weights'], default='units',
+                        help="Remove whole hidden units (smaller dense model) or individual weights (sparse export)")
+    parser.add_argument('--epochs', type=int, default=2, help="Fine-tuning epochs per level")
+    parser.add_argument('--batch-size', type=int, default=64, help="Batch size for fine-tuning")
+    parser.add_argument('--learning-rate', type=float, default=0.0001, help="Learning rate for fine-tuning")
+    args = parser.parse_args(argv)
+
+    report = pruning_report(args.model, args.sparsity, args.structure, args.epochs, args.batch_size, args.learning_rate)
+    print_report(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+import tensorflow as tf
+from data_pipeline import load_model_data
+
+# Precisions a model can be exported at, with the file suffix the API looks for
+PRECISIONS = ('int8', 'float16', 'float32')
+
+def tflite_path(model_path, precision):
+    """Return where the TFLite export of a model at a precision is written, e.g. model.int8.tflite."""
+    return f"{os.path.splitext(model_path)[0]}.{precision}.tflite"
+
+def inference_model(model):
+    """
+    Rebuild a trained model for conversion, with its recurrent layers unrolled.
+
+    The converter fuses a looped LSTM into a single kernel that only accepts
+    weights of one type, but the first layer's input kernel is too small to
+    be quantized, so int8 conversion fails. Unrolled, every gate is a plain
+    fully connected op that is quantized on its own, and float32 results
+    also match Keras more closely.
+
+    Args:
+        model (keras.Sequential): The trained model.
+
+    Returns:
+        keras.Sequential: The same model with unroll=True on every recurrent layer.
+    """
+    config = model.get_config()
+    for layer in config['layers']:
+        if layer['class_name'] in ('LSTM', 'GRU', 'SimpleRNN'):
+            layer['config']['unroll'] = True
+    unrolled = tf.keras.Sequential.from_config(config)
+    unrolled.set_weights(model.get_weights())
+    return unrolled
+
+def convert(model, precision='int8'):
+    """
+    Convert a model to a TFLite flatbuffer for single-window generation.
+
+    int8 stores weights as 8-bit integers with a scale per output channel
+    (dynamic range quantization); activations stay float and matrix
+    products run on int8 kernels. float16 halves the weights but computes
+    in float32. The batch size is fixed at 1, the shape generation uses.
+
+    Args:
+        model (keras.Sequential): The trained model.
+        precision (str): One of PRECISIONS.
+
+    Returns:
+        bytes: The TFLite model.
+
+    Raises:
+        ValueError: If the precision is unknown.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision}; expected one of {', '.join(PRECISIONS)}")
+
+    unrolled = inference_model(model)
+    run_model = tf.function(lambda inputs: unrolled(inputs, training=False))
+    concrete_function = run_model.get_concrete_function(
+        tf.TensorSpec((1,) + tuple(unrolled.input_shape[1:]), tf.float32))
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete_function], unrolled)
+    if precision != 'float32':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if precision == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    return converter.convert()
+
+def _predict_tflite(model_content, windows):
+    """Run a TFLite model on windows one at a time; return the probabilities and median ms per window."""
+    interpreter = tf.lite.Interpreter(model_content=model_content, num_threads=1)
+    interpreter.allocate_tensors()
+    input_index = interpreter.get_input_details()[0]['index']
+    output_index = interpreter.get_output_details()[0]['index']
+    probabilities, timings = [], []
+    for window in windows:
+        start_time = time.perf_counter()
+        interpreter.set_tensor(input_index, window[np.newaxis])
+        interpreter.invoke()
+        probabilities.append(interpreter.get_tensor(output_index)[0].copy())
+        timings.append((time.perf_counter() - start_time) * 1000)
+    return np.array(probabilities), float(np.median(timings))
+
+def _predict_keras(model, windows):
+    """Run a Keras model on windows one at a time, as generation does; return the probabilities and median ms."""
+    probabilities, timings = [], []
+    for window in windows:
+        start_time = time.perf_counter()
+        probabilities.append(model(window[np.newaxis], training=False).numpy()[0])
+        timings.append((time.perf_counter() - start_time) * 1000)
+    return np.array(probabilities), float(np.median(timings))
+
+def compare_quantized(model, model_content, network_input, targets=None, samples=256, seed=0):
+    """
+    Measure how far a quantized model's predictions drift from the float model.
+
+    Args:
+        model (keras.Model): The trained float model.
+        model_content (bytes): Its TFLite export from convert.
+        network_input (numpy.ndarray): Windows to compare the predictions on.
+        targets (numpy.ndarray, optional): Next-note ids of the windows, to report accuracy as well.
+        samples (int): Number of windows, drawn at random.
+        seed (int): Seed for drawing the windows.
+
+    Returns:
+        dict: Top-1 agreement with the float model, mean KL divergence and
+        largest probability difference from it (over every prediction head),
+        next-note accuracy of both models if targets are given, and per-step
+        latency of both.
+    """
+    rng = np.random.default_rng(seed)
+    indices = np.sort(rng.choice(len(network_input), min(samples, len(network_input)), replace=False))
+    windows = np.asarray(network_input[indices], dtype=np.float32)
+    float_probs, float_ms = _predict_keras(model, windows)
+    quantized_probs, quantized_ms = _predict_tflite(model_content, windows)
+
+    # Models that predict several tokens have one distribution per head, of shape (heads, n_vocab);
+    # every head's distribution is compared, and accuracy is that of the first head, the next note
+    n_vocab = float_probs.shape[-1]
+    float_probs = float_probs.reshape(len(windows), -1, n_vocab)
+    quantized_probs = quantized_probs.reshape(len(windows), -1, n_vocab)
+
+    kl = np.sum(float_probs * (np.log(float_probs + 1e-8) - np.log(quantized_probs + 1e-8)), axis=-1)
+    metrics = {
+        'samples': len(indices),
+        'top1_agreement': round(float(np.mean(quantized_probs.argmax(axis=-1) == float_probs.argmax(axis=-1))), 4),
+        'kl_divergence': round(float(np.mean(kl)), 6),
+        'max_prob_diff': round(float(np.abs(quantized_probs - float_probs).max()), 6)
+    }
+    if targets is not None:
+        targets = np.asarray(targets)[indices]
+        metrics['float_accuracy'] = round(float(np.mean(float_probs[:, 0].argmax(axis=-1) == targets)), 4)
+        metrics['quantized_accuracy'] = round(float(np.mean(quantized_probs[:, 0].argmax(axis=-1) == targets)), 4)
+        metrics['accuracy_delta'] = round(metrics['quantized_accuracy'] - metrics['float_accuracy'], 4)
+    metrics.update({
+        'float_step_ms': round(float_ms, 3),
+        'quantized_step_ms': round(quantized_ms, 3),
+        'speedup': round(float_ms / quantized_ms, 2)
+    })
+    return metrics
+
+def quantize_model(model, model_path, precisions=('int8',), network_input=None, targets=None):
+    """
+    Export a trained model at each precision and report the accuracy cost.
+
+    Each export is written next to the .h5 as <name>.<precision>.tflite,
+    where the API picks it up. The report, saved as <model>_quantization.json,
+    has the size of every export relative to the float32 weights and, if
+    windows are given, how closely each follows the float model.
+
+    Args:
+        model (keras.Model): The trained model.
+        model_path (str): Path of the model's .h5 file.
+        precisions (list): Precisions to export, from PRECISIONS.
+        network_input (numpy.ndarray, optional): Windows to compare the predictions on.
+        targets (numpy.ndarray, optional): Target ids of the windows.
+
+    Returns:
+        dict: The report, keyed by precision.
+    """
+    # The .h5 also holds the optimizer state, so sizes are compared with the float32 weights
+    float_size = model.count_params() * 4
+    report = {}
+    for precision in precisions:
+        print(f"Exporting {precision} model...")
+        model_content = convert(model, precision)
+        path = tflite_path(model_path, precision)
+        with open(path, 'wb') as f:
+            f.write(model_content)
+        entry = {'file': os.path.basename(path), 'size_mb': round(len(model_content) / 2 ** 20, 2),
+                 'size_ratio': round(len(model_content) / float_size, 3)}
+        if network_input is not None:
+            entry.update(compare_quantized(model, model_content, network_input, targets))
+            print(f"{precision}: {entry['size_mb']} MB, agrees with the float model on "
+                  f"{entry['top1_agreement']:.1%} of next notes, {entry['speedup']}x faster per step")
+        report[precision] = entry
+
+    report_path = f"{model_path}_quantization.json"
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Quantization report saved to {report_path}")
+    return report
+
+def window_targets(network_input, n_vocab):
+    """
+    Recover the target ids of saved training windows.
+
+    The target of each window is the last note of the next one, so the last
+    window has none and is left out.
+
+    Args:
+        network_input (numpy.ndarray): Windows from a model's _data.pkl.
+        n_vocab (int): The vocabulary size the windows were scaled by.
+
+    Returns:
+        tuple: The windows that have a target, and their target ids.
+    """
+    last_notes = np.asarray(network_input[1:, -1, 0])
+    if np.issubdtype(last_notes.dtype, np.floating):
+        last_notes = np.rint(last_notes * n_vocab)
+    return network_input[:-1], last_notes.astype(np.int32)
+
+def main(argv=None):
+    """
+    Quantize a trained model from the command line.
+
+    Example:
+        python quantization.py /app/model/melody_generator_lstm_v2.h5 --precision int8 float16
+    """
+    parser = argparse.ArgumentParser(description="Export a trained model as quantized TFLite models.")
+    parser.add_argument('model', help="Path of the trained model's .h5 file, next to its _data.pkl")
+    parser.add_argument('--precision', nargs='+', choices=PRECISIONS, default=['int8'],
+                        help="Precisions to export (default: int8)")
+    args = parser.parse_args(argv)
+
+    model = tf.keras.models.load_model(args.model, compile=False)
+    network_input, _, _, n_vocab = load_model_data(f"{args.model}_data.pkl")
+    network_input, targets = window_targets(network_input, n_vocab)
+    quantize_model(model, args.model, args.precision, network_input, targets)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+import argparse
+import itertools
+import json
+import os
+import queue
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import tensorflow as tf
+from config import load_config
+from data_pipeline import make_window_dataset
+from distillation import step_latency_ms
+from jobs import core_budgets, run_pinned
+from midi_processor import MIDIProcessor, windows_from_ids
+from model_builder import ModelBuilder
+from token_codec import encode_tokens, vocabulary
+from utils import configure_threads, set_cpu_affinity
+
+# Settings a search space may vary; everything else comes from the configuration
+SEARCH_SETTINGS = ('SEQUENCE_LENGTH', 'BATCH_SIZE', 'LSTM_UNITS', 'DROPOUT', 'WINDOW_STRIDE', 'WINDOW_SAMPLE')
+
+# Share of the token sequence, at its end, held out to compare trials on
+VALIDATION_SPLIT = 0.1
+
+def expand_space(space, max_trials=None, seed=None):
+    """
+    List the trials of a search space.
+
+    Args:
+        space (dict): Values to try for each of SEARCH_SETTINGS, e.g. {"LSTM_UNITS": [256, 512]}.
+        max_trials (int, optional): Draw this many combinations at random instead of trying all of them.
+        seed (int, optional): Seed for drawing the combinations.
+
+    Returns:
+        list: One dict of settings per trial.
+
+    Raises:
+        ValueError: If the space has a setting that can't be searched.
+    """
+    unknown = set(space) - set(SEARCH_SETTINGS)
+    if unknown:
+        raise ValueError(f"Can't search {', '.join(sorted(unknown))}; expected {', '.join(SEARCH_SETTINGS)}")
+    names = sorted(space)
+    trials = [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+    if max_trials and max_trials < len(trials):
+        trials = random.Random(seed).sample(trials, max_trials)
+    return trials
+
+def prepare_tokens(corpus, sweep_dir, config):
+    """
+    Parse a corpus once into the token ids every trial trains on.
+
+    The ids are saved as tokens.npy, which each trial memory-maps, and the
+    vocabulary as vocab.json. Tokenising is the same as for a training run,
+    including deduplication, augmentation and vocabulary pruning.
+
+    Returns:
+        str: The path of tokens.npy.
+    """
+    midi_processor = MIDIProcessor(workers=config.PARSE_WORKERS, cache_dir=config.PARSE_CACHE_DIR,
+                                   extractor=config.MIDI_EXTRACTOR, num_augmentations=config.NUM_AUGMENTATIONS,
+                                   transpositions=config.AUGMENT_TRANSPOSITIONS, seed=config.AUGMENT_SEED,
+                                   dedup=config.DEDUP_MODE, dedup_threshold=config.DEDUP_THRESHOLD)
+    notes = midi_processor.prepare_data(corpus)
+    if config.VOCAB_MIN_COUNT and config.VOCAB_MIN_COUNT > 1:
+        notes, _, _ = midi_processor.prune_vocabulary(notes, config.VOCAB_MIN_COUNT)
+    pitchnames, ids = vocabulary(encode_tokens(notes))
+
+    tokens_path = os.path.join(sweep_dir, 'tokens.npy')
+    np.save(tokens_path, ids)
+    with open(os.path.join(sweep_dir, 'vocab.json'), 'w') as f:
+        json.dump(pitchnames, f)
+    print(f"Saved {len(ids)} tokens with a vocabulary of {len(pitchnames)} to {tokens_path}")
+    return tokens_path
+
+def validation_start(n_tokens):
+    """Return the index of the first token held out for validation."""
+    return int(n_tokens * (1 - VALIDATION_SPLIT))
+
+def longest_sequence(n_tokens):
+    """Return the longest SEQUENCE_LENGTH that leaves at least one validation window in a corpus of n_tokens."""
+    return n_tokens - validation_start(n_tokens) - 1
+
+def _read_history(path):
+    """Read a trial's per-epoch records, skipping a line that is still being written."""
+    records = []
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    pass
+    except OSError:
+        pass
+    return records
+
+class MedianPruner(tf.keras.callbacks.Callback):
+    """
+    A Keras callback that stops a trial doing worse than its peers.
+
+    After every epoch the trial's losses are appended to its own history
+    file. From min_epochs on, the validation loss is compared with those of
+    the other trials at the same epoch, read from their history files, and
+    the trial stops if it is worse than their median. Trials running at the
+    same time prune each other as they go, without any coordination beyond
+    the shared directory.
+    """
+
+    def __init__(self, trials_dir, trial_id, min_epochs=2, min_peers=2):
+        """
+        Initialise the MedianPruner.
+
+        Args:
+            trials_dir (str): Directory holding every trial's <trial_id>.jsonl history.
+            trial_id (str): This trial's ID.
+            min_epochs (int): Epochs every trial runs before it can be pruned.
+            min_peers (int): Other trials that must have reached an epoch to compare against.
+        """
+        super().__init__()
+        self.trials_dir = trials_dir
+        self.trial_id = trial_id
+        self.min_epochs = min_epochs
+        self.min_peers = min_peers
+        self.pruned_at = None
+        self.epoch_seconds = []
+        self._epoch_start = None
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._epoch_start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        logs = logs or {}
+        value = float(logs.get('val_loss', logs.get('loss', np.nan)))
+        self.epoch_seconds.append(time.perf_counter() - self._epoch_start)
+        with open(os.path.join(self.trials_dir, f"{self.trial_id}.jsonl"), 'a') as f:
+            f.write(json.dumps({'epoch': epoch + 1, 'loss': float(logs.get('loss', np.nan)), 'val_loss': value,
+                                'epoch_s': round(self.epoch_seconds[-1], 2)}) + '\n')
+
+        if epoch + 1 < self.min_epochs:
+            return
+        peers = []
+        for file_name in os.listdir(self.trials_dir):
+            if file_name.endswith('.jsonl') and file_name != f"{self.trial_id}.jsonl":
+                peers += [r['val_loss'] for r in _read_history(os.path.join(self.trials_dir, file_name))
+                          if r['epoch'] == epoch + 1]
+        if len(peers) >= self.min_peers and value > np.median(peers):
+            print(f"Pruned after epoch {epoch + 1}: validation loss {value:.4f} is above the median {np.median(peers):.4f}")
+            self.pruned_at = epoch + 1
+            self.model.stop_training = True
+
+def run_trial(sweep_dir, trial_id, epochs, min_epochs):
+    """
+    Train one trial of a sweep and record its result.
+
+    Runs in its own process. The trial's settings are read from
+    trials/<trial_id>.params.json and its result is written to
+    trials/<trial_id>.json.
+
+    Returns:
+        dict: The trial's result.
+    """
+    config = load_config()
+    if config.CPU_AFFINITY:
+        set_cpu_affinity(config.CPU_AFFINITY)
+    if config.CPU_THREADS:
+        configure_threads(config.CPU_THREADS)
+    trials_dir = os.path.join(sweep_dir, 'trials')
+    with open(os.path.join(trials_dir, f"{trial_id}.params.json")) as f:
+        params = json.load(f)
+    for name, value in params.items():
+        setattr(config, name, value)
+
+    ids = np.load(os.path.join(sweep_dir, 'tokens.npy'), mmap_mode='r')
+    with open(os.path.join(sweep_dir, 'vocab.json')) as f:
+        n_vocab = len(json.load(f))
+    split = validation_start(len(ids))
+    train_input, train_output = windows_from_ids(ids[:split], n_vocab, config.SEQUENCE_LENGTH, config.SEQUENCE_INPUT_DTYPE)
+    val_input, val_output = windows_from_ids(ids[split:], n_vocab, config.SEQUENCE_LENGTH, config.SEQUENCE_INPUT_DTYPE)
+
+    model = ModelBuilder().create_model(train_input, n_vocab, sparse_targets=True,
+                                        units=config.LSTM_UNITS, dropout=config.DROPOUT)
+    pruner = MedianPruner(trials_dir, trial_id, min_epochs)
+    start_time = time.perf_counter()
+    # Only the training windows are strided or sampled, so every trial is validated on the same windows
+    train_dataset = make_window_dataset(train_input, train_output, config.BATCH_SIZE, seed=config.SHUFFLE_SEED,
+                                        stride=config.WINDOW_STRIDE, sample=config.WINDOW_SAMPLE)
+    history = model.fit(train_dataset,
+                        validation_data=make_window_dataset(val_input, val_output, config.BATCH_SIZE, shuffle=False),
+                        epochs=epochs, callbacks=[pruner], verbose=2)
+
+    result = {
+        'trial': trial_id,
+        'params': params,
+        'status': 'pruned' if pruner.pruned_at else 'complete',
+        'epochs': len(history.history['loss']),
+        'loss': round(float(history.history['loss'][-1]), 4),
+        'val_loss': round(float(min(history.history['val_loss'])), 4),
+        'step_ms': round(step_latency_ms(model, val_input), 3),
+        # The first epoch also traces the model, so the median is the steady-state epoch time
+        'epoch_s': round(float(np.median(pruner.epoch_seconds)), 2),
+        'model_params': int(model.count_params()),
+        'wall_s': round(time.perf_counter() - start_time, 1)
+    }
+    with open(os.path.join(trials_dir, f"{trial_id}.json"), 'w') as f:
+        json.dump(result, f, indent=2)
+    return result
+
+def leaderboard(results):
+    """
+    Rank trial results by validation loss and mark the quality/latency and quality/training time frontiers.
+
+    A completed trial is on the frontier if no other completed trial has
+    both a lower validation loss and a lower step latency, and on the
+    training frontier if none has both a lower validation loss and a
+    shorter epoch. Pruned trials are ranked but never on a frontier, since
+    they stopped early.
+
+    Args:
+        results (list): Trial results from run_trial.
+
+    Returns:
+        list: The results, best first, each with 'rank', 'frontier' and 'training_frontier' added.
+    """
+    ranked = sorted(results, key=lambda r: (r['status'] != 'complete', r['val_loss']))
+    complete = [r for r in ranked if r['status'] == 'complete']
+    for rank, result in enumerate(ranked, 1):
+        result['rank'] = rank
+        result['frontier'] = result['status'] == 'complete' and not any(
+            other['val_loss'] < result['val_loss'] and other['step_ms'] < result['step_ms'] for other in complete)
+        result['training_frontier'] = result['status'] == 'complete' and not any(
+            other['val_loss'] < result['val_loss'] and other['epoch_s'] < result['epoch_s'] for other in complete)
+    return ranked
+
+def print_leaderboard(ranked):
+    """Print a leaderboard as a table, with frontier trials marked."""
+    print(f"{'rank':>4}   {'trial':<10} {'params':<52} {'val_loss':>8} {'step_ms':>8} {'epoch_s':>8} {'epochs':>6}  status")
+    for r in ranked:
+        params = ' '.join(f"{name}={value}" for name, value in sorted(r['params'].items()))
+        marks = ('*' if r['frontier'] else ' ') + ('+' if r.get('training_frontier') else ' ')
+        print(f"{r['rank']:>4}{marks} {r['trial']:<10} {params:<52} "
+              f"{r['val_loss']:>8.4f} {r['step_ms']:>8.2f} {r.get('epoch_s', float('nan')):>8.2f} {r['epochs']:>6}  "
+              f"{r['status']}")
+    print("* on the quality/latency frontier, + on the quality/training time frontier")
+
+def run_sweep(corpus, space, sweep_dir, parallel=1, cores_per_job=None, epochs=10, min_epochs=2,
+              max_trials=None, seed=None):
+    """
+    Run every trial of a search space, a fixed number at a time, and rank them.
+
+    The corpus is tokenised once up front. Each trial then trains in a child
+    process pinned to its own CPUs, as in jobs.run_jobs, and weak trials are
+    pruned by MedianPruner. The leaderboard is written to leaderboard.json.
+
+    Args:
+        corpus (str): Corpus directory.
+        space (dict): The search space, see expand_space.
+        sweep_dir (str): Directory for the tokens, trial histories, logs and leaderboard.
+        parallel (int): Number of trials that run at the same time.
+        cores_per_job (int, optional): CPUs for each trial. Defaults to an even split.
+        epochs (int): Maximum epochs per trial.
+        min_epochs (int): Epochs every trial runs before it can be pruned.
+        max_trials (int, optional): Run this many random combinations instead of all of them.
+        seed (int, optional): Seed for drawing the combinations.
+
+    Returns:
+        list: The ranked trial results.
+
+    Raises:
+        ValueError: If no trial's sequence length fits the corpus's validation split.
+    """
+    trials_dir = os.path.join(sweep_dir, 'trials')
+    os.makedirs(trials_dir, exist_ok=True)
+    config = load_config()
+    tokens_path = prepare_tokens(corpus, sweep_dir, config)
+
+    # A window must fit in the validation tokens, or the trial would only fail once it has a worker
+    longest = longest_sequence(len(np.load(tokens_path, mmap_mode='r')))
+    trials = []
+    for params in expand_space(space, max_trials, seed):
+        sequence_length = params.get('SEQUENCE_LENGTH', config.SEQUENCE_LENGTH)
+        if sequence_length > longest:
+            print(f"Skipping {params}: SEQUENCE_LENGTH {sequence_length} is longer than the {longest} tokens "
+                  f"the validation split of this corpus allows")
+        else:
+            trials.append(params)
+    if not trials:
+        raise ValueError(f"No trial fits the corpus; use a SEQUENCE_LENGTH of at most {longest}")
+
+    trial_ids = []
+    for i, params in enumerate(trials):
+        trial_id = f"trial-{i:03d}"
+        with open(os.path.join(trials_dir, f"{trial_id}.params.json"), 'w') as f:
+            json.dump(params, f)
+        trial_ids.append(trial_id)
+    print(f"Running {len(trial_ids)} trials, {parallel} at a time")
+
+    budgets = queue.Queue()
+    for cores in core_budgets(parallel, cores_per_job):
+        budgets.put(cores)
+
+    def run(trial_id):
+        cores = budgets.get()
+        try:
+            command = [sys.executable, os.path.abspath(__file__), '--trial', trial_id, '--sweep-dir', sweep_dir,
+                       '--epochs', str(epochs), '--min-epochs', str(min_epochs)]
+            returncode = run_pinned(command, cores, os.path.join(trials_dir, f"{trial_id}.log"))
+            print(f"Finished {trial_id}: exit code {returncode}")
+        finally:
+            budgets.put(cores)
+
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        list(executor.map(run, trial_ids))
+
+    results = []
+    for trial_id in trial_ids:
+        try:
+            with open(os.path.join(trials_dir, f"{trial_id}.json")) as f:
+                results.append(json.load(f))
+        except OSError:
+            print(f"{trial_id} failed; see {os.path.join(trials_dir, f'{trial_id}.log')}")
+    ranked = leaderboard(results)
+    with open(os.path.join(sweep_dir, 'leaderboard.json'), 'w') as f:
+        json.dump(ranked, f, indent=2)
+    return ranked
+
+def main():
+    """
+    Search model settings on a corpus.
+
+    Example:
+        python sweep.py v2 --space '{"LSTM_UNITS": [256, 512], "DROPOUT": [0.2, 0.3]}' --parallel 2 --epochs 10
+
+    The search space is JSON, inline or in a file, with a list of values for
+    any of SEARCH_SETTINGS. Other settings come from the configuration.
+    """
+    parser = argparse.ArgumentParser(description="Run a hyperparameter sweep on a MIDI corpus.")
+    parser.add_argument('corpus', nargs='?', help="Corpus directory, or the name of one in INPUT_BASE")
+    parser.add_argument('--space', help="Search space as JSON, or a JSON file")
+    parser.add_argument('--name', default=None, help="Sweep name (default: sweep-<timestamp>)")
+    parser.add_argument('--parallel', type=int, default=1, help="Number of trials to run at the same time")
+    parser.add_argument('--cores-per-job', type=int, default=None,
+                        help="CPUs for each trial (default: the available CPUs split evenly)")
+    parser.add_argument('--epochs', type=int, default=10, help="Maximum epochs per trial")
+    parser.add_argument('--min-epochs', type=int, default=2, help="Epochs every trial runs before it can be pruned")
+    parser.add_argument('--max-trials', type=int, default=None, help="Run this many random combinations")
+    parser.add_argument('--seed', type=int, default=None, help="Seed for drawing the combinations")
+    parser.add_argument('--trial', help=argparse.SUPPRESS)
+    parser.add_argument('--sweep-dir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.trial:
+        run_trial(args.sweep_dir, args.trial, args.epochs, args.min_epochs)
+        return
+    if not args.corpus or not args.space:
+        parser.error("a corpus and --space are required")
+
+    config = load_config()
+    corpus = args.corpus if os.path.isdir(args.corpus) else os.path.join(config.INPUT_BASE, args.corpus)
+    if os.path.isfile(args.space):
+        with open(args.space) as f:
+            space = json.load(f)
+    else:
+        space = json.loads(args.space)
+    sweep_dir = os.path.join(config.MODEL_BASE, 'sweeps', args.name or time.strftime('sweep-%Y%m%d-%H%M%S'))
+
+    ranked = run_sweep(corpus, space, sweep_dir, args.parallel, args.cores_per_job, args.epochs, args.min_epochs,
+                       args.max_trials, args.seed)
+    print_leaderboard(ranked)
+    print(f"Leaderboard saved to {os.path.join(sweep_dir, 'leaderboard.json')}")
+
+if __name__ == "__main__":
+    main()
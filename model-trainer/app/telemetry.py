@@ -0,0 +1,171 @@
+import json
+import os
+import resource
+import time
+import numpy as np
+import tensorflow as tf
+
+# How many batches the input pipeline is timed on, on its own, before training
+INPUT_BENCHMARK_BATCHES = 20
+
+def _rss_mb():
+    """Return the resident memory of this process in MB, and its peak so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    try:
+        with open('/proc/self/statm') as f:
+            current = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        current = peak
+    return round(current, 1), round(peak, 1)
+
+def benchmark_input(dataset, batches=INPUT_BENCHMARK_BATCHES):
+    """
+    Time how long a dataset takes to produce a batch when nothing else runs.
+
+    One batch is taken first so pipeline start-up isn't counted.
+
+    Args:
+        dataset (tf.data.Dataset): The training dataset.
+        batches (int): Number of batches to time.
+
+    Returns:
+        float: Milliseconds per batch, or None if the dataset is too short.
+    """
+    iterator = iter(dataset)
+    try:
+        next(iterator)
+        start_time = time.perf_counter()
+        for _ in range(batches):
+            next(iterator)
+    except StopIteration:
+        return None
+    return (time.perf_counter() - start_time) * 1000 / batches
+
+class TrainingTelemetry(tf.keras.callbacks.Callback):
+    """
+    A Keras callback that records training throughput to a JSONL file.
+
+    Each epoch appends one line with its wall time, samples/sec, step time
+    percentiles, the host time between steps, memory use and the epoch's
+    logs. The first line describes the run, including how fast the input
+    pipeline produces batches on its own; if that is slower than a training
+    step, the run is input bound. The last line summarises the run.
+
+    Optionally, a TensorFlow profiler trace is captured for a window of
+    global steps, for inspection in TensorBoard's profile tab.
+    """
+
+    def __init__(self, path, samples_per_epoch, batch_size, input_ms_per_batch=None,
+                 profile_steps=None, profile_dir=None):
+        """
+        Initialise the TrainingTelemetry.
+
+        Args:
+            path (str): The JSONL file records are appended to.
+            samples_per_epoch (int): Number of training windows in an epoch.
+            batch_size (int): Windows per batch.
+            input_ms_per_batch (float, optional): Result of benchmark_input for the training dataset.
+            profile_steps (tuple, optional): First and last global step to trace with the profiler.
+            profile_dir (str, optional): Directory for the profiler trace.
+        """
+        super().__init__()
+        self.path = path
+        self.samples_per_epoch = samples_per_epoch
+        self.batch_size = batch_size
+        self.input_ms_per_batch = input_ms_per_batch
+        self.profile_steps = tuple(profile_steps) if profile_steps else None
+        self.profile_dir = profile_dir
+        self._global_step = 0
+        self._profiling = False
+        self._epoch_records = []
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _write(self, record):
+        record['time'] = time.time()
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+    def on_train_begin(self, logs=None):
+        self._train_start = time.perf_counter()
+        current, peak = _rss_mb()
+        self._write({
+            'event': 'train_begin',
+            'samples_per_epoch': self.samples_per_epoch,
+            'batch_size': self.batch_size,
+            'steps_per_epoch': self.params.get('steps'),
+            'epochs': self.params.get('epochs'),
+            'input_ms_per_batch': self.input_ms_per_batch,
+            'rss_mb': current,
+            'peak_rss_mb': peak
+        })
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._epoch_start = time.perf_counter()
+        self._step_times = []
+        self._host_gaps = []
+        self._last_step_end = None
+
+    def on_train_batch_begin(self, batch, logs=None):
+        now = time.perf_counter()
+        if self._last_step_end is not None:
+            self._host_gaps.append(now - self._last_step_end)
+        if self.profile_steps and self._global_step == self.profile_steps[0] and not self._profiling:
+            tf.profiler.experimental.start(self.profile_dir)
+            self._profiling = True
+        self._step_start = now
+
+    def on_train_batch_end(self, batch, logs=None):
+        now = time.perf_counter()
+        self._step_times.append(now - self._step_start)
+        self._last_step_end = now
+        if self._profiling and self._global_step >= self.profile_steps[1]:
+            self._stop_profiler()
+        self._global_step += 1
+
+    def on_epoch_end(self, epoch, logs=None):
+        wall_time = time.perf_counter() - self._epoch_start
+        # The first step of a run includes tracing and compiling the model
+        step_ms = np.array(self._step_times[1:] if epoch == self.params.get('initial_epoch', 0) and
+                           len(self._step_times) > 1 else self._step_times) * 1000
+        current, peak = _rss_mb()
+        record = {
+            'event': 'epoch',
+            'epoch': epoch + 1,
+            'wall_s': round(wall_time, 3),
+            'steps': len(self._step_times),
+            'samples_per_sec': round(self.samples_per_epoch / wall_time, 1),
+            'step_ms': {
+                'mean': round(float(step_ms.mean()), 2),
+                'p50': round(float(np.percentile(step_ms, 50)), 2),
+                'p90': round(float(np.percentile(step_ms, 90)), 2),
+                'p99': round(float(np.percentile(step_ms, 99)), 2)
+            } if len(step_ms) else None,
+            'host_gap_ms': round(float(np.mean(self._host_gaps)) * 1000, 3) if self._host_gaps else 0.0,
+            'rss_mb': current,
+            'peak_rss_mb': peak,
+            'logs': {key: float(value) for key, value in (logs or {}).items()}
+        }
+        self._epoch_records.append(record)
+        self._write(record)
+
+    def on_train_end(self, logs=None):
+        if self._profiling:
+            self._stop_profiler()
+        summary = {'event': 'train_end', 'wall_s': round(time.perf_counter() - self._train_start, 3)}
+        if self._epoch_records:
+            summary['samples_per_sec'] = round(float(np.median([r['samples_per_sec'] for r in self._epoch_records])), 1)
+            step_p50 = [r['step_ms']['p50'] for r in self._epoch_records if r['step_ms']]
+            if step_p50 and self.input_ms_per_batch is not None:
+                # Batches are prefetched, so input only holds training up when it is slower than a step
+                summary['step_ms_p50'] = round(float(np.median(step_p50)), 2)
+                summary['bound'] = 'input' if self.input_ms_per_batch > summary['step_ms_p50'] else 'compute'
+        summary['peak_rss_mb'] = _rss_mb()[1]
+        self._write(summary)
+        if 'bound' in summary:
+            print(f"Telemetry: {summary['samples_per_sec']} samples/sec, step p50 {summary['step_ms_p50']:.1f} ms, "
+                  f"input {self.input_ms_per_batch:.1f} ms/batch: {summary['bound']} bound")
+
+    def _stop_profiler(self):
+        tf.profiler.experimental.stop()
+        self._profiling = False
+        print(f"Profiler trace written to {self.profile_dir}")
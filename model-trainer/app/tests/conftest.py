@@ -0,0 +1,26 @@
+import os
+import sys
+import pytest
+
+# The trainer's modules import each other by name, as when run from the app directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def write_midi(tmp_path):
+    """
+    Return a function that writes a small MIDI file of notes and chords into a temporary directory.
+
+    Each item is a MIDI pitch for a note or a list of them for a chord, one
+    quarter note long.
+    """
+    from music21 import chord, note, stream
+
+    def write(name, items):
+        part = stream.Stream()
+        for item in items:
+            part.append(chord.Chord(item) if isinstance(item, list) else note.Note(item))
+        path = str(tmp_path / name)
+        part.write('midi', fp=path)
+        return path
+
+    return write
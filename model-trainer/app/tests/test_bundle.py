@@ -0,0 +1,85 @@
+"""
+This module contains tests of exporting trained models as versioned bundles.
+
+Usage:
+    Run these tests using pytest from the model-trainer/app directory:
+    $ pytest tests/test_bundle.py
+"""
+
+import json
+import os
+import numpy as np
+import pytest
+from bundle import MANIFEST_NAME, export_bundle, read_manifest
+from data_pipeline import save_model_data, token_windows
+
+N_VOCAB = 10
+SEQUENCE_LENGTH = 8
+
+@pytest.fixture(scope="module")
+def saved_model(tmp_path_factory):
+    """
+    Save a small model with its _data.pkl.
+
+    Returns:
+        tuple: The Keras model, the path of its .h5 file and its training windows.
+    """
+    from tensorflow import keras
+    from tensorflow.keras import layers
+
+    model = keras.Sequential([
+        layers.LSTM(8, input_shape=(SEQUENCE_LENGTH, 1)),
+        layers.Dense(N_VOCAB, activation='softmax')
+    ])
+    model_path = str(tmp_path_factory.mktemp("trained") / "tiny.h5")
+    model.save(model_path)
+    network_input = token_windows(np.arange(60, dtype=np.float32) % N_VOCAB / N_VOCAB, SEQUENCE_LENGTH)
+    save_model_data(f"{model_path}_data.pkl", network_input, [str(i) for i in range(N_VOCAB)],
+                    {str(i): i for i in range(N_VOCAB)})
+    return model, model_path, network_input
+
+def test_export_bundle_saves_seed_tokens(saved_model, tmp_path):
+    """
+    Test that a bundle holds the seed windows' token array and window length, not the windows.
+    """
+    model, model_path, network_input = saved_model
+    bundle_dir = export_bundle(model, model_path, str(tmp_path), "tiny")
+
+    tokens = np.load(os.path.join(bundle_dir, "seed_tokens.npy"))
+    with open(os.path.join(bundle_dir, "vocab.json")) as f:
+        vocab = json.load(f)
+    assert tokens.shape == (len(network_input) + SEQUENCE_LENGTH - 1,)
+    np.testing.assert_array_equal(token_windows(tokens, vocab['sequence_length']), network_input)
+    assert not os.path.exists(os.path.join(bundle_dir, "seed_windows.npy"))
+
+def test_export_bundle_versions_and_manifest(saved_model, tmp_path):
+    """
+    Test that exports take the next version and keep the manifest entries of other models.
+    """
+    model, model_path, _ = saved_model
+    export_bundle(model, model_path, str(tmp_path), "other")
+    export_bundle(model, model_path, str(tmp_path), "tiny")
+    export_bundle(model, model_path, str(tmp_path), "tiny")
+
+    manifest = read_manifest(str(tmp_path))
+    assert manifest['models']['tiny']['version'] == 2
+    assert manifest['models']['tiny']['versions'] == [1, 2]
+    assert manifest['models']['tiny']['path'] == os.path.join("tiny", "2")
+    assert manifest['models']['other']['version'] == 1
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+def test_export_bundle_keeps_later_current_version(saved_model, tmp_path):
+    """
+    Test that a job indexing its bundle after a later version was indexed doesn't replace it as current.
+    """
+    model, model_path, _ = saved_model
+    export_bundle(model, model_path, str(tmp_path), "tiny")
+    manifest_path = tmp_path / MANIFEST_NAME
+    manifest = json.loads(manifest_path.read_text())
+    manifest['models']['tiny'].update(version=5, versions=[1, 5], path=os.path.join("tiny", "5"))
+    manifest_path.write_text(json.dumps(manifest))
+
+    export_bundle(model, model_path, str(tmp_path), "tiny")
+
+    entry = read_manifest(str(tmp_path))['models']['tiny']
+    assert entry['version'] == 5 and entry['versions'] == [1, 2, 5]
@@ -0,0 +1,74 @@
+"""
+This module contains tests of resumable training checkpoints.
+
+Usage:
+    Run these tests using pytest from the model-trainer/app directory:
+    $ pytest tests/test_checkpoints.py
+"""
+
+import os
+import numpy as np
+import pytest
+import tensorflow as tf
+from checkpoints import CheckpointManager, vocabulary_fingerprint
+
+PITCHNAMES = ['C4', 'E4', 'G4', '0.4.7']
+
+def build_model():
+    """Build and compile a small model with optimizer state to checkpoint."""
+    model = tf.keras.Sequential([tf.keras.layers.Dense(4, input_shape=(3,)), tf.keras.layers.Dense(2)])
+    model.compile(loss='mse', optimizer='adam')
+    return model
+
+def corpus_record(pitchnames):
+    """Return the corpus record of a run with this vocabulary."""
+    return {'n_vocab': len(pitchnames), 'vocab_sha256': vocabulary_fingerprint(pitchnames), 'transpositions': [2]}
+
+def run_epochs(manager, model, losses):
+    """Call the manager as fit would, with the given loss at the end of each epoch."""
+    manager.set_model(model)
+    manager.on_train_begin()
+    for epoch, loss in enumerate(losses):
+        model.fit(np.ones((4, 3)), np.zeros((4, 2)), epochs=1, verbose=0)
+        manager.on_epoch_end(epoch, {'loss': loss})
+    manager.on_train_end()
+
+def test_retention_keeps_the_latest_and_best(tmp_path):
+    """
+    Test that only the most recent checkpoints and the lowest-loss one are kept, on disk and in the index.
+    """
+    manager = CheckpointManager(str(tmp_path), keep_last=2, keep_best=1, corpus=corpus_record(PITCHNAMES))
+    run_epochs(manager, build_model(), [3.0, 1.0, 2.0, 2.5, 2.2])
+
+    assert [c['epoch'] for c in manager.checkpoints()] == [2, 4, 5]
+    assert sorted(f for f in os.listdir(tmp_path) if f.endswith('.npz')) == \
+        ['ckpt-0002.npz', 'ckpt-0004.npz', 'ckpt-0005.npz']
+    assert manager.latest()['epoch'] == 5
+    assert manager.saved_corpus() == corpus_record(PITCHNAMES)
+
+def test_restore_continues_training(tmp_path):
+    """
+    Test that a restored model has the checkpoint's weights and optimizer state, and resumes after its epoch.
+    """
+    model = build_model()
+    run_epochs(CheckpointManager(str(tmp_path), corpus=corpus_record(PITCHNAMES)), model, [1.0, 0.5])
+
+    resumed = build_model()
+    epoch = CheckpointManager(str(tmp_path), corpus=corpus_record(PITCHNAMES)).restore(resumed)
+
+    assert epoch == 2
+    for saved, restored in zip(model.get_weights(), resumed.get_weights()):
+        np.testing.assert_array_equal(saved, restored)
+    for saved, restored in zip(model.optimizer.variables, resumed.optimizer.variables):
+        np.testing.assert_array_equal(saved.numpy(), restored.numpy())
+    assert CheckpointManager(str(tmp_path / "empty")).restore(build_model()) == 0
+
+def test_restore_rejects_another_vocabulary(tmp_path):
+    """
+    Test that resuming on a corpus with another token-to-id mapping fails, even with the same vocabulary size.
+    """
+    run_epochs(CheckpointManager(str(tmp_path), corpus=corpus_record(PITCHNAMES)), build_model(), [1.0])
+
+    reordered = CheckpointManager(str(tmp_path), corpus=corpus_record(PITCHNAMES[::-1]))
+    with pytest.raises(ValueError, match="different vocabulary"):
+        reordered.restore(build_model())
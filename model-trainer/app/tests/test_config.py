@@ -0,0 +1,84 @@
+"""
+This module contains tests of configuring unattended training runs.
+
+Usage:
+    Run these tests using pytest from the model-trainer/app directory:
+    $ pytest tests/test_config.py
+"""
+
+import json
+import os
+import sys
+import pytest
+from config import load_config
+from jobs import core_budgets, run_pinned
+from main import cli_overrides, parse_args, resolve_input_dir
+
+def test_environment_overrides_take_each_setting_type(monkeypatch):
+    """
+    Test that TRAINER_<SETTING> variables are parsed to the type of the setting they override.
+    """
+    monkeypatch.setenv("TRAINER_EPOCHS", "20")
+    monkeypatch.setenv("TRAINER_RESUME", "yes")
+    monkeypatch.setenv("TRAINER_AUGMENT_TRANSPOSITIONS", "[-2, 3]")
+    monkeypatch.setenv("TRAINER_OUTPUT_NAME", "123")
+    monkeypatch.setenv("TRAINER_SHUFFLE_SEED", "none")
+    monkeypatch.setenv("TRAINER_WINDOW_SAMPLE", "0.25")
+    config = load_config()
+
+    assert config.EPOCHS == 20
+    assert config.RESUME is True
+    assert config.AUGMENT_TRANSPOSITIONS == [-2, 3]
+    assert config.OUTPUT_NAME == "123"
+    assert config.SHUFFLE_SEED is None
+    assert config.WINDOW_SAMPLE == 0.25
+
+def test_command_line_overrides_environment(monkeypatch, tmp_path):
+    """
+    Test that options given on the command line win over the environment, and relative directories follow MODEL_BASE.
+    """
+    monkeypatch.setenv("TRAINER_EPOCHS", "20")
+    monkeypatch.setenv("TRAINER_BATCH_SIZE", "32")
+    args = parse_args(['--epochs', '3', '--model-dir', str(tmp_path), '--checkpoint-dir', 'ckpt', '--no-bundle'])
+    config = load_config(cli_overrides(args))
+
+    assert config.EPOCHS == 3
+    assert config.BATCH_SIZE == 32
+    assert config.EXPORT_BUNDLE is False
+    assert config.CHECKPOINT_DIR == os.path.join(str(tmp_path), 'ckpt')
+    assert config.TELEMETRY_DIR == os.path.join(str(tmp_path), 'telemetry')
+
+def test_missing_corpus_fails_without_prompting(monkeypatch, tmp_path):
+    """
+    Test that an unattended run without a corpus stops instead of waiting for input.
+    """
+    monkeypatch.setattr(sys.stdin, 'isatty', lambda: False, raising=False)
+    config = load_config({'INPUT_BASE': str(tmp_path)})
+    assert resolve_input_dir(config) is None
+
+    (tmp_path / "v2").mkdir()
+    config.INPUT_DIR = "v2"
+    assert resolve_input_dir(config) == str(tmp_path / "v2")
+
+def test_core_budgets_are_disjoint(monkeypatch):
+    """
+    Test that concurrent jobs get disjoint CPU sets, and that oversubscribing is rejected.
+    """
+    monkeypatch.setattr(os, 'sched_getaffinity', lambda pid: {0, 1, 2, 3, 4, 5, 6}, raising=False)
+
+    assert core_budgets(3) == [[0, 1], [2, 3], [4, 5]]
+    assert core_budgets(2, cores_per_job=1) == [[0], [1]]
+    with pytest.raises(ValueError):
+        core_budgets(4, cores_per_job=2)
+
+def test_run_pinned_passes_the_budget(tmp_path):
+    """
+    Test that a child job is told its cores and thread budget, and its output goes to the log.
+    """
+    log_path = str(tmp_path / "job.log")
+    script = ("import json, os; print(json.dumps([os.environ[name] for name in "
+              "('TRAINER_CPU_AFFINITY', 'TRAINER_CPU_THREADS', 'TRAINER_PARSE_WORKERS')]))")
+    assert run_pinned([sys.executable, '-c', script], [0], log_path) == 0
+
+    with open(log_path) as f:
+        assert json.loads(f.read()) == ["[0]", "1", "1"]
@@ -0,0 +1,71 @@
+"""
+This module contains tests of the corpus statistics and preprocessing profile report.
+
+Usage:
+    Run these tests using pytest from the model-trainer/app directory:
+    $ pytest tests/test_corpus_report.py
+"""
+
+import json
+import numpy as np
+from corpus_report import corpus_report, estimate_memory, main, token_distribution
+from midi_processor import MIDIProcessor
+from token_codec import encode_tokens
+
+def test_token_distribution_counts_the_corpus():
+    """
+    Test the vocabulary, most frequent tokens, singletons and entropy of a small corpus.
+    """
+    codes = encode_tokens(['C4'] * 4 + ['E4'] * 2 + ['0.4.7', 'G4'])
+    distribution = token_distribution(codes, top=2)
+
+    assert distribution['vocab'] == 4
+    assert distribution['top'] == [{'token': 'C4', 'count': 4, 'share': 0.5}, {'token': 'E4', 'count': 2, 'share': 0.25}]
+    assert distribution['singletons'] == 2
+    assert distribution['entropy_bits'] == 1.75
+    # 'G4' is pruned to a frequent note, but the only chord has no frequent chord to go to
+    assert distribution['vocab_at_min_count']['2'] == 3
+
+def test_streaming_needs_the_least_memory():
+    """
+    Test that streaming holds less than materialized windows, which hold less than copied sequences.
+    """
+    memory = estimate_memory(1_000_000, 800, sequence_length=100)
+    assert memory['streaming']['training'] < memory['windows']['training'] < memory['sequences']['training']
+    assert memory['windows']['prepared'] == 1_000_000 * 8
+
+def test_corpus_report_profiles_each_file(write_midi, tmp_path):
+    """
+    Test the per-file counts, vocabulary growth and window totals of a parsed corpus, with a file that fails.
+    """
+    write_midi("a.mid", [60, 62, [60, 64, 67], 64])
+    write_midi("b.mid", [60, 65, 67])
+    (tmp_path / "c.mid").write_bytes(b"not a MIDI file")
+    processor = MIDIProcessor(workers=1, transpositions=[2])
+
+    report = corpus_report(processor, str(tmp_path), sequence_length=4, batch_size=2, window_stride=2)
+    files = {entry['file']: entry for entry in report['files']}
+    corpus = report['corpus']
+
+    assert (files['a.mid']['notes'], files['a.mid']['chords'], files['a.mid']['new_tokens']) == (3, 1, 4)
+    assert (files['b.mid']['new_tokens'], files['b.mid']['vocab_total']) == (2, 6)
+    assert 'error' in files['c.mid']
+    assert (corpus['files'], corpus['failed'], corpus['tokens']) == (3, 1, 7)
+    assert corpus['augmented_tokens'] == 14 and corpus['windows'] == 10
+    assert corpus['windows_per_epoch'] == 5 and corpus['steps_per_epoch'] == 3
+
+def test_main_writes_the_json_report(write_midi, tmp_path, monkeypatch):
+    """
+    Test that the command line writes its report to the given path, and fails without MIDI files.
+    """
+    write_midi("a.mid", [60, 62, 64, 65, 67])
+    monkeypatch.setenv("TRAINER_NUM_AUGMENTATIONS", "0")
+    monkeypatch.setenv("TRAINER_PARSE_WORKERS", "1")
+    output = tmp_path / "reports" / "corpus.json"
+
+    assert main([str(tmp_path), '--output', str(output), '--sequence-length', '2']) == 0
+    report = json.loads(output.read_text())
+    assert report['corpus']['tokens'] == 5 and report['corpus']['windows'] == 3
+    assert np.isclose(report['corpus']['distribution']['entropy_bits'], np.log2(5), atol=1e-3)
+    # A directory without MIDI files fails instead of writing an empty report
+    assert main([str(tmp_path / "reports")]) == 1
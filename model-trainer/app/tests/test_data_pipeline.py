@@ -0,0 +1,100 @@
+"""
+This module contains tests of the streaming tf.data training input.
+
+Usage:
+    Run these tests using pytest from the model-trainer/app directory:
+    $ pytest tests/test_data_pipeline.py
+"""
+
+import numpy as np
+import pytest
+from data_pipeline import load_model_data, make_window_dataset, save_model_data, windows_per_epoch
+from midi_processor import windows_from_ids
+
+N_VOCAB = 7
+SEQUENCE_LENGTH = 5
+
+def corpus_windows(n_notes=40):
+    """Return windows and targets cut from a repeatable random corpus."""
+    ids = np.random.default_rng(0).integers(0, N_VOCAB, n_notes)
+    return windows_from_ids(ids, N_VOCAB, SEQUENCE_LENGTH)
+
+def collect(dataset):
+    """Return every input window and target of one pass over a dataset."""
+    batches = list(dataset.as_numpy_iterator())
+    return np.concatenate([inputs for inputs, _ in batches]), np.concatenate([targets for _, targets in batches])
+
+def test_dataset_yields_the_array_samples():
+    """
+    Test that the unshuffled pipeline yields exactly the windows and targets of the arrays.
+    """
+    network_input, network_output = corpus_windows()
+    inputs, targets = collect(make_window_dataset(network_input, network_output, batch_size=8, shuffle=False))
+
+    np.testing.assert_allclose(inputs, network_input)
+    np.testing.assert_array_equal(targets, network_output)
+
+def test_shuffled_epochs_cover_every_window_once():
+    """
+    Test that each shuffled epoch holds every window once, in a new order, each with its own target.
+    """
+    # Integer windows of distinct ids, so each window's first token is its start
+    network_input, network_output = windows_from_ids(np.arange(40), 40, SEQUENCE_LENGTH, np.int32)
+    dataset = make_window_dataset(network_input, network_output, batch_size=8, seed=1)
+    first_inputs, first_targets = collect(dataset)
+    second_inputs, _ = collect(dataset)
+
+    starts = first_inputs[:, 0, 0]
+    np.testing.assert_array_equal(np.sort(starts), np.arange(len(network_input)))
+    np.testing.assert_array_equal(first_inputs, network_input[starts])
+    np.testing.assert_array_equal(first_targets, network_output[starts])
+    assert not np.array_equal(starts, second_inputs[:, 0, 0])
+
+def test_dataset_labels_the_following_notes_per_head():
+    """
+    Test that a horizon labels each window with its next notes, leaving out windows without enough of them.
+    """
+    network_input, network_output = corpus_windows()
+    inputs, targets = collect(make_window_dataset(network_input, network_output, batch_size=8, shuffle=False,
+                                                  horizon=3))
+
+    assert targets.shape == (len(network_input) - 2, 3)
+    np.testing.assert_array_equal(targets[:, 0], network_output[:-2])
+    np.testing.assert_array_equal(targets[:, 2], network_output[2:])
+    np.testing.assert_allclose(inputs, network_input[:-2])
+
+def test_model_data_saves_the_token_array(tmp_path):
+    """
+    Test that saved windows load back unchanged, from a file the size of the tokens rather than the windows.
+    """
+    network_input, _ = corpus_windows(2000)
+    data_path = str(tmp_path / "model.h5_data.pkl")
+    save_model_data(data_path, network_input, ['A', 'B'], {'A': 0, 'B': 1})
+    loaded, pitchnames, note_to_int, n_vocab = load_model_data(data_path)
+
+    np.testing.assert_array_equal(loaded, network_input)
+    assert (pitchnames, note_to_int, n_vocab) == (['A', 'B'], {'A': 0, 'B': 1}, 2)
+    assert (tmp_path / "model.h5_data.pkl").stat().st_size < network_input.nbytes / 2
+
+def test_stride_and_sample_thin_each_epoch():
+    """
+    Test that an epoch uses every stride-th window, and a fresh random sample of those each epoch.
+    """
+    network_input, network_output = windows_from_ids(np.arange(103), 103, SEQUENCE_LENGTH, np.int32)
+    strided, _ = collect(make_window_dataset(network_input, network_output, batch_size=8, shuffle=False, stride=4))
+    np.testing.assert_array_equal(strided[:, 0, 0], np.arange(0, len(network_input), 4))
+
+    dataset = make_window_dataset(network_input, network_output, batch_size=8, seed=0, stride=4, sample=0.5)
+    epochs = [collect(dataset)[0][:, 0, 0] for _ in range(2)]
+    for starts in epochs:
+        assert len(starts) == windows_per_epoch(len(network_input), 4, 0.5) == 13
+        assert len(np.unique(starts)) == len(starts) and np.all(starts % 4 == 0)
+    assert set(epochs[0]) != set(epochs[1])
+
+def test_sampling_needs_shuffle():
+    """
+    Test that sampling without shuffling is rejected, since it would train on the same windows every epoch.
+    """
+    network_input, network_output = corpus_windows()
+    with pytest.raises(ValueError, match="shuffle"):
+        make_window_dataset(network_input, network_output, shuffle=False, sample=0.5)
@@ -0,0 +1,93 @@
+"""
+This module contains tests of finding duplicate and near-duplicate files in a corpus.
+
+Usage:
+    Run these tests using pytest from the model-trainer/app directory:
+    $ pytest tests/test_dedup.py
+"""
+
+import numpy as np
+from dedup import duplicate_groups, minhash_signatures, normalize_key, shingle_hashes, similar_pairs
+from midi_processor import MIDIProcessor
+from token_codec import decode_tokens, transpose_codes
+
+def random_song(rng, length=300):
+    """Return the codes of a random melody of notes between C3 and C6."""
+    return rng.integers(48, 84, length).astype(np.int32)
+
+def test_signatures_estimate_jaccard_similarity():
+    """
+    Test that the share of matching signature positions is close to the shingle sets' Jaccard similarity.
+    """
+    rng = np.random.default_rng(0)
+    song = random_song(rng, 400)
+    edited = song.copy()
+    edited[::25] = rng.integers(48, 84, len(edited[::25]))
+    first, second = set(shingle_hashes(song).tolist()), set(shingle_hashes(edited).tolist())
+    jaccard = len(first & second) / len(first | second)
+
+    signatures = minhash_signatures([song, edited], num_perm=256)
+    assert abs(float(np.mean(signatures[0] == signatures[1])) - jaccard) < 0.08
+
+def test_normalize_key_matches_transposed_copies():
+    """
+    Test that a copy in another key and octave normalises to the same codes.
+    """
+    song = random_song(np.random.default_rng(1))
+    np.testing.assert_array_equal(normalize_key(transpose_codes(song, 5)), normalize_key(song))
+    np.testing.assert_array_equal(normalize_key(song - 12), normalize_key(song))
+
+def test_similar_pairs_are_grouped():
+    """
+    Test that LSH finds only the similar pairs, and that connected pairs form one group.
+    """
+    rng = np.random.default_rng(2)
+    song, other = random_song(rng), random_song(rng)
+    edited, edited_twice = song.copy(), song.copy()
+    edited[10] = edited[10] + 1
+    edited_twice[[10, 200]] = edited_twice[[10, 200]] + 1
+    signatures = minhash_signatures([song, other, edited, edited_twice])
+    pairs = similar_pairs(signatures, 0.8)
+
+    assert set(pairs) == {(0, 2), (0, 3), (2, 3)}
+    assert all(0.8 <= similarity <= 1.0 for similarity in pairs.values())
+    assert duplicate_groups(4, pairs) == [[0, 2, 3]]
+
+def test_find_duplicates_keeps_the_longest_file():
+    """
+    Test that each group keeps its longest file and reports exact copies, near-duplicates and their share of tokens.
+    """
+    rng = np.random.default_rng(3)
+    song = random_song(rng)
+    longer = np.concatenate([song, random_song(rng, 10)])
+    file_notes = [decode_tokens(song), decode_tokens(random_song(rng)), None,
+                  decode_tokens(transpose_codes(song, 3)), decode_tokens(longer)]
+    names = ['a.mid', 'b.mid', 'empty.mid', 'a_in_e_flat.mid', 'a_extended.mid']
+
+    report = MIDIProcessor(workers=1).find_duplicates(file_notes, names, threshold=0.8)
+
+    assert report['files'] == 4 and report['duplicate_files'] == 2
+    assert [group['kept'] for group in report['groups']] == ['a_extended.mid']
+    duplicates = {d['file']: d for d in report['groups'][0]['duplicates']}
+    assert set(duplicates) == {'a.mid', 'a_in_e_flat.mid'}
+    assert duplicates['a_in_e_flat.mid']['index'] == 3
+    assert not duplicates['a.mid']['exact'] and duplicates['a.mid']['similarity'] >= 0.8
+    assert report['token_fraction'] == round(2 * len(song) / (3 * len(song) + len(longer)), 4)
+
+def test_prepare_data_drops_duplicates(write_midi, tmp_path):
+    """
+    Test that 'drop' leaves duplicate files out of the corpus, and 'report' only lists them.
+    """
+    # The melody dwells on C, so its copy a tone higher normalises to the same key
+    melody = [60, 64, 67, 60, 62, 64, 65, 67, 60, 72, 67, 64, 60, 62]
+    write_midi("a.mid", melody)
+    write_midi("b.mid", [pitch + 2 for pitch in melody])
+    write_midi("c.mid", [72, 60, 67, 55, 64, 48, 62, 59, 65, 57, 69, 52])
+
+    kept = MIDIProcessor(workers=1, num_augmentations=0, dedup='report').prepare_data(str(tmp_path))
+    dropped = MIDIProcessor(workers=1, num_augmentations=0, dedup='drop')
+    notes = dropped.prepare_data(str(tmp_path))
+
+    assert len(kept) == 2 * len(melody) + 12
+    assert len(notes) == len(melody) + 12
+    assert dropped.duplicate_report['dropped'] and dropped.duplicate_report['duplicate_files'] == 1
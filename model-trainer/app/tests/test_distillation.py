@@ -0,0 +1,40 @@
+"""
+This module contains tests of distilling a trained model into a smaller student.
+
+Usage:
+    Run these tests using pytest from the model-trainer/app directory:
+    $ pytest tests/test_distillation.py
+"""
+
+import numpy as np
+import tensorflow as tf
+from distillation import compare_models, distill
+from midi_processor import windows_from_ids
+from model_builder import ModelBuilder
+
+N_VOCAB = 8
+SEQUENCE_LENGTH = 6
+
+def test_distill_trains_the_student_towards_the_teacher():
+    """
+    Test that distilling moves the student's predictions towards the teacher's while the teacher stays fixed.
+    """
+    tf.keras.utils.set_random_seed(0)
+    ids = np.random.default_rng(0).integers(0, N_VOCAB, 400)
+    network_input, network_output = windows_from_ids(ids, N_VOCAB, SEQUENCE_LENGTH)
+    builder = ModelBuilder()
+    teacher = builder.create_student_model(network_input, N_VOCAB, units=32)
+    student = builder.create_student_model(network_input, N_VOCAB, units=8)
+    teacher_weights = teacher.get_weights()
+    before = compare_models(teacher, student, network_input, samples=256)
+
+    history = distill(teacher, student, network_input, network_output, epochs=15, batch_size=32, alpha=0.0,
+                      shuffle_seed=0)
+    after = compare_models(teacher, student, network_input, samples=256)
+
+    assert set(history.history) == {'loss', 'agreement'}
+    assert history.history['loss'][-1] < history.history['loss'][0]
+    assert after['kl_divergence'] < before['kl_divergence']
+    assert after['student_params'] < after['teacher_params']
+    for saved, current in zip(teacher_weights, teacher.get_weights()):
+        np.testing.assert_array_equal(saved, current)
@@ -0,0 +1,113 @@
+"""
+This module contains tests of growing a trained model's vocabulary for fine-tuning.
+
+Usage:
+    Run these tests using pytest from the model-trainer/app directory:
+    $ pytest tests/test_fine_tuning.py
+"""
+
+import asyncio
+import numpy as np
+import pytest
+import tensorflow as tf
+from config import load_config
+from data_pipeline import save_model_data
+from fine_tuning import extend_vocabulary, grow_output_layer, replay_ids, replay_windows, window_ids
+from main import fine_tune_model
+from midi_processor import MIDIProcessor, windows_from_ids
+from model_builder import ModelBuilder
+
+N_VOCAB = 10
+SEQUENCE_LENGTH = 6
+
+def build_model(predict_tokens=1):
+    """Build a small model over N_VOCAB tokens, with its windows."""
+    network_input = np.random.default_rng(0).integers(0, N_VOCAB, (16, SEQUENCE_LENGTH, 1)) / N_VOCAB
+    model = ModelBuilder().create_model(network_input, N_VOCAB, sparse_targets=True, units=8,
+                                        predict_tokens=predict_tokens)
+    return model, network_input
+
+def test_extend_vocabulary_appends_new_tokens():
+    """
+    Test that only unseen tokens are added, after the existing ones, matched by exact name.
+    """
+    pitchnames = ['C4', 'E4', '0.4.7']
+    extended = extend_vocabulary(pitchnames, ['C4', 'G4', '0.4.7', 'D4', 'G4'])
+    assert extended == ['C4', 'E4', '0.4.7', 'D4', 'G4']
+    assert extend_vocabulary(pitchnames, ['E4', 'C4']) == pitchnames
+
+@pytest.mark.parametrize("predict_tokens", [1, 3])
+def test_grow_output_layer_keeps_known_tokens(predict_tokens):
+    """
+    Test that every head is widened and its known tokens keep their outputs' ranking.
+    """
+    model, network_input = build_model(predict_tokens)
+    grown = grow_output_layer(model, N_VOCAB + 4)
+
+    before = model.predict(network_input, verbose=0)
+    after = grown.predict(network_input, verbose=0)
+    expected_shape = (len(network_input), N_VOCAB + 4)
+    if predict_tokens > 1:
+        expected_shape = (len(network_input), predict_tokens, N_VOCAB + 4)
+    assert after.shape == expected_shape
+    np.testing.assert_array_equal(after[..., :N_VOCAB].argsort(axis=-1), before.argsort(axis=-1))
+    # Renormalised over the known tokens, the probabilities are unchanged
+    known = after[..., :N_VOCAB] / after[..., :N_VOCAB].sum(axis=-1, keepdims=True)
+    np.testing.assert_allclose(known, before, rtol=1e-4, atol=1e-6)
+
+def test_grow_output_layer_rejects_shrinking():
+    """
+    Test that a smaller vocabulary is rejected, counted per head for multi-head models.
+    """
+    model, _ = build_model(predict_tokens=3)
+    with pytest.raises(ValueError, match=f"from {N_VOCAB} to {N_VOCAB - 1}"):
+        grow_output_layer(model, N_VOCAB - 1)
+
+def test_replay_windows_rescale_to_the_new_vocabulary():
+    """
+    Test that replayed windows keep their token ids under the new vocabulary, with the target that followed them.
+    """
+    # Distinct ids, so each window's first token is its start
+    network_input, network_output = windows_from_ids(np.arange(40), 40, SEQUENCE_LENGTH)
+    windows, targets = replay_windows(network_input, 40, 50, 20, seed=0)
+
+    starts = np.rint(windows[:, 0, 0] * 50).astype(int)
+    assert len(np.unique(starts)) == 20
+    np.testing.assert_allclose(windows * 50, network_input[starts] * 40, atol=1e-4)
+    np.testing.assert_array_equal(targets, network_output[starts])
+
+def test_replay_ids_draw_a_run_of_the_original_corpus():
+    """
+    Test that replayed ids are consecutive tokens of the original corpus, and that windows give back their ids.
+    """
+    network_input, network_output = windows_from_ids(np.arange(40), 40, SEQUENCE_LENGTH)
+    run = replay_ids(network_input, 40, 20, seed=0)
+
+    assert len(run) == 20
+    np.testing.assert_array_equal(np.diff(run), 1)
+    np.testing.assert_array_equal(replay_ids(network_input, 40, 100), np.arange(39))
+    np.testing.assert_array_equal(window_ids(network_input, network_output, 40), np.arange(40))
+
+def test_fine_tune_model_grows_every_head(tmp_path):
+    """
+    Test that a model predicting several tokens is fine-tuned on new songs, with every head widened.
+    """
+    tf.keras.utils.set_random_seed(0)
+    pitchnames = ['C4', 'D4', 'E4', 'F4', 'G4']
+    ids = np.random.default_rng(0).integers(0, len(pitchnames), 60)
+    network_input, _ = windows_from_ids(ids, len(pitchnames), SEQUENCE_LENGTH)
+    model = ModelBuilder().create_model(network_input, len(pitchnames), sparse_targets=True, units=8,
+                                        predict_tokens=3)
+    base_path = str(tmp_path / "base.h5")
+    model.save(base_path)
+    save_model_data(f"{base_path}_data.pkl", network_input, pitchnames,
+                    {name: i for i, name in enumerate(pitchnames)})
+    config = load_config({'MODEL_BASE': str(tmp_path), 'FINETUNE_FROM': base_path, 'SEQUENCE_LENGTH': SEQUENCE_LENGTH,
+                          'FINETUNE_EPOCHS': 1, 'BATCH_SIZE': 8, 'CHECKPOINT_DIR': '', 'TELEMETRY_DIR': '',
+                          'EXPORT_BUNDLE': False, 'SHUFFLE_SEED': 0})
+    notes = ['C4', 'A4', 'E4', 'B4', 'G4', 'A4'] * 5
+    model_path = str(tmp_path / "tuned.h5")
+
+    assert asyncio.run(fine_tune_model(config, MIDIProcessor(workers=1), notes, model_path)) == 0
+    tuned = tf.keras.models.load_model(model_path, compile=False)
+    assert tuned.output_shape == (None, 3, len(pitchnames) + 2)
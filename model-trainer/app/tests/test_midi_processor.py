@@ -0,0 +1,78 @@
+"""
+This module contains tests of reading MIDI corpora with the MIDIProcessor.
+
+Usage:
+    Run these tests using pytest from the model-trainer/app directory:
+    $ pytest tests/test_midi_processor.py
+"""
+
+import numpy as np
+import pytest
+from midi_processor import MIDIProcessor, windows_from_ids
+
+MELODIES = [
+    [60, 62, 64, [60, 64, 67]],
+    [67, 65, [62, 65, 69], 64, 62],
+    [[57, 60, 64], 69, 71, 72],
+    [72, 71, 69, 67, 65, 64],
+]
+
+@pytest.fixture
+def midi_paths(write_midi):
+    return [write_midi(f"{index:02d}.mid", melody) for index, melody in enumerate(MELODIES)]
+
+def test_parse_files_in_parallel_matches_serial(midi_paths):
+    """
+    Test that worker processes return the same notes as a serial parse, in the order of the paths.
+    """
+    serial, serial_errors = MIDIProcessor(workers=1).parse_files(midi_paths)
+    parallel, parallel_errors = MIDIProcessor(workers=3).parse_files(midi_paths)
+
+    assert parallel == serial
+    assert serial[0] == ['C4', 'D4', 'E4', '0.4.7']
+    assert [len(notes) for notes in parallel] == [len(melody) for melody in MELODIES]
+    assert serial_errors == parallel_errors == {}
+
+def test_parse_files_reports_bad_files(midi_paths, tmp_path):
+    """
+    Test that a file that fails to parse is reported without stopping the other workers.
+    """
+    bad_path = str(tmp_path / "bad.mid")
+    with open(bad_path, 'wb') as f:
+        f.write(b"not a MIDI file")
+
+    processor = MIDIProcessor(workers=2)
+    results, errors = processor.parse_files([midi_paths[0], bad_path, midi_paths[1]])
+
+    assert results[1] is None
+    assert list(errors) == [bad_path]
+    assert results[0] == ['C4', 'D4', 'E4', '0.4.7']
+    assert len(results[2]) == len(MELODIES[1])
+    assert set(processor.parse_times) == {midi_paths[0], bad_path, midi_paths[1]}
+
+def test_prepare_windows_matches_prepare_sequences():
+    """
+    Test that the strided windows hold the same samples as the copied sequences, without copying.
+    """
+    notes = ['C4', 'E4', '0.4.7', 'G4', 'C4', 'E4', 'B3', '0.4.7', 'G4', 'D4'] * 3
+    processor = MIDIProcessor(workers=1)
+    sequences, one_hot, pitchnames, note_to_int = processor.prepare_sequences(notes, 8)
+    windows, targets, window_pitchnames, window_note_to_int = processor.prepare_windows(notes, 8, np.float64)
+
+    assert window_pitchnames == pitchnames and window_note_to_int == note_to_int
+    np.testing.assert_array_equal(windows, sequences)
+    np.testing.assert_array_equal(targets, one_hot.argmax(axis=1))
+    assert not windows.flags.writeable
+    # Consecutive windows overlap in memory, so they are views of one array
+    assert np.shares_memory(windows[0], windows[1])
+
+def test_windows_from_ids_keeps_integer_ids():
+    """
+    Test that integer windows hold the raw ids, and that each window is followed by its target.
+    """
+    ids = np.arange(12, dtype=np.int32)
+    windows, targets = windows_from_ids(ids, 12, 4, np.int16)
+
+    assert windows.shape == (8, 4, 1) and windows.dtype == np.int16
+    np.testing.assert_array_equal(windows[3, :, 0], [3, 4, 5, 6])
+    np.testing.assert_array_equal(targets, ids[4:])
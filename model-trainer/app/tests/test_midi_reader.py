@@ -0,0 +1,53 @@
+"""
+This module contains parity tests of the native MIDI extractor against music21.
+
+The files are from the committed v5_various corpus; the native extractor must
+produce exactly music21's tokens for them.
+
+Usage:
+    Run these tests using pytest from the model-trainer/app directory:
+    $ pytest tests/test_midi_reader.py
+"""
+
+import os
+import pytest
+from midi_processor import EXTRACTORS
+from midi_reader import NATIVE_PARSER_VERSION, check_parity
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "..", "models", "training_data", "v5_various")
+REQUIREMENTS = os.path.join(os.path.dirname(__file__), "..", "..", "requirements.txt")
+
+PARITY_FILES = [
+    "001 - The Morning Breaks.mid",
+    "008 - Awake and Arise.mid",
+    "027 - Praise to the Man.mid",
+    "034 - O Ye Mountains High.mid",
+]
+
+@pytest.fixture(scope="module")
+def midi_paths():
+    paths = [os.path.join(CORPUS_DIR, name) for name in PARITY_FILES]
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        pytest.skip(f"Corpus files not available: {missing}")
+    return paths
+
+def test_native_extractor_matches_music21(midi_paths):
+    """
+    Test that the native extractor reproduces music21's tokens exactly.
+    """
+    totals = check_parity(midi_paths)
+
+    assert totals['files'] == len(midi_paths)
+    assert totals['exact_files'] == len(midi_paths)
+    assert totals['native_tokens'] == totals['reference_tokens']
+
+def test_native_parser_version_names_pinned_music21():
+    """
+    Test that the native extractor's cache version names the music21 version it emulates, the pinned one.
+    """
+    with open(REQUIREMENTS) as f:
+        pins = dict(line.strip().split("==") for line in f if "==" in line)
+
+    assert f"music21-{pins['music21']}" in NATIVE_PARSER_VERSION
+    assert EXTRACTORS['native'][1] == NATIVE_PARSER_VERSION
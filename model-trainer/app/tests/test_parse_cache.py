@@ -0,0 +1,79 @@
+"""
+This module contains tests of the content-hash keyed parse cache.
+
+Usage:
+    Run these tests using pytest from the model-trainer/app directory:
+    $ pytest tests/test_parse_cache.py
+"""
+
+import os
+import shutil
+import midi_processor
+from midi_processor import MIDIProcessor
+from parse_cache import ParseCache
+
+def test_key_follows_content_and_parser_version(write_midi, tmp_path):
+    """
+    Test that the key survives renaming a file but changes with its content or the parser version.
+    """
+    path = write_midi("song.mid", [60, 62, 64])
+    renamed = str(tmp_path / "renamed.mid")
+    shutil.copy(path, renamed)
+    changed = write_midi("changed.mid", [60, 62, 65])
+    cache = ParseCache(str(tmp_path / "cache"), "parser-1")
+
+    assert cache.key(renamed) == cache.key(path)
+    assert cache.key(changed) != cache.key(path)
+    assert ParseCache(str(tmp_path / "cache"), "parser-2").key(path) != cache.key(path)
+
+def test_entries_round_trip_and_reject_corruption(tmp_path):
+    """
+    Test that stored tokens are read back as they were, and that a damaged entry counts as a miss.
+    """
+    cache = ParseCache(str(tmp_path / "cache"), "parser-1")
+    key = "ab" + "0" * 62
+    assert cache.get(key) is None
+
+    cache.put(key, ['C4', '0.4.7', 'E-5'])
+    cache.put("cd" + "0" * 62, [])
+    assert cache.get(key) == ['C4', '0.4.7', 'E-5']
+    assert cache.get("cd" + "0" * 62) == []
+
+    entry_path = os.path.join(cache.cache_dir, key[:2], f"{key}.tok")
+    with open(entry_path, 'r+b') as f:
+        f.truncate(os.path.getsize(entry_path) - 3)
+    assert cache.get(key) is None
+
+def test_parse_files_only_parses_new_files(write_midi, tmp_path, monkeypatch):
+    """
+    Test that a second run reads unchanged files from the cache and parses only the new one.
+    """
+    cache_dir = str(tmp_path / "cache")
+    paths = [write_midi("a.mid", [60, 64, 67]), write_midi("b.mid", [[60, 64, 67], 72])]
+    first, _ = MIDIProcessor(workers=1, cache_dir=cache_dir).parse_files(paths)
+
+    paths.append(write_midi("c.mid", [55, 57]))
+    parsed = []
+    parse_file = midi_processor._parse_file
+
+    def counting_parse(midi_path, extractor):
+        parsed.append(midi_path)
+        return parse_file(midi_path, extractor)
+
+    monkeypatch.setattr(midi_processor, '_parse_file', counting_parse)
+    second, errors = MIDIProcessor(workers=1, cache_dir=cache_dir).parse_files(paths)
+
+    assert parsed == [paths[2]]
+    assert second[:2] == first
+    assert second[2] == ['G3', 'A3']
+    assert errors == {}
+
+def test_parse_files_reports_unreadable_files(write_midi, tmp_path):
+    """
+    Test that a file that can't be read for its cache key is reported as an error, and the others are parsed.
+    """
+    paths = [write_midi("a.mid", [60, 64]), str(tmp_path / "missing.mid"), write_midi("b.mid", [67])]
+    results, errors = MIDIProcessor(workers=1, cache_dir=str(tmp_path / "cache")).parse_files(paths)
+
+    assert results == [['C4', 'E4'], None, ['G4']]
+    assert list(errors) == [paths[1]]
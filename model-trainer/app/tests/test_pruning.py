@@ -0,0 +1,79 @@
+"""
+This module contains tests of pruning trained models and exporting their sparse weights.
+
+Usage:
+    Run these tests using pytest from the model-trainer/app directory:
+    $ pytest tests/test_pruning.py
+"""
+
+import json
+import numpy as np
+import pytest
+import tensorflow as tf
+from midi_processor import windows_from_ids
+from model_builder import ModelBuilder
+from pruning import export_sparse, prune_model, prune_units, weight_sparsity
+
+N_VOCAB = 9
+SEQUENCE_LENGTH = 5
+
+@pytest.fixture(scope="module")
+def trained_model():
+    """Build a small model of the trainer's architecture, with windows and targets."""
+    tf.keras.utils.set_random_seed(0)
+    ids = np.random.default_rng(0).integers(0, N_VOCAB, 200)
+    network_input, targets = windows_from_ids(ids, N_VOCAB, SEQUENCE_LENGTH)
+    model = ModelBuilder().create_model(network_input, N_VOCAB, sparse_targets=True, units=16)
+    return model, network_input, targets
+
+def test_prune_units_shrinks_every_hidden_layer(trained_model):
+    """
+    Test that unit pruning halves each hidden layer, keeps the output, and removes nothing at zero sparsity.
+    """
+    model, network_input, _ = trained_model
+    windows = np.asarray(network_input, dtype=np.float32)
+
+    pruned = prune_units(model, 0.5)
+    units = [layer.units for layer in pruned.layers if hasattr(layer, 'units')]
+    assert units == [8, 8, 8, 128, N_VOCAB]
+    assert pruned.predict(windows, verbose=0).shape == (len(windows), N_VOCAB)
+
+    unpruned = prune_units(model, 0.0)
+    np.testing.assert_allclose(unpruned.predict(windows, verbose=0), model.predict(windows, verbose=0),
+                               rtol=1e-5, atol=1e-6)
+
+def test_weight_pruning_reaches_the_target_sparsity(trained_model):
+    """
+    Test that magnitude pruning zeroes the target share of weights and leaves the original model alone.
+    """
+    model, network_input, targets = trained_model
+    pruned = prune_model(model, network_input, targets, 0.7, structure='weights', epochs=2, batch_size=32,
+                         shuffle_seed=0)
+
+    assert weight_sparsity(pruned) == pytest.approx(0.7, abs=0.01)
+    assert weight_sparsity(model) < 0.01
+    with pytest.raises(ValueError, match="structure"):
+        prune_model(model, network_input, targets, 0.5, structure='rows')
+
+def test_export_sparse_stores_the_kernels_as_csr(trained_model, tmp_path):
+    """
+    Test that the exported CSR matrices hold exactly the pruned kernels, transposed.
+    """
+    model, network_input, targets = trained_model
+    pruned = prune_model(model, network_input, targets, 0.5, structure='weights', epochs=0)
+    path = str(tmp_path / "model.sparse.npz")
+    export_sparse(pruned, path)
+
+    with np.load(path) as data:
+        layers = json.loads(str(data['layers']))
+        assert [layer['type'] for layer in layers] == ['LSTM', 'LSTM', 'LSTM', 'Dense', 'Dense']
+        assert layers[-1]['activation'] == 'softmax'
+        # The second LSTM's kernel, whose smallest half was zeroed
+        kernel = pruned.layers[2].get_weights()[0]
+        indptr, indices = data['layer1_kernel_indptr'], data['layer1_kernel_indices']
+        dense = np.zeros(tuple(data['layer1_kernel_shape']), dtype=np.float32)
+        for row in range(len(indptr) - 1):
+            dense[row, indices[indptr[row]:indptr[row + 1]]] = data['layer1_kernel_data'][indptr[row]:indptr[row + 1]]
+        np.testing.assert_array_equal(dense, kernel.T)
+        assert len(data['layer1_kernel_data']) == np.count_nonzero(kernel) <= kernel.size // 2
+        np.testing.assert_array_equal(data['layer3_bias'], pruned.layers[5].get_weights()[1])
@@ -0,0 +1,63 @@
+"""
+This module contains tests of comparing quantized TFLite exports with the float model.
+
+Usage:
+    Run these tests using pytest from the model-trainer/app directory:
+    $ pytest tests/test_quantization.py
+"""
+
+import numpy as np
+import pytest
+from model_builder import ModelBuilder
+from quantization import compare_quantized, convert
+
+N_VOCAB = 12
+SEQUENCE_LENGTH = 6
+PREDICT_TOKENS = 3
+
+@pytest.fixture(scope="module")
+def multi_head_model():
+    """
+    Build a small model with three prediction heads, and windows to compare it on.
+
+    Returns:
+        tuple: The Keras model, its windows and their next-note ids.
+    """
+    rng = np.random.default_rng(0)
+    network_input = rng.integers(0, N_VOCAB, (32, SEQUENCE_LENGTH, 1)) / N_VOCAB
+    model = ModelBuilder().create_model(network_input, N_VOCAB, sparse_targets=True, units=8,
+                                        predict_tokens=PREDICT_TOKENS)
+    return model, network_input, rng.integers(0, N_VOCAB, len(network_input))
+
+def test_compare_quantized_multi_head(multi_head_model):
+    """
+    Test that a multi-head model is compared per head, with accuracy taken from the next-note head.
+    """
+    model, network_input, targets = multi_head_model
+    metrics = compare_quantized(model, convert(model, 'float32'), network_input, targets, samples=len(network_input))
+
+    float_probs = model.predict(network_input.astype(np.float32), verbose=0)
+    assert float_probs.shape == (len(network_input), PREDICT_TOKENS, N_VOCAB)
+    assert metrics['samples'] == len(network_input)
+    assert metrics['top1_agreement'] == 1.0
+    assert 0.0 <= metrics['kl_divergence'] < 1e-4
+    assert metrics['float_accuracy'] == round(float(np.mean(float_probs[:, 0].argmax(axis=-1) == targets)), 4)
+    assert metrics['quantized_accuracy'] == metrics['float_accuracy']
+
+def test_compare_quantized_detects_head_drift(multi_head_model):
+    """
+    Test that agreement drops when the export disagrees with the float model on a later head only.
+    """
+    from tensorflow import keras
+
+    model, network_input, _ = multi_head_model
+    drifted = keras.models.clone_model(model)
+    weights = model.get_weights()
+    # Shift the last head's biases so its top prediction changes while the first head stays the same
+    bias = weights[-1].copy().reshape(PREDICT_TOKENS, N_VOCAB)
+    bias[-1] = np.roll(bias[-1], 1) + np.eye(N_VOCAB)[0] * 100
+    drifted.set_weights(weights[:-1] + [bias.reshape(-1)])
+
+    metrics = compare_quantized(model, convert(drifted, 'float32'), network_input, samples=len(network_input))
+    assert metrics['top1_agreement'] < 1.0
+    assert metrics['kl_divergence'] > 0.1
@@ -0,0 +1,110 @@
+"""
+This module contains tests of the hyperparameter sweep runner.
+
+Usage:
+    Run these tests using pytest from the model-trainer/app directory:
+    $ pytest tests/test_sweep.py
+"""
+
+import json
+import os
+import numpy as np
+import pytest
+from sweep import MedianPruner, expand_space, leaderboard
+
+class FakeModel:
+    """Stands in for the Keras model a pruner stops."""
+    stop_training = False
+
+def write_history(trials_dir, trial_id, val_losses):
+    """Write a peer trial's per-epoch history, as its MedianPruner would have."""
+    with open(trials_dir / f"{trial_id}.jsonl", 'w') as f:
+        for epoch, val_loss in enumerate(val_losses, 1):
+            f.write(json.dumps({'epoch': epoch, 'loss': val_loss, 'val_loss': val_loss}) + '\n')
+
+def test_expand_space_lists_or_samples_the_grid():
+    """
+    Test that the grid holds every combination, that sampling is repeatable, and that unknown settings are rejected.
+    """
+    space = {'LSTM_UNITS': [128, 256], 'DROPOUT': [0.1, 0.2, 0.3]}
+    trials = expand_space(space)
+
+    assert len(trials) == 6
+    assert {'DROPOUT': 0.2, 'LSTM_UNITS': 256} in trials
+    assert expand_space(space, max_trials=3, seed=1) == expand_space(space, max_trials=3, seed=1)
+    assert len(expand_space(space, max_trials=3, seed=1)) == 3
+    with pytest.raises(ValueError, match="EPOCHS"):
+        expand_space({'EPOCHS': [1, 2]})
+
+def test_median_pruner_stops_trials_above_the_median(tmp_path):
+    """
+    Test that a trial worse than its peers' median stops once it has run min_epochs, and a better one continues.
+    """
+    write_history(tmp_path, 'peer-1', [2.0, 1.5, 1.2])
+    write_history(tmp_path, 'peer-2', [2.2, 1.7, 1.4])
+    write_history(tmp_path, 'peer-3', [2.1, 1.6, 1.3])
+
+    worse = MedianPruner(str(tmp_path), 'worse', min_epochs=2)
+    worse.set_model(FakeModel())
+    for epoch, val_loss in enumerate([3.0, 2.0]):
+        worse.on_epoch_begin(epoch)
+        worse.on_epoch_end(epoch, {'loss': val_loss, 'val_loss': val_loss})
+        # Nothing is pruned before min_epochs, however bad
+        assert worse.model.stop_training == (epoch == 1)
+    assert worse.pruned_at == 2
+
+    better = MedianPruner(str(tmp_path), 'better', min_epochs=2)
+    better.set_model(FakeModel())
+    for epoch, val_loss in enumerate([2.0, 1.55]):
+        better.on_epoch_begin(epoch)
+        better.on_epoch_end(epoch, {'loss': val_loss, 'val_loss': val_loss})
+    assert better.pruned_at is None and not better.model.stop_training
+    assert len((tmp_path / "better.jsonl").read_text().splitlines()) == 2
+
+def test_leaderboard_ranks_and_marks_the_frontier():
+    """
+    Test that trials rank by validation loss, pruned ones last, and the frontier holds the undominated trials.
+    """
+    def result(trial, val_loss, step_ms, epoch_s, status='complete'):
+        return {'trial': trial, 'params': {}, 'status': status, 'val_loss': val_loss, 'step_ms': step_ms,
+                'epoch_s': epoch_s, 'epochs': 3}
+
+    ranked = leaderboard([result('big', 1.0, 9.0, 30.0), result('small', 1.4, 2.0, 10.0),
+                          result('slow', 1.5, 8.0, 40.0), result('pruned', 0.9, 1.0, 5.0, 'pruned')])
+
+    assert [r['trial'] for r in ranked] == ['big', 'small', 'slow', 'pruned']
+    assert [r['frontier'] for r in ranked] == [True, True, False, False]
+    assert [r['training_frontier'] for r in ranked] == [True, True, False, False]
+
+def test_run_sweep_skips_sequences_longer_than_the_validation_split(tmp_path, monkeypatch):
+    """
+    Test that trials whose windows can't fit the validation tokens are skipped before they take a worker.
+    """
+    import sweep
+
+    def prepare_tokens(corpus, sweep_dir, config):
+        tokens_path = os.path.join(sweep_dir, 'tokens.npy')
+        np.save(tokens_path, np.arange(200) % 7)
+        return tokens_path
+
+    launched = []
+
+    def run_pinned(command, cores, log_path):
+        trial_id = command[command.index('--trial') + 1]
+        launched.append(trial_id)
+        with open(os.path.join(str(tmp_path), 'trials', f"{trial_id}.params.json")) as f:
+            params = json.load(f)
+        with open(os.path.join(str(tmp_path), 'trials', f"{trial_id}.json"), 'w') as f:
+            json.dump({'trial': trial_id, 'params': params, 'status': 'complete', 'val_loss': 1.0,
+                       'step_ms': 1.0, 'epoch_s': 1.0, 'epochs': 1}, f)
+        return 0
+
+    monkeypatch.setattr(sweep, 'prepare_tokens', prepare_tokens)
+    monkeypatch.setattr(sweep, 'run_pinned', run_pinned)
+    # 20 of the 200 tokens are held out, which leaves room for windows of up to 19
+    ranked = sweep.run_sweep('corpus', {'SEQUENCE_LENGTH': [8, 19, 20, 64]}, str(tmp_path))
+
+    assert sorted(r['params']['SEQUENCE_LENGTH'] for r in ranked) == [8, 19]
+    assert len(launched) == 2
+    with pytest.raises(ValueError, match="at most 19"):
+        sweep.run_sweep('corpus', {'SEQUENCE_LENGTH': [32]}, str(tmp_path))
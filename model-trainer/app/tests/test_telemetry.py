@@ -0,0 +1,45 @@
+"""
+This module contains tests of the training throughput telemetry.
+
+Usage:
+    Run these tests using pytest from the model-trainer/app directory:
+    $ pytest tests/test_telemetry.py
+"""
+
+import json
+import numpy as np
+import tensorflow as tf
+from telemetry import TrainingTelemetry, benchmark_input
+
+def test_telemetry_records_each_epoch(tmp_path):
+    """
+    Test that a run writes a start record, one record per epoch and a summary that names the bottleneck.
+    """
+    x, y = np.ones((64, 3), dtype=np.float32), np.zeros((64, 1), dtype=np.float32)
+    dataset = tf.data.Dataset.from_tensor_slices((x, y)).batch(8).repeat()
+    model = tf.keras.Sequential([tf.keras.layers.Dense(1, input_shape=(3,))])
+    model.compile(loss='mse', optimizer='sgd')
+    path = str(tmp_path / "telemetry" / "model.jsonl")
+    input_ms = benchmark_input(dataset, batches=5)
+
+    telemetry = TrainingTelemetry(path, 64, 8, input_ms_per_batch=input_ms)
+    model.fit(dataset, epochs=3, steps_per_epoch=8, callbacks=[telemetry], verbose=0)
+
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    assert [record['event'] for record in records] == ['train_begin', 'epoch', 'epoch', 'epoch', 'train_end']
+    assert records[0]['input_ms_per_batch'] == input_ms and records[0]['steps_per_epoch'] == 8
+    for epoch, record in enumerate(records[1:4], start=1):
+        assert record['epoch'] == epoch and record['steps'] == 8
+        assert record['samples_per_sec'] > 0
+        assert record['step_ms']['p50'] <= record['step_ms']['p99']
+        assert 'loss' in record['logs']
+    assert records[-1]['bound'] in ('input', 'compute')
+
+def test_benchmark_input_needs_enough_batches():
+    """
+    Test that a dataset too short to time gives no benchmark.
+    """
+    dataset = tf.data.Dataset.range(3).batch(1)
+    assert benchmark_input(dataset, batches=5) is None
+    assert benchmark_input(dataset, batches=2) >= 0.0
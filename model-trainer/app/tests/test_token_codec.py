@@ -0,0 +1,98 @@
+"""
+This module contains tests of the integer token codes used to transpose and index corpora.
+
+Usage:
+    Run these tests using pytest from the model-trainer/app directory:
+    $ pytest tests/test_token_codec.py
+"""
+
+import numpy as np
+import pytest
+from midi_processor import MIDIProcessor
+from music21 import chord
+from token_codec import CHORD_BASE, decode_tokens, encode_tokens, prune_codes, replace_unknown, transpose_codes
+
+def music21_token(pitch_classes):
+    """Return the token music21 gives a chord of these pitch classes."""
+    return '.'.join(str(pc) for pc in chord.Chord(sorted(pitch_classes)).normalOrder)
+
+def test_encode_decode_round_trip():
+    """
+    Test that canonical tokens survive encoding, and other spellings decode to the canonical one.
+    """
+    tokens = ['C4', 'C#4', 'E-5', '0.4.7', '11.2.6', 'B-2']
+    assert decode_tokens(encode_tokens(tokens)) == tokens
+    assert decode_tokens(encode_tokens(['D-4', 'B#3', 'E', '7.0.4'])) == ['C#4', 'C4', 'E4', '0.4.7']
+    with pytest.raises(ValueError):
+        encode_tokens(['H4'])
+
+def test_transpose_codes_matches_music21_normal_order():
+    """
+    Test that every chord is transposed to the token music21 gives the transposed chord.
+    """
+    masks = np.arange(1, 4096)
+    codes = CHORD_BASE + masks
+    for semitones in (-5, 1, 7):
+        transposed = decode_tokens(transpose_codes(codes, semitones))
+        for mask, token in zip(masks[::37], transposed[::37]):
+            pitch_classes = [(pc + semitones) % 12 for pc in range(12) if mask >> pc & 1]
+            assert token == music21_token(pitch_classes)
+
+def test_transpose_codes_keeps_notes_in_midi_range():
+    """
+    Test that notes move by the interval, and by whole octaves back into the MIDI range at its ends.
+    """
+    codes = encode_tokens(['C4', 'C#0', 'G9', 'C-1'])
+    # Notes in octave -1 are spelled like music21 does, e.g. 'B--1' for the B-flat below C0
+    assert decode_tokens(transpose_codes(codes, 2)) == ['D4', 'E-0', 'A8', 'D-1']
+    assert decode_tokens(transpose_codes(codes, 3)) == ['E-4', 'E0', 'B-8', 'E--1']
+    assert decode_tokens(transpose_codes(codes, -2)) == ['B-3', 'B-1', 'F9', 'B--1']
+
+def test_augment_data_appends_transposed_copies():
+    """
+    Test that augmentation appends one transposed copy of the corpus per transposition.
+    """
+    notes = ['C4', '0.4.7', 'E4']
+    processor = MIDIProcessor(workers=1)
+    augmented = processor.augment_data(notes, transpositions=[2, -1])
+
+    assert augmented == notes + ['D4', '2.6.9', 'F#4'] + ['B3', '11.3.6', 'E-4']
+    assert processor.applied_transpositions == [2, -1]
+    seeded = [MIDIProcessor(workers=1, seed=3).augment_data(notes, num_augmentations=2) for _ in range(2)]
+    assert seeded[0] == seeded[1] and len(seeded[0]) == 3 * len(notes)
+
+def test_replace_unknown_uses_the_nearest_known_token():
+    """
+    Test that tokens outside a vocabulary become its nearest note or chord, matched by exact name.
+    """
+    pitchnames = ['C4', 'G4', '0.4.7', 'D#4']
+    codes = encode_tokens(['C4', 'D4', 'A4', '0.3.7', 'E-4', 'G4'])
+    replaced, count = replace_unknown(codes, pitchnames)
+
+    # 'D#4' is another spelling of 'E-4', which the vocabulary doesn't have by name, so 'E-4' becomes the nearer 'C4'
+    assert decode_tokens(replaced) == ['C4', 'C4', 'G4', '0.4.7', 'C4', 'G4']
+    assert count == 4
+    unchanged, count = replace_unknown(encode_tokens(['C4', 'G4']), pitchnames)
+    assert decode_tokens(unchanged) == ['C4', 'G4'] and count == 0
+
+def test_prune_vocabulary_maps_rare_tokens_to_frequent_ones():
+    """
+    Test that rare tokens are replaced with their nearest frequent note or chord, and the report counts them.
+    """
+    notes = ['C4'] * 4 + ['E4'] * 3 + ['0.4.7'] * 2 + ['0.3.7', 'D4', 'C#4', '4.7.10.0']
+    pruned, remap_table, report = MIDIProcessor(workers=1).prune_vocabulary(notes, min_count=2)
+
+    # 'D4' is as near to 'E4' as to 'C4', and goes to the more frequent 'C4'
+    assert remap_table == {'0.3.7': '0.4.7', 'D4': 'C4', 'C#4': 'C4', '4.7.10.0': '0.4.7'}
+    assert pruned == [remap_table.get(token, token) for token in notes]
+    assert report['vocab_before'] == 7 and report['vocab_after'] == 3
+    assert report['coverage'] == round(9 / 13, 4)
+
+def test_prune_codes_keeps_tokens_without_a_frequent_neighbour():
+    """
+    Test that a rare code is kept when no frequent code of its kind exists, and frequent codes map to themselves.
+    """
+    codes = encode_tokens(['C4', 'C4', '0.4.7'])
+    remap = prune_codes(codes, 2)
+    np.testing.assert_array_equal(remap[codes], codes)
+    assert (prune_codes(codes, 1) == np.arange(len(remap))).all()
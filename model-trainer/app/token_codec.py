@@ -0,0 +1,263 @@
+import numpy as np
+from midi_reader import normal_order, pitch_name
+
+# Token codes: 0-127 are single notes by MIDI number, CHORD_BASE + mask are
+# chords by the bit mask of their pitch classes
+NUM_PITCHES = 128
+CHORD_BASE = NUM_PITCHES
+NUM_CODES = CHORD_BASE + 4096
+
+# Letter names to pitch classes, for parsing note tokens
+_LETTER_PITCH_CLASSES = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+
+def _build_names():
+    """Return the token of every code, with None for the empty chord."""
+    names = np.empty(NUM_CODES, dtype=object)
+    for midi_pitch in range(NUM_PITCHES):
+        names[midi_pitch] = pitch_name(midi_pitch)
+    for mask in range(1, 4096):
+        names[CHORD_BASE + mask] = '.'.join(str(pc) for pc in normal_order(pc for pc in range(12) if mask >> pc & 1))
+    return names
+
+def _build_rotations():
+    """Return a (12, 4096) table of each pitch-class mask transposed by 0-11 semitones."""
+    masks = np.arange(4096, dtype=np.int32)
+    rotations = np.empty((12, 4096), dtype=np.int32)
+    for semitones in range(12):
+        rotations[semitones] = ((masks << semitones) | (masks >> (12 - semitones))) & 0xFFF
+    return rotations
+
+CODE_NAMES = _build_names()
+_ROTATIONS = _build_rotations()
+_CODES_BY_NAME = {name: code for code, name in enumerate(CODE_NAMES) if name is not None}
+
+def _parse_token(token):
+    """
+    Return the code of a token that isn't in canonical form.
+
+    Handles note names with other spellings (e.g. 'D-4', 'B#3', or no octave,
+    which music21 treats as octave 4) and chords whose pitch classes are not in
+    normal order.
+    """
+    if '.' in token or token.isdigit():
+        mask = 0
+        for pc in token.split('.'):
+            if pc.strip():
+                mask |= 1 << (int(pc) % 12)
+        if not mask:
+            raise ValueError(f"Empty chord token '{token}'")
+        return CHORD_BASE + mask
+
+    letter = token[:1].upper()
+    if letter not in _LETTER_PITCH_CLASSES:
+        raise ValueError(f"Unrecognised note token '{token}'")
+    rest = token[1:]
+    alter = 0
+    while rest[:1] in ('#', '-'):
+        alter += 1 if rest[0] == '#' else -1
+        rest = rest[1:]
+    octave = int(rest) if rest else 4
+    midi_pitch = (octave + 1) * 12 + _LETTER_PITCH_CLASSES[letter] + alter
+    if not 0 <= midi_pitch < NUM_PITCHES:
+        raise ValueError(f"Note token '{token}' is outside the MIDI range")
+    return midi_pitch
+
+def encode_tokens(tokens):
+    """
+    Convert note and chord tokens to integer codes.
+
+    Each distinct token is only parsed once, so this costs one dict lookup per note.
+
+    Args:
+        tokens (list): Note tokens (e.g. 'C#4') and chord tokens (e.g. '0.4.7').
+
+    Returns:
+        np.ndarray: The int32 code of each token.
+
+    Raises:
+        ValueError: If a token is neither a note name nor a chord.
+    """
+    lookup = {token: _CODES_BY_NAME.get(token) for token in set(tokens)}
+    for token, code in lookup.items():
+        if code is None:
+            lookup[token] = _parse_token(token)
+    return np.fromiter((lookup[token] for token in tokens), dtype=np.int32, count=len(tokens))
+
+def decode_tokens(codes):
+    """
+    Convert integer codes back to their tokens.
+
+    Args:
+        codes (np.ndarray): Token codes.
+
+    Returns:
+        list: The canonical token of each code.
+    """
+    return CODE_NAMES[codes].tolist()
+
+def transpose_codes(codes, semitones):
+    """
+    Transpose token codes by a number of semitones.
+
+    Notes move by the interval. Notes that would leave the MIDI range are
+    moved back into it by whole octaves. Chords are transposed by rotating
+    their pitch-class mask, which keeps their tokens in normal order.
+
+    Args:
+        codes (np.ndarray): Token codes.
+        semitones (int): The interval to transpose by, in semitones.
+
+    Returns:
+        np.ndarray: The transposed codes.
+    """
+    is_note = codes < CHORD_BASE
+    notes = codes + semitones
+    notes = np.where(notes < 0, notes % 12, notes)
+    notes = np.where(notes >= NUM_PITCHES, notes - 12 * ((notes - NUM_PITCHES) // 12 + 1), notes)
+    chords = CHORD_BASE + _ROTATIONS[semitones % 12][np.where(is_note, 0, codes - CHORD_BASE)]
+    return np.where(is_note, notes, chords).astype(np.int32)
+
+def vocabulary_index(pitchnames):
+    """
+    Map every code to its id in a vocabulary.
+
+    Tokens are matched by their exact name, as the string pipeline matched
+    them. Vocabularies of models trained before token codes can hold other
+    spellings, such as 'D#4' next to 'E-4', or letter-named chords; each
+    canonical token keeps its own id, and the other names, which the
+    extractors never produce, are never used.
+
+    Args:
+        pitchnames (list): The vocabulary.
+
+    Returns:
+        np.ndarray: The int32 id of every code, -1 for codes whose token isn't in the vocabulary.
+    """
+    index = np.full(NUM_CODES, -1, dtype=np.int32)
+    for number, name in enumerate(pitchnames):
+        code = _CODES_BY_NAME.get(name)
+        if code is not None and index[code] < 0:
+            index[code] = number
+    return index
+
+def vocabulary(codes, pitchnames=None):
+    """
+    Build the sorted vocabulary of a code array and map the codes to its indices.
+
+    The vocabulary is sorted by token, the same ordering as sorted(set(tokens)),
+    so the integer ids match those of the string pipeline and of saved models.
+
+    Args:
+        codes (np.ndarray): Token codes.
+        pitchnames (list, optional): An existing vocabulary to map the codes into,
+            such as a trained model's, instead of building one.
+
+    Returns:
+        tuple: The list of tokens and the int32 vocabulary id of each code,
+        which is -1 for codes whose token isn't in the given vocabulary.
+    """
+    if pitchnames is None:
+        pitchnames = sorted(CODE_NAMES[np.unique(codes)].tolist())
+    return list(pitchnames), vocabulary_index(pitchnames)[codes]
+
+def replace_unknown(codes, pitchnames):
+    """
+    Replace the codes whose token isn't in a vocabulary with the nearest token that is.
+
+    Leaving them out instead would join the notes on either side into a
+    sequence that never occurred. Notes and chords are replaced as in
+    prune_codes; a code with nothing of its kind in the vocabulary becomes
+    the vocabulary's token that is most frequent in the codes.
+
+    Args:
+        codes (np.ndarray): Token codes.
+        pitchnames (list): The vocabulary.
+
+    Returns:
+        tuple: The codes with unknown ones replaced, and how many were replaced.
+
+    Raises:
+        ValueError: If none of the vocabulary's tokens is a note or chord token.
+    """
+    index = vocabulary_index(pitchnames)
+    known = np.flatnonzero(index >= 0).astype(np.int32)
+    if not len(known):
+        raise ValueError("None of the vocabulary's tokens is a note or chord token")
+    unknown = index[codes] < 0
+    if not unknown.any():
+        return codes, 0
+
+    counts = np.bincount(codes, minlength=NUM_CODES)
+    missing = np.unique(codes[unknown])
+    nearest = _nearest_codes(missing, known, counts)
+    nearest[nearest < 0] = known[np.argmax(counts[known])]
+    remap = np.arange(NUM_CODES, dtype=np.int32)
+    remap[missing] = nearest
+    return remap[codes], int(np.count_nonzero(unknown))
+
+# Number of pitch classes in every chord mask
+_MASK_SIZES = np.array([bin(mask).count('1') for mask in range(4096)], dtype=np.int32)
+
+def _nearest_codes(sources, targets, counts):
+    """
+    Find the nearest target code of the same kind for each source code.
+
+    A note's nearest is the closest note by pitch; a chord's is the chord
+    whose pitch classes differ from it in the fewest places, then the one
+    sharing the most. Remaining ties go to the more frequent target.
+
+    Args:
+        sources (np.ndarray): Codes to map.
+        targets (np.ndarray): Codes they may map to.
+        counts (np.ndarray): How often every code occurs, for breaking ties.
+
+    Returns:
+        np.ndarray: The nearest target of each source, -1 if there is no target of its kind.
+    """
+    nearest = np.full(len(sources), -1, dtype=np.int32)
+    is_note = sources < CHORD_BASE
+
+    target_notes = targets[targets < CHORD_BASE]
+    source_notes = sources[is_note]
+    if len(target_notes) and len(source_notes):
+        distance = np.abs(source_notes[:, np.newaxis] - target_notes[np.newaxis, :])
+        # Nearest first, then most frequent; lexsort sorts by its last key first
+        order = np.lexsort((-counts[target_notes][np.newaxis, :].repeat(len(source_notes), 0), distance), axis=1)
+        nearest[is_note] = target_notes[order[:, 0]]
+
+    target_masks = targets[targets >= CHORD_BASE] - CHORD_BASE
+    source_masks = sources[~is_note] - CHORD_BASE
+    if len(target_masks) and len(source_masks):
+        differing = _MASK_SIZES[source_masks[:, np.newaxis] ^ target_masks[np.newaxis, :]]
+        shared = _MASK_SIZES[source_masks[:, np.newaxis] & target_masks[np.newaxis, :]]
+        frequency = counts[CHORD_BASE + target_masks][np.newaxis, :].repeat(len(source_masks), 0)
+        order = np.lexsort((-frequency, -shared, differing), axis=1)
+        nearest[~is_note] = CHORD_BASE + target_masks[order[:, 0]]
+    return nearest
+
+def prune_codes(codes, min_count):
+    """
+    Map every code that occurs fewer than min_count times to its nearest frequent code.
+
+    A rare chord becomes the frequent chord whose pitch classes differ from
+    it in the fewest places, preferring the one that shares the most pitch
+    classes and then the most frequent. A rare note becomes the nearest
+    frequent note, preferring the more frequent if two are equally near.
+    Codes with no frequent code of their kind are kept.
+
+    Args:
+        codes (np.ndarray): Token codes.
+        min_count (int): How often a code has to occur to be kept.
+
+    Returns:
+        np.ndarray: A table of length NUM_CODES mapping each code to the code
+        that replaces it, which is the code itself unless it is rare.
+    """
+    counts = np.bincount(codes, minlength=NUM_CODES)
+    remap = np.arange(NUM_CODES, dtype=np.int32)
+    present = np.flatnonzero(counts)
+    frequent = present[counts[present] >= min_count]
+    rare = present[counts[present] < min_count]
+    nearest = _nearest_codes(rare, frequent, counts)
+    remap[rare] = np.where(nearest >= 0, nearest, rare)
+    return remap
@@ -22,6 +22,42 @@ def setup_gpu():
     else:
         print("No GPUs found. Will use CPU.")
 
+def configure_threads(threads):
+    """
+    Limit the number of CPU threads TensorFlow uses.
+
+    Must be called before TensorFlow runs any operation.
+
+    Args:
+        threads (int): Threads for running a single operation. Independent
+            operations run on at most two threads at once.
+    """
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(min(threads, 2))
+    print(f"TensorFlow limited to {threads} CPU threads")
+
+def set_cpu_affinity(cores):
+    """
+    Pin this process to a set of CPUs.
+
+    Threads inherit the affinity of the thread that starts them, so threads
+    already running, such as NumPy's BLAS pool, are pinned as well; worker
+    processes started later inherit it.
+
+    Args:
+        cores (list): CPU ids the process may run on.
+    """
+    if not hasattr(os, 'sched_setaffinity'):
+        return
+    threads = os.listdir('/proc/self/task') if os.path.isdir('/proc/self/task') else ['0']
+    for thread_id in threads:
+        try:
+            os.sched_setaffinity(int(thread_id), cores)
+        except ProcessLookupError:
+            # The thread exited in the meantime
+            pass
+    print(f"Pinned to CPUs {sorted(cores)}")
+
 def select_directory(base_path, prompt):
     """
     Prompt the user to select a directory from a list.